@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Lambda handlers in deployment/template.yaml
+
+Each handler module is imported in a fresh interpreter (as on a Lambda cold
+start) with ``python -X importtime``. The init time (wall clock to import the
+module and resolve the handler) is compared against the budget in
+cold_start_budgets.json; the run fails if any handler is over budget.
+
+Usage:
+    python benchmarks/cold_start.py [--runs 5] [--budgets FILE] [--json OUT]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT, "src")
+TEMPLATE = os.path.join(ROOT, "deployment", "template.yaml")
+DEFAULT_BUDGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cold_start_budgets.json")
+
+# Runs inside the child interpreter: time the import plus handler lookup
+CHILD_SCRIPT = """
+import importlib, sys, time
+sys.stderr.write("--handler-import--\\n")
+sys.stderr.flush()
+start = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+getattr(module, sys.argv[2])
+print((time.perf_counter() - start) * 1000.0)
+"""
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def discover_handlers(template_path=TEMPLATE):
+    """Return the unique Handler entries of the SAM template"""
+    with open(template_path) as f:
+        handlers = re.findall(r"^\s+Handler:\s+(\S+)\s*$", f.read(), re.MULTILINE)
+    return list(dict.fromkeys(handlers))
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    env.setdefault("EVENT_BUS_NAME", "benchmark-bus")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    env.pop("XRAY_AUTO_PATCH", None)
+    return env
+
+
+def measure_once(handler):
+    """Import the handler in a fresh interpreter; return (init_ms, imports)"""
+    module, func = handler.rsplit(".", 1)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT, module, func],
+        cwd=SRC_DIR,
+        env=child_env(),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{handler} failed to import:\n{proc.stderr[-2000:]}")
+    init_ms = float(proc.stdout.strip().splitlines()[-1])
+    imports = []
+    # Only count modules loaded by the handler, not interpreter start-up
+    stderr = proc.stderr.split("--handler-import--", 1)[-1]
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((name, len(indent), int(self_us), int(cumulative_us)))
+    return init_ms, imports
+
+
+def measure(handler, runs):
+    samples = []
+    imports = []
+    for _ in range(runs):
+        init_ms, imports = measure_once(handler)
+        samples.append(init_ms)
+    # Heaviest top-level imports of the last run, for attribution
+    top_level = [entry for entry in imports if entry[1] == 1]
+    heaviest = sorted(top_level, key=lambda entry: entry[3], reverse=True)[:5]
+    return {
+        "handler": handler,
+        "init_ms_median": round(statistics.median(samples), 2),
+        "init_ms_max": round(max(samples), 2),
+        "modules_loaded": len(imports),
+        "heaviest_imports_ms": {name: round(cum / 1000.0, 2) for name, _, _, cum in heaviest},
+    }
+
+
+def load_budgets(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budgets", default=DEFAULT_BUDGETS)
+    parser.add_argument("--json", dest="json_out")
+    parser.add_argument("handlers", nargs="*", help="Handlers to measure (default: all in the template)")
+    args = parser.parse_args(argv)
+
+    budgets = load_budgets(args.budgets)
+    default_budget = budgets.get("default_ms")
+    handlers = args.handlers or discover_handlers()
+
+    results = []
+    failed = False
+    for handler in handlers:
+        result = measure(handler, args.runs)
+        budget = budgets.get("handlers", {}).get(handler, default_budget)
+        result["budget_ms"] = budget
+        result["within_budget"] = budget is None or result["init_ms_median"] <= budget
+        failed |= not result["within_budget"]
+        results.append(result)
+        status = "ok" if result["within_budget"] else "OVER BUDGET"
+        print(f"{handler:60s} {result['init_ms_median']:8.1f} ms (budget {budget} ms) {status}")
+        for name, ms in result["heaviest_imports_ms"].items():
+            print(f"    {name:56s} {ms:8.1f} ms")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
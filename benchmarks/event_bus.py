@@ -0,0 +1,330 @@
+"""
+In-process EventBridge -> SQS -> Lambda emulator
+
+The routing is read from deployment/template.yaml: every AWS::Events::Rule
+whose target is an SQS queue, and every function with an SQS event source
+on that queue. Events published by OrderEventProducer are matched against
+the rules, wrapped in an EventBridge envelope, queued and delivered to the
+consumer lambda_handlers in-process, in batches, with the partial batch
+failure, redrive and DLQ behaviour of the deployed stack.
+
+Delivery latency, batching and failures can be injected:
+
+    bus = EventBus.from_template(delivery_latency_ms=20, consumer_failure_rate=0.01)
+    bus.install()             # OrderEventProducer now publishes into the bus
+    ...                       # invoke handlers
+    bus.run_until_idle()      # deliver everything (including follow-up events)
+"""
+import importlib
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from common import aws_clients
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE = os.path.join(ROOT, "deployment", "template.yaml")
+
+
+def _ref_name(value):
+    """Logical id from Fn::GetAtt (long or list form) or Ref"""
+    if isinstance(value, dict):
+        if "Fn::GetAtt" in value:
+            target = value["Fn::GetAtt"]
+            return target[0] if isinstance(target, list) else target.split(".", 1)[0]
+        if "Ref" in value:
+            return value["Ref"]
+    return value
+
+
+def _resolve(value, parameters):
+    if isinstance(value, dict) and "Ref" in value:
+        return parameters.get(value["Ref"])
+    return value
+
+
+def matches(pattern, event):
+    """
+    EventBridge content matching for the subset used by our rules: every
+    pattern field lists the accepted values (nested objects match nested
+    fields)
+    """
+    for field, expected in pattern.items():
+        value = event.get(field)
+        if isinstance(expected, dict):
+            if not isinstance(value, dict) or not matches(expected, value):
+                return False
+        elif value not in expected:
+            return False
+    return True
+
+
+class Rule:
+    def __init__(self, name, pattern, queues):
+        self.name = name
+        self.pattern = pattern
+        self.queues = queues
+
+
+class Queue:
+    """SQS queue with redrive to a DLQ and one Lambda event source"""
+
+    def __init__(self, name, handler=None, batch_size=10, batching_window=0.0, max_receive_count=5):
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.batching_window = batching_window
+        self.max_receive_count = max_receive_count
+        self.messages = deque()
+        self.dead_letters = []
+        self.invocations = 0
+        self.failed_records = 0
+
+    def visible(self, now):
+        return [message for message in self.messages if message["visibleAt"] <= now]
+
+
+class EventBus:
+    """
+    Emulates PutEvents and the downstream queues and consumers.
+
+    Args:
+        rules: Rules to route events with
+        queues: Queues by logical id
+        delivery_latency_ms: Mean delay between PutEvents and the message
+            becoming visible in the queue
+        delivery_jitter_ms: Uniform +/- jitter added to the delay
+        put_failure_rate: Share of PutEvents entries reported as failed
+        consumer_failure_rate: Share of consumer invocations that fail as a
+            whole (every record of the batch is retried)
+        retry_delay_ms: Delay before a failed message is visible again
+            (the visibility timeout, scaled down)
+        seed: Random seed, for reproducible runs
+    """
+
+    def __init__(self, rules, queues, delivery_latency_ms=0.0, delivery_jitter_ms=0.0,
+                 put_failure_rate=0.0, consumer_failure_rate=0.0, retry_delay_ms=100.0,
+                 seed=None, clock=time.monotonic):
+        self.rules = rules
+        self.queues = queues
+        self.delivery_latency_ms = delivery_latency_ms
+        self.delivery_jitter_ms = delivery_jitter_ms
+        self.put_failure_rate = put_failure_rate
+        self.consumer_failure_rate = consumer_failure_rate
+        self.retry_delay_ms = retry_delay_ms
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.published = Counter()
+        self.failed_puts = 0
+        # Called as listener(queue_name, detail_type, detail, now) per delivered record
+        self.listeners = []
+
+    @classmethod
+    def from_template(cls, template_path=TEMPLATE, batch_size=None, batching_window=None, **kwargs):
+        """Build the bus from the rules, queues and functions of the SAM template"""
+        try:
+            import yaml
+        except ImportError:
+            raise SystemExit("PyYAML is required to read the template: pip install pyyaml")
+        with open(template_path) as f:
+            template = yaml.safe_load(f)
+        parameters = {
+            name: spec.get("Default") for name, spec in template.get("Parameters", {}).items()
+        }
+        resources = template["Resources"]
+
+        queues = {}
+        for name, resource in resources.items():
+            if resource["Type"] != "AWS::SQS::Queue" or name.endswith("DLQ"):
+                continue
+            redrive = resource.get("Properties", {}).get("RedrivePolicy", {})
+            queues[name] = Queue(
+                name,
+                max_receive_count=int(_resolve(redrive.get("maxReceiveCount", 5), parameters)),
+            )
+
+        for resource in resources.values():
+            if resource["Type"] != "AWS::Serverless::Function":
+                continue
+            properties = resource["Properties"]
+            for source in properties.get("Events", {}).values():
+                if source.get("Type") != "SQS":
+                    continue
+                config = source["Properties"]
+                queue = queues.get(_ref_name(config["Queue"]))
+                if queue is None:
+                    continue
+                queue.handler = properties["Handler"]
+                queue.batch_size = int(
+                    batch_size or _resolve(config.get("BatchSize", 10), parameters)
+                )
+                window = batching_window
+                if window is None:
+                    window = _resolve(config.get("MaximumBatchingWindowInSeconds", 0), parameters)
+                queue.batching_window = float(window)
+
+        rules = []
+        for name, resource in resources.items():
+            if resource["Type"] != "AWS::Events::Rule":
+                continue
+            properties = resource["Properties"]
+            targets = [queues[_ref_name(t["Arn"])] for t in properties.get("Targets", [])
+                       if _ref_name(t["Arn"]) in queues]
+            rules.append(Rule(name, properties.get("EventPattern", {}), targets))
+        return cls(rules, queues, **kwargs)
+
+    # ------------------------------------------------------------------
+    # EventBridge side
+    # ------------------------------------------------------------------
+
+    def install(self):
+        """Route OrderEventProducer's PutEvents calls into this bus"""
+        from events.producer import producer
+
+        aws_clients.set_client("events", self)
+        producer.event_producer._eventbridge_client = None
+        return self
+
+    def put_events(self, Entries):
+        """PutEvents with the same request and response shape as boto3"""
+        now = self.clock()
+        results = []
+        failed = 0
+        for entry in Entries:
+            if self.random.random() < self.put_failure_rate:
+                failed += 1
+                self.failed_puts += 1
+                results.append({"ErrorCode": "InternalFailure", "ErrorMessage": "Injected failure"})
+                continue
+            event_id = str(uuid.uuid4())
+            envelope = {
+                "version": "0",
+                "id": event_id,
+                "detail-type": entry["DetailType"],
+                "source": entry["Source"],
+                "time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "resources": [],
+                "detail": json.loads(entry["Detail"]),
+            }
+            self.published[entry["DetailType"]] += 1
+            for rule in self.rules:
+                if matches(rule.pattern, envelope):
+                    for queue in rule.queues:
+                        self._enqueue(queue, envelope, now)
+            results.append({"EventId": event_id})
+        return {"FailedEntryCount": failed, "Entries": results}
+
+    def _delay(self):
+        jitter = self.random.uniform(-self.delivery_jitter_ms, self.delivery_jitter_ms)
+        return max(self.delivery_latency_ms + jitter, 0.0) / 1000.0
+
+    def _enqueue(self, queue, envelope, now):
+        body = json.dumps(envelope)
+        queue.messages.append({
+            "messageId": str(uuid.uuid4()),
+            "body": body,
+            "receiveCount": 0,
+            "enqueuedAt": now,
+            "visibleAt": now + self._delay(),
+            "envelope": envelope,
+        })
+
+    # ------------------------------------------------------------------
+    # SQS -> Lambda side
+    # ------------------------------------------------------------------
+
+    def _ready_batch(self, queue, now):
+        visible = queue.visible(now)
+        if not visible:
+            return []
+        oldest = min(message["visibleAt"] for message in visible)
+        if len(visible) < queue.batch_size and now - oldest < queue.batching_window:
+            return []
+        return visible[:queue.batch_size]
+
+    def _invoke(self, queue, batch):
+        module_name, func_name = queue.handler.rsplit(".", 1)
+        handler = getattr(importlib.import_module(module_name), func_name)
+        for message in batch:
+            message["receiveCount"] += 1
+        event = {
+            "Records": [
+                {
+                    "messageId": message["messageId"],
+                    "body": message["body"],
+                    "eventSource": "aws:sqs",
+                    "attributes": {"ApproximateReceiveCount": str(message["receiveCount"])},
+                }
+                for message in batch
+            ]
+        }
+        queue.invocations += 1
+        if self.random.random() < self.consumer_failure_rate:
+            return {message["messageId"] for message in batch}
+        try:
+            response = handler(event, None) or {}
+        except Exception:
+            return {message["messageId"] for message in batch}
+        return {failure["itemIdentifier"] for failure in response.get("batchItemFailures", [])}
+
+    def pump(self):
+        """Deliver every batch that is ready now; return the records delivered"""
+        delivered = 0
+        for queue in self.queues.values():
+            if queue.handler is None:
+                continue
+            while True:
+                now = self.clock()
+                batch = self._ready_batch(queue, now)
+                if not batch:
+                    break
+                for message in batch:
+                    queue.messages.remove(message)
+                failed_ids = self._invoke(queue, batch)
+                now = self.clock()
+                for message in batch:
+                    if message["messageId"] in failed_ids:
+                        queue.failed_records += 1
+                        if message["receiveCount"] >= queue.max_receive_count:
+                            queue.dead_letters.append(message)
+                        else:
+                            message["visibleAt"] = now + self.retry_delay_ms / 1000.0
+                            queue.messages.append(message)
+                        continue
+                    envelope = message["envelope"]
+                    for listener in self.listeners:
+                        listener(queue.name, envelope["detail-type"], envelope["detail"], now)
+                delivered += len(batch)
+        return delivered
+
+    def pending(self):
+        return sum(len(queue.messages) for queue in self.queues.values() if queue.handler)
+
+    def run_until_idle(self, timeout=60.0, poll_interval=0.001):
+        """Pump until every queue is drained (or timeout seconds pass)"""
+        deadline = self.clock() + timeout
+        while self.pending():
+            if not self.pump():
+                if self.clock() > deadline:
+                    raise TimeoutError(f"{self.pending()} messages still pending")
+                time.sleep(poll_interval)
+
+    def stats(self):
+        return {
+            "published": dict(self.published),
+            "failedPuts": self.failed_puts,
+            "queues": {
+                name: {
+                    "handler": queue.handler,
+                    "invocations": queue.invocations,
+                    "failedRecords": queue.failed_records,
+                    "deadLetters": len(queue.dead_letters),
+                    "pending": len(queue.messages),
+                }
+                for name, queue in self.queues.items()
+            },
+        }
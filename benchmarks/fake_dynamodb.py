@@ -0,0 +1,782 @@
+"""
+In-memory DynamoDB for benchmarks and local runs
+
+A deterministic stand-in for the subset of DynamoDB this project uses:
+PutItem, GetItem, DeleteItem, UpdateItem, Query (tables and GSIs),
+BatchGetItem, BatchWriteItem and TransactWriteItems. It supports condition,
+update and key-condition expressions, ReturnValues,
+ReturnValuesOnConditionCheckFailure and TTL.
+
+It answers at the wire level, behind benchmarks/offline_aws.py. Real boto3
+clients and resources are used unchanged, so the DAOs' accessors
+(get_dynamodb_table / get_dynamodb_resources) work as in production.
+Errors come back as the ClientError codes botocore raises for the real
+service, and botocore's own retry handling applies to throttling.
+
+Faults can be injected per call: latency, ProvisionedThroughputExceeded
+throttling, TransactionConflict cancellations and unprocessed batch items.
+
+    db = FakeDynamoDB.from_template(latency_ms=2, throttle_rate=0.01, seed=1)
+    db.install()    # DAOs now talk to db
+"""
+import os
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+
+from offline_aws import OfflineAWS, ServiceError, reset_cached_clients
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE = os.path.join(ROOT, "deployment", "template.yaml")
+DYNAMODB = "DynamoDB_20120810."
+
+
+# ---------------------------------------------------------------------------
+# Attribute values
+# ---------------------------------------------------------------------------
+
+
+def _scalar(value):
+    """Comparable Python value of a typed attribute value, or None"""
+    if value is None:
+        return None
+    (kind, raw), = value.items()
+    if kind == "N":
+        return Decimal(raw)
+    if kind in ("S", "B"):
+        return raw
+    return None
+
+
+def _number(value):
+    return Decimal(value["N"])
+
+
+def _format_number(number):
+    return format(number.normalize(), "f")
+
+
+def _key_of(item, key_names):
+    return tuple(tuple(item[name].items())[0] for name in key_names)
+
+
+# ---------------------------------------------------------------------------
+# Expression parsing
+# ---------------------------------------------------------------------------
+
+_TOKEN = re.compile(
+    r"\s*(?:(?P<op><>|<=|>=|=|<|>|\(|\)|,|\+|-)"
+    r"|(?P<name>#[A-Za-z0-9_]+)"
+    r"|(?P<value>:[A-Za-z0-9_]+)"
+    r"|(?P<word>[A-Za-z_][A-Za-z0-9_.\[\]]*))"
+)
+_KEYWORDS = {"AND", "OR", "NOT", "BETWEEN", "IN", "SET", "REMOVE", "ADD", "DELETE"}
+_COMPARATORS = {"=", "<>", "<", "<=", ">", ">="}
+
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise ServiceError("ValidationException", f"Invalid expression: {expression}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "word" and text.upper() in _KEYWORDS:
+            kind, text = "keyword", text.upper()
+        tokens.append((kind, text))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing a small tuple AST"""
+
+    def __init__(self, expression):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, text=None):
+        token = self.peek()
+        if text is not None and token[1] != text:
+            raise ServiceError("ValidationException", f"Expected {text!r}, got {token[1]!r}")
+        self.position += 1
+        return token
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    # Conditions -----------------------------------------------------------
+
+    def condition(self):
+        node = self.conjunction()
+        while self.peek()[1] == "OR":
+            self.take()
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek()[1] == "AND":
+            self.take()
+            node = ("and", node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek()[1] == "NOT":
+            self.take()
+            return ("not", self.negation())
+        return self.predicate()
+
+    def predicate(self):
+        if self.peek()[1] == "(":
+            self.take()
+            node = self.condition()
+            self.take(")")
+            return node
+        kind, text = self.peek()
+        if kind == "word" and self.peek(1)[1] == "(" and text != "size":
+            return self.function()
+        left = self.operand()
+        kind, text = self.peek()
+        if text in _COMPARATORS:
+            self.take()
+            return ("compare", text, left, self.operand())
+        if text == "BETWEEN":
+            self.take()
+            low = self.operand()
+            self.take("AND")
+            return ("between", left, low, self.operand())
+        if text == "IN":
+            self.take()
+            self.take("(")
+            options = [self.operand()]
+            while self.peek()[1] == ",":
+                self.take()
+                options.append(self.operand())
+            self.take(")")
+            return ("in", left, options)
+        raise ServiceError("ValidationException", f"Unexpected token {text!r}")
+
+    def function(self):
+        _, name = self.take()
+        self.take("(")
+        args = [self.operand()]
+        while self.peek()[1] == ",":
+            self.take()
+            args.append(self.operand())
+        self.take(")")
+        return ("function", name, args)
+
+    def operand(self):
+        kind, text = self.take()
+        if kind == "value":
+            return ("value", text)
+        if kind == "name":
+            return ("path", text)
+        if kind == "word":
+            if text in ("size", "if_not_exists", "list_append") and self.peek()[1] == "(":
+                self.take("(")
+                args = [self.operand()]
+                while self.peek()[1] == ",":
+                    self.take()
+                    args.append(self.operand())
+                self.take(")")
+                return (text, args)
+            return ("path", text)
+        raise ServiceError("ValidationException", f"Unexpected token {text!r}")
+
+    # Updates --------------------------------------------------------------
+
+    def update(self):
+        actions = []
+        while not self.done():
+            _, clause = self.take()
+            while True:
+                path = self.operand()
+                if clause == "SET":
+                    self.take("=")
+                    value = self.operand()
+                    if self.peek()[1] in ("+", "-"):
+                        _, sign = self.take()
+                        value = ("arith", sign, value, self.operand())
+                    actions.append(("SET", path, value))
+                elif clause == "REMOVE":
+                    actions.append(("REMOVE", path, None))
+                elif clause in ("ADD", "DELETE"):
+                    actions.append((clause, path, self.operand()))
+                else:
+                    raise ServiceError("ValidationException", f"Unknown update clause {clause}")
+                if self.peek()[1] != ",":
+                    break
+                self.take()
+        return actions
+
+
+class _Context:
+    __slots__ = ("names", "values")
+
+    def __init__(self, names, values):
+        self.names = names or {}
+        self.values = values or {}
+
+    def name(self, path):
+        return self.names.get(path, path) if path.startswith("#") else path
+
+
+def _resolve(node, item, ctx):
+    kind = node[0]
+    if kind == "value":
+        if node[1] not in ctx.values:
+            raise ServiceError("ValidationException", f"Missing value for {node[1]}")
+        return ctx.values[node[1]]
+    if kind == "path":
+        return item.get(ctx.name(node[1]))
+    if kind == "size":
+        value = _resolve(node[1][0], item, ctx)
+        if value is None:
+            return None
+        (type_, raw), = value.items()
+        return {"N": str(len(raw))}
+    if kind == "if_not_exists":
+        value = _resolve(node[1][0], item, ctx)
+        return value if value is not None else _resolve(node[1][1], item, ctx)
+    if kind == "list_append":
+        first, second = (_resolve(arg, item, ctx) for arg in node[1])
+        return {"L": (first or {"L": []})["L"] + (second or {"L": []})["L"]}
+    if kind == "arith":
+        left, right = _resolve(node[2], item, ctx), _resolve(node[3], item, ctx)
+        if left is None or right is None:
+            raise ServiceError("ValidationException", "Operand in arithmetic is missing")
+        result = _number(left) + _number(right) if node[1] == "+" else _number(left) - _number(right)
+        return {"N": _format_number(result)}
+    raise ServiceError("ValidationException", f"Unsupported operand {kind}")
+
+
+def _compare(op, left, right):
+    if left is None or right is None:
+        return False
+    if op == "=":
+        return left == right
+    if op == "<>":
+        return left != right
+    if next(iter(left)) != next(iter(right)):
+        return False
+    a, b = _scalar(left), _scalar(right)
+    if a is None:
+        return False
+    return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+
+def _evaluate(node, item, ctx):
+    kind = node[0]
+    if kind == "or":
+        return _evaluate(node[1], item, ctx) or _evaluate(node[2], item, ctx)
+    if kind == "and":
+        return _evaluate(node[1], item, ctx) and _evaluate(node[2], item, ctx)
+    if kind == "not":
+        return not _evaluate(node[1], item, ctx)
+    if kind == "compare":
+        return _compare(node[1], _resolve(node[2], item, ctx), _resolve(node[3], item, ctx))
+    if kind == "between":
+        value = _resolve(node[1], item, ctx)
+        return _compare(">=", value, _resolve(node[2], item, ctx)) and _compare(
+            "<=", value, _resolve(node[3], item, ctx)
+        )
+    if kind == "in":
+        value = _resolve(node[1], item, ctx)
+        return any(value == _resolve(option, item, ctx) for option in node[2])
+    if kind == "function":
+        name, args = node[1], node[2]
+        if name == "attribute_exists":
+            return _resolve(args[0], item, ctx) is not None
+        if name == "attribute_not_exists":
+            return _resolve(args[0], item, ctx) is None
+        if name == "begins_with":
+            value, prefix = _resolve(args[0], item, ctx), _resolve(args[1], item, ctx)
+            return value is not None and "S" in value and value["S"].startswith(prefix["S"])
+        if name == "contains":
+            value, member = _resolve(args[0], item, ctx), _resolve(args[1], item, ctx)
+            if value is None or member is None:
+                return False
+            (type_, raw), = value.items()
+            if type_ == "S":
+                return member.get("S", "") in raw
+            if type_ in ("SS", "NS"):
+                return next(iter(member.values())) in raw
+            if type_ == "L":
+                return member in raw
+            return False
+        if name == "attribute_type":
+            value, type_ = _resolve(args[0], item, ctx), _resolve(args[1], item, ctx)
+            return value is not None and next(iter(value)) == type_["S"]
+    raise ServiceError("ValidationException", f"Unsupported condition {kind}")
+
+
+_parsed = {}
+_parse_lock = threading.Lock()
+
+
+def _parse(expression, mode):
+    """Parse and cache an expression; mode is 'condition' or 'update'"""
+    key = (mode, expression)
+    node = _parsed.get(key)
+    if node is None:
+        parser = _Parser(expression)
+        node = parser.update() if mode == "update" else parser.condition()
+        if not parser.done():
+            raise ServiceError("ValidationException", f"Trailing tokens in {expression}")
+        with _parse_lock:
+            _parsed[key] = node
+    return node
+
+
+def _apply_update(item, actions, ctx):
+    """Apply update actions in place; return the names of changed attributes"""
+    changed = []
+    for action, path, operand in actions:
+        name = ctx.name(path[1])
+        if action == "SET":
+            item[name] = _resolve(operand, item, ctx)
+        elif action == "REMOVE":
+            item.pop(name, None)
+        elif action == "ADD":
+            value = _resolve(operand, item, ctx)
+            current = item.get(name)
+            if "N" in value:
+                base = _number(current) if current is not None else Decimal(0)
+                item[name] = {"N": _format_number(base + _number(value))}
+            else:
+                (type_, members), = value.items()
+                existing = current[type_] if current is not None else []
+                item[name] = {type_: existing + [m for m in members if m not in existing]}
+        elif action == "DELETE":
+            value = _resolve(operand, item, ctx)
+            current = item.get(name)
+            if current is not None:
+                (type_, members), = value.items()
+                remaining = [m for m in current[type_] if m not in members]
+                if remaining:
+                    item[name] = {type_: remaining}
+                else:
+                    item.pop(name)
+        changed.append(name)
+    return changed
+
+
+# ---------------------------------------------------------------------------
+# Tables
+# ---------------------------------------------------------------------------
+
+
+class Table:
+    """Items of one table, keyed by primary key, with hash-key GSIs"""
+
+    def __init__(self, name, key_names, indexes=None, ttl_attribute=None):
+        self.name = name
+        self.key_names = list(key_names)
+        # index name -> key attribute names
+        self.indexes = dict(indexes or {})
+        self.ttl_attribute = ttl_attribute
+        self.items = {}
+        # index name -> hash value -> set of primary keys
+        self._index_entries = {name: {} for name in self.indexes}
+
+    def key(self, item):
+        try:
+            return _key_of(item, self.key_names)
+        except KeyError:
+            raise ServiceError(
+                "ValidationException",
+                "The provided key element does not match the schema",
+            )
+
+    def expired(self, item, now):
+        if self.ttl_attribute is None:
+            return False
+        value = item.get(self.ttl_attribute)
+        return value is not None and "N" in value and Decimal(value["N"]) < now
+
+    def get(self, key, now, ttl_delay):
+        item = self.items.get(key)
+        if item is not None and self.expired(item, now - ttl_delay):
+            self.delete(key)
+            return None
+        return item
+
+    def _unindex(self, key, item):
+        for index, names in self.indexes.items():
+            value = item.get(names[0])
+            if value is not None:
+                members = self._index_entries[index].get(tuple(value.items())[0])
+                if members is not None:
+                    members.discard(key)
+
+    def put(self, item):
+        key = self.key(item)
+        old = self.items.get(key)
+        if old is not None:
+            self._unindex(key, old)
+        self.items[key] = item
+        for index, names in self.indexes.items():
+            value = item.get(names[0])
+            if value is not None:
+                self._index_entries[index].setdefault(tuple(value.items())[0], set()).add(key)
+        return old
+
+    def delete(self, key):
+        old = self.items.pop(key, None)
+        if old is not None:
+            self._unindex(key, old)
+        return old
+
+    def candidates(self, index, hash_value):
+        """Primary-key lookup candidates for a Query on the table or an index"""
+        if index is None:
+            return [item for key, item in self.items.items() if key[0] == hash_value]
+        keys = self._index_entries[index].get(hash_value, ())
+        return [self.items[key] for key in keys]
+
+
+def _project(item, expression, ctx):
+    if not expression or item is None:
+        return item
+    names = [ctx.name(part.strip()) for part in expression.split(",")]
+    return {name: item[name] for name in names if name in item}
+
+
+class FakeDynamoDB:
+    """
+    In-memory DynamoDB service
+
+    Args:
+        tables: Table objects to serve
+        latency_ms: Added to every call (number, or dict of operation -> ms)
+        throttle_rate: Share of calls failing with
+            ProvisionedThroughputExceededException
+        conflict_rate: Share of TransactWriteItems calls cancelled with
+            TransactionConflict
+        unprocessed_rate: Share of BatchGet/BatchWrite requests returned as
+            unprocessed
+        ttl_delay_seconds: How long expired items stay readable before TTL
+            removes them (DynamoDB removes them lazily too)
+        seed: Random seed for the injected faults
+    """
+
+    def __init__(self, tables, latency_ms=0.0, throttle_rate=0.0, conflict_rate=0.0,
+                 unprocessed_rate=0.0, ttl_delay_seconds=0.0, seed=None, clock=time.time):
+        self.tables = {table.name: table for table in tables}
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.conflict_rate = conflict_rate
+        self.unprocessed_rate = unprocessed_rate
+        self.ttl_delay_seconds = ttl_delay_seconds
+        self.random = random.Random(seed)
+        self.clock = clock
+        self._lock = threading.RLock()
+        self.throttled = 0
+        self.conflicts = 0
+
+    @classmethod
+    def from_template(cls, template_path=TEMPLATE, table_names=None, **kwargs):
+        """
+        Create the tables of the SAM template. Tables are named as the code
+        sees them (the DAO table-name settings) unless table_names maps a
+        logical id to another name.
+        """
+        import yaml
+
+        with open(template_path) as f:
+            resources = yaml.safe_load(f)["Resources"]
+        names = dict(default_table_names(), **(table_names or {}))
+        tables = []
+        for logical_id, resource in resources.items():
+            if resource["Type"] != "AWS::DynamoDB::Table" or logical_id not in names:
+                continue
+            properties = resource["Properties"]
+            ttl = properties.get("TimeToLiveSpecification", {})
+            tables.append(Table(
+                names[logical_id],
+                [key["AttributeName"] for key in properties["KeySchema"]],
+                indexes={
+                    index["IndexName"]: [key["AttributeName"] for key in index["KeySchema"]]
+                    for index in properties.get("GlobalSecondaryIndexes", [])
+                },
+                ttl_attribute=ttl.get("AttributeName") if ttl.get("Enabled", True) else None,
+            ))
+        return cls(tables, **kwargs)
+
+    def install(self, aws=None):
+        """Serve the shared DynamoDB resource/client from this instance"""
+        aws = aws or OfflineAWS()
+        aws.responses.update(self.responses())
+        aws.install()
+        reset_cached_clients()
+        return aws
+
+    def responses(self):
+        return {
+            DYNAMODB + "PutItem": self._wrap("PutItem", self.put_item),
+            DYNAMODB + "GetItem": self._wrap("GetItem", self.get_item),
+            DYNAMODB + "DeleteItem": self._wrap("DeleteItem", self.delete_item),
+            DYNAMODB + "UpdateItem": self._wrap("UpdateItem", self.update_item),
+            DYNAMODB + "Query": self._wrap("Query", self.query),
+            DYNAMODB + "BatchGetItem": self._wrap("BatchGetItem", self.batch_get_item),
+            DYNAMODB + "BatchWriteItem": self._wrap("BatchWriteItem", self.batch_write_item),
+            DYNAMODB + "TransactWriteItems": self._wrap("TransactWriteItems", self.transact_write_items),
+        }
+
+    def _wrap(self, operation, handler):
+        def respond(body):
+            latency = self.latency_ms
+            if isinstance(latency, dict):
+                latency = latency.get(operation, 0.0)
+            if latency:
+                time.sleep(latency / 1000.0)
+            if self.throttle_rate and self.random.random() < self.throttle_rate:
+                self.throttled += 1
+                raise ServiceError(
+                    "ProvisionedThroughputExceededException",
+                    "The level of configured provisioned throughput for the table was exceeded",
+                )
+            with self._lock:
+                return handler(body)
+
+        return respond
+
+    def table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            raise ServiceError("ResourceNotFoundException", f"Requested resource not found: {name}")
+        return table
+
+    # Single-item operations ---------------------------------------------
+
+    def _check(self, request, item):
+        expression = request.get("ConditionExpression")
+        if not expression:
+            return True
+        ctx = _Context(request.get("ExpressionAttributeNames"), request.get("ExpressionAttributeValues"))
+        return _evaluate(_parse(expression, "condition"), item or {}, ctx)
+
+    def _condition_failed(self, request, item):
+        extra = {}
+        if request.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD" and item is not None:
+            extra["Item"] = item
+        return ServiceError("ConditionalCheckFailedException", "The conditional request failed", **extra)
+
+    def put_item(self, request):
+        table = self.table(request["TableName"])
+        item = request["Item"]
+        old = table.get(table.key(item), self.clock(), self.ttl_delay_seconds)
+        if not self._check(request, old):
+            raise self._condition_failed(request, old)
+        table.put(dict(item))
+        if request.get("ReturnValues") == "ALL_OLD" and old is not None:
+            return {"Attributes": old}
+        return {}
+
+    def get_item(self, request):
+        table = self.table(request["TableName"])
+        item = table.get(table.key(request["Key"]), self.clock(), self.ttl_delay_seconds)
+        if item is None:
+            return {}
+        ctx = _Context(request.get("ExpressionAttributeNames"), None)
+        return {"Item": _project(item, request.get("ProjectionExpression"), ctx)}
+
+    def delete_item(self, request):
+        table = self.table(request["TableName"])
+        key = table.key(request["Key"])
+        old = table.get(key, self.clock(), self.ttl_delay_seconds)
+        if not self._check(request, old):
+            raise self._condition_failed(request, old)
+        table.delete(key)
+        if request.get("ReturnValues") == "ALL_OLD" and old is not None:
+            return {"Attributes": old}
+        return {}
+
+    def update_item(self, request):
+        table = self.table(request["TableName"])
+        key = table.key(request["Key"])
+        old = table.get(key, self.clock(), self.ttl_delay_seconds)
+        if not self._check(request, old):
+            raise self._condition_failed(request, old)
+        item = dict(old) if old is not None else dict(request["Key"])
+        ctx = _Context(request.get("ExpressionAttributeNames"), request.get("ExpressionAttributeValues"))
+        changed = _apply_update(item, _parse(request["UpdateExpression"], "update"), ctx)
+        for name in table.key_names:
+            if item.get(name) != request["Key"][name]:
+                raise ServiceError("ValidationException", "Cannot update attribute in the key")
+        table.put(item)
+        return_values = request.get("ReturnValues", "NONE")
+        if return_values == "ALL_NEW":
+            return {"Attributes": item}
+        if return_values == "ALL_OLD":
+            return {"Attributes": old} if old else {}
+        if return_values == "UPDATED_NEW":
+            return {"Attributes": {name: item[name] for name in changed if name in item}}
+        if return_values == "UPDATED_OLD":
+            old = old or {}
+            return {"Attributes": {name: old[name] for name in changed if name in old}}
+        return {}
+
+    def query(self, request):
+        table = self.table(request["TableName"])
+        index = request.get("IndexName")
+        key_names = table.indexes[index] if index else table.key_names
+        ctx = _Context(request.get("ExpressionAttributeNames"), request.get("ExpressionAttributeValues"))
+        key_condition = _parse(request["KeyConditionExpression"], "condition")
+        hash_value = _hash_value(key_condition, key_names[0], ctx)
+        if hash_value is None:
+            raise ServiceError(
+                "ValidationException", "Query key condition must test the hash key for equality"
+            )
+        now = self.clock() - self.ttl_delay_seconds
+        items = [
+            item for item in table.candidates(index, hash_value)
+            if not table.expired(item, now) and _evaluate(key_condition, item, ctx)
+        ]
+        if len(key_names) > 1:
+            items.sort(key=lambda item: _scalar(item.get(key_names[1])))
+        if request.get("ScanIndexForward") is False:
+            items.reverse()
+        start = request.get("ExclusiveStartKey")
+        if start is not None:
+            start_key = table.key(start)
+            keys = [table.key(item) for item in items]
+            items = items[keys.index(start_key) + 1:] if start_key in keys else []
+        limit = request.get("Limit")
+        last_key = None
+        if limit is not None and len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            last_key = {name: last[name] for name in set(table.key_names) | set(key_names)}
+        scanned = len(items)
+        filter_expression = request.get("FilterExpression")
+        if filter_expression:
+            condition = _parse(filter_expression, "condition")
+            items = [item for item in items if _evaluate(condition, item, ctx)]
+        response = {
+            "Items": [_project(item, request.get("ProjectionExpression"), ctx) for item in items],
+            "Count": len(items),
+            "ScannedCount": scanned,
+        }
+        if last_key is not None:
+            response["LastEvaluatedKey"] = last_key
+        return response
+
+    # Batch operations ---------------------------------------------------
+
+    def _unprocessed(self):
+        return self.unprocessed_rate and self.random.random() < self.unprocessed_rate
+
+    def batch_get_item(self, request):
+        responses = {}
+        unprocessed = {}
+        now = self.clock()
+        for table_name, spec in request["RequestItems"].items():
+            table = self.table(table_name)
+            ctx = _Context(spec.get("ExpressionAttributeNames"), None)
+            found = responses.setdefault(table_name, [])
+            for key in spec["Keys"]:
+                if self._unprocessed():
+                    unprocessed.setdefault(table_name, dict(spec, Keys=[]))["Keys"].append(key)
+                    continue
+                item = table.get(table.key(key), now, self.ttl_delay_seconds)
+                if item is not None:
+                    found.append(_project(item, spec.get("ProjectionExpression"), ctx))
+        return {"Responses": responses, "UnprocessedKeys": unprocessed}
+
+    def batch_write_item(self, request):
+        unprocessed = {}
+        for table_name, writes in request["RequestItems"].items():
+            table = self.table(table_name)
+            for write in writes:
+                if self._unprocessed():
+                    unprocessed.setdefault(table_name, []).append(write)
+                elif "PutRequest" in write:
+                    table.put(dict(write["PutRequest"]["Item"]))
+                else:
+                    table.delete(table.key(write["DeleteRequest"]["Key"]))
+        return {"UnprocessedItems": unprocessed}
+
+    def transact_write_items(self, request):
+        actions = request["TransactItems"]
+        if self.conflict_rate and self.random.random() < self.conflict_rate:
+            self.conflicts += 1
+            raise _cancelled([{"Code": "TransactionConflict"}] * len(actions))
+        now = self.clock()
+        reasons = []
+        failed = False
+        staged = []
+        for action in actions:
+            (kind, spec), = action.items()
+            table = self.table(spec["TableName"])
+            key = table.key(spec["Item"] if kind == "Put" else spec["Key"])
+            old = table.get(key, now, self.ttl_delay_seconds)
+            if self._check(spec, old):
+                reasons.append({"Code": "None"})
+                staged.append((kind, table, key, old, spec))
+                continue
+            failed = True
+            reason = {"Code": "ConditionalCheckFailed", "Message": "The conditional request failed"}
+            if spec.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD" and old is not None:
+                reason["Item"] = old
+            reasons.append(reason)
+        if failed:
+            raise _cancelled(reasons)
+        for kind, table, key, old, spec in staged:
+            if kind == "Put":
+                table.put(dict(spec["Item"]))
+            elif kind == "Delete":
+                table.delete(key)
+            elif kind == "Update":
+                item = dict(old) if old is not None else dict(spec["Key"])
+                ctx = _Context(spec.get("ExpressionAttributeNames"), spec.get("ExpressionAttributeValues"))
+                _apply_update(item, _parse(spec["UpdateExpression"], "update"), ctx)
+                table.put(item)
+        return {}
+
+
+def _cancelled(reasons):
+    codes = ", ".join(reason["Code"] for reason in reasons)
+    return ServiceError(
+        "TransactionCanceledException",
+        f"Transaction cancelled, please refer cancellation reasons for specific reasons [{codes}]",
+        CancellationReasons=reasons,
+    )
+
+
+def _hash_value(node, hash_name, ctx):
+    """Value the key condition requires for the hash key"""
+    if node[0] == "and":
+        return _hash_value(node[1], hash_name, ctx) or _hash_value(node[2], hash_name, ctx)
+    if node[0] == "compare" and node[1] == "=":
+        left, right = node[2], node[3]
+        if left[0] == "value":
+            left, right = right, left
+        if left[0] == "path" and ctx.name(left[1]) == hash_name and right[0] == "value":
+            return tuple(ctx.values[right[1]].items())[0]
+    return None
+
+
+def default_table_names():
+    """Template logical id -> table name as configured for the DAOs"""
+    from dao import order_dao, payment_dao, inventory_dao, catalog_dao
+    from common import idempotency
+
+    return {
+        "OrdersTable": order_dao.ORDERS_TABLE,
+        "InventoryTable": inventory_dao.INVENTORY_TABLE,
+        "PaymentsTable": payment_dao.PAYMENTS_TABLE,
+        "IdempotencyTable": idempotency.IDEMPOTENCY_TABLE,
+        "CatalogTable": catalog_dao.CATALOG_TABLE,
+    }
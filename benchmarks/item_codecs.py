@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Item codec benchmark: dao.codecs against boto3's TypeSerializer/TypeDeserializer
+
+Encodes and decodes Orders items with 1 to 1000 lines (the shape
+order_service builds) and a Payments item, and prints the time per item for
+each implementation and the speed-up. Both sides are checked to produce the
+same attribute values before anything is timed.
+
+Usage:
+    python benchmarks/item_codecs.py [--lines 1,10,100,1000] [--min-time 0.2] [--json OUT]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer  # noqa: E402
+
+from dao.codecs import ORDERS, PAYMENTS  # noqa: E402
+
+
+def order_record(lines):
+    items = [
+        {
+            "vendorId": f"vendor-{i % 7}",
+            "productId": f"product-{i}",
+            "quantity": Decimal(i % 5 + 1),
+            "price": Decimal("19.99"),
+        }
+        for i in range(lines)
+    ]
+    return {
+        "orderId": "2f1c8f6e-6a0b-4f38-9a53-6d1e7b1c2a90",
+        "customerId": "customer-1",
+        "items": items,
+        "totalAmount": sum(item["price"] * item["quantity"] for item in items),
+        "status": "PLACED",
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def payment_record():
+    return {
+        "paymentId": "0b6c4a8e-3d1f-4e52-8b8a-1f0e2d3c4b5a",
+        "orderId": "2f1c8f6e-6a0b-4f38-9a53-6d1e7b1c2a90",
+        "amount": Decimal("59.97"),
+        "paymentMethod": "card",
+        "status": "PROCESSED",
+        "processedAt": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def boto3_codec():
+    serialize = TypeSerializer().serialize
+    deserialize = TypeDeserializer().deserialize
+
+    def encode(record):
+        return {key: serialize(value) for key, value in record.items()}
+
+    def decode(item):
+        return {key: deserialize(value) for key, value in item.items()}
+
+    return encode, decode
+
+
+def time_per_call(func, arg, min_time):
+    """Seconds per call, from the best of five runs of at least min_time / 5"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func(arg)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 5:
+            break
+        number *= 2
+    best = elapsed
+    for _ in range(4):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def run(line_counts, min_time):
+    boto3_encode, boto3_decode = boto3_codec()
+    cases = [(f"order lines={n}", ORDERS, order_record(n)) for n in line_counts]
+    cases.append(("payment", PAYMENTS, payment_record()))
+
+    results = []
+    for name, codec, record in cases:
+        item = boto3_encode(record)
+        if codec.encode(record) != item:
+            raise SystemExit(f"{name}: codec and TypeSerializer disagree")
+        if codec.decode(item) != boto3_decode(item):
+            raise SystemExit(f"{name}: codec and TypeDeserializer disagree")
+        row = {"case": name}
+        for op, ours, theirs, arg in (
+            ("encode", codec.encode, boto3_encode, record),
+            ("decode", codec.decode, boto3_decode, item),
+        ):
+            row[f"{op}CodecUs"] = time_per_call(ours, arg, min_time) * 1e6
+            row[f"{op}Boto3Us"] = time_per_call(theirs, arg, min_time) * 1e6
+            row[f"{op}Speedup"] = row[f"{op}Boto3Us"] / row[f"{op}CodecUs"]
+        results.append(row)
+        print(
+            f"{name:18s} encode {row['encodeCodecUs']:10.1f} us vs {row['encodeBoto3Us']:10.1f} us "
+            f"({row['encodeSpeedup']:.1f}x)   decode {row['decodeCodecUs']:10.1f} us vs "
+            f"{row['decodeBoto3Us']:10.1f} us ({row['decodeSpeedup']:.1f}x)",
+            flush=True,
+        )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", default="1,10,100,1000", help="Comma-separated order line counts")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds to time each case for")
+    parser.add_argument("--json", dest="json_out")
+    args = parser.parse_args(argv)
+
+    results = run([int(n) for n in args.lines.split(",")], args.min_time)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Offline micro-benchmarks for the Lambda handlers, the producer and the consumers
+
+Every AWS call is answered in-process by benchmarks/offline_aws.py, so the
+numbers cover our code plus boto3 request/response handling and nothing
+else. For each case the suite reports invocations per second (from the
+median call time), p50/p99 latency, AWS calls per invocation and, in a
+separate tracemalloc pass, peak and retained allocations per call.
+With --dynamodb memory the DAOs run against the in-memory DynamoDB
+(benchmarks/fake_dynamodb.py), optionally with injected latency and
+throttling, instead of canned responses.
+
+Results can be saved as a JSON baseline and later runs compared against it;
+a case that is slower or allocates more than --threshold, or makes more AWS
+calls of any operation than the baseline, fails the run. Requests that
+offline_aws rejects as malformed always fail the run.
+
+Usage:
+    python benchmarks/micro.py [--quick] [--filter SUBSTR] [--json OUT]
+                               [--baseline FILE] [--save-baseline FILE]
+                               [--threshold 0.25] [--dynamodb canned|memory]
+                               [--ddb-latency-ms MS] [--ddb-throttle-rate R]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT, "src")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "micro.json")
+
+BATCH_SIZES = (1, 10, 100, 1000)
+ORDER_LINES = (1, 10, 100, 1000)
+# POST /orders/batch accepts at most MAX_BATCH_ORDERS orders
+ORDER_BATCH_SIZES = (1, 10, 100, 500)
+
+# Environment the handlers read at import time
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("EVENT_BUS_NAME", "benchmark-bus")
+os.environ.pop("XRAY_AUTO_PATCH", None)
+sys.path.insert(0, SRC_DIR)
+
+from offline_aws import OfflineAWS, reset_cached_clients  # noqa: E402
+
+
+class Case:
+    """A benchmarked callable; setup() builds fresh arguments, untimed"""
+
+    def __init__(self, name, func, setup):
+        self.name = name
+        self.func = func
+        self.setup = setup
+
+
+# ---------------------------------------------------------------------------
+# Event builders
+# ---------------------------------------------------------------------------
+
+
+def _order_lines(count):
+    return [
+        {"vendorId": f"vendor-{i % 7}", "productId": f"product-{i}", "quantity": 1 + i % 3, "price": "9.99"}
+        for i in range(count)
+    ]
+
+
+def _api_event(body):
+    return {"headers": {"Content-Type": "application/json"}, "body": json.dumps(body)}
+
+
+def _sqs_event(detail_type, details):
+    return {
+        "Records": [
+            {
+                "messageId": str(uuid.uuid4()),
+                "body": json.dumps(
+                    {"detail-type": detail_type, "source": "order.service", "detail": detail}
+                ),
+            }
+            for detail in details
+        ]
+    }
+
+
+def _order_placed(lines):
+    return {
+        "orderId": str(uuid.uuid4()),
+        "customerId": "customer-1",
+        "items": _order_lines(lines),
+        "totalAmount": 19.98 * lines,
+    }
+
+
+def _payment_processed():
+    return {"paymentId": str(uuid.uuid4()), "orderId": str(uuid.uuid4()), "amount": 19.98, "status": "completed"}
+
+
+# ---------------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------------
+
+
+def build_cases():
+    from handlers import order_handler, payment_handler, inventory_handler
+    from events.producer import producer
+    from events.consumers import (
+        inventory_consumer, payment_consumer, notification_consumer, status_consumer,
+    )
+
+    cases = []
+    for lines in ORDER_LINES:
+        body = {"customerId": "customer-1", "items": _order_lines(lines)}
+        cases.append(Case(
+            f"order_handler/lines={lines}",
+            order_handler.lambda_handler,
+            lambda body=body: (_api_event(body), None),
+        ))
+    for size in ORDER_BATCH_SIZES:
+        body = {"orders": [{"customerId": "customer-1", "items": _order_lines(3)} for _ in range(size)]}
+        cases.append(Case(
+            f"order_batch_handler/batch={size}",
+            order_handler.batch_lambda_handler,
+            lambda body=body: (_api_event(body), None),
+        ))
+    cases.append(Case(
+        "payment_handler",
+        payment_handler.lambda_handler,
+        lambda: (_api_event({"orderId": str(uuid.uuid4()), "amount": 19.98, "paymentMethod": "card"}), None),
+    ))
+    cases.append(Case(
+        "inventory_handler",
+        inventory_handler.lambda_handler,
+        lambda: (_api_event({"vendorId": "vendor-1", "productId": "product-1", "quantity": -1}), None),
+    ))
+
+    def publish_buffered(details):
+        producer.event_producer.start_buffering()
+        try:
+            for detail in details:
+                producer.publish_order_placed(detail)
+        finally:
+            producer.event_producer.stop_buffering()
+
+    for size in BATCH_SIZES:
+        cases.append(Case(
+            f"producer/batch={size}",
+            publish_buffered,
+            lambda size=size: ([_order_placed(3) for _ in range(size)],),
+        ))
+
+    for size in BATCH_SIZES:
+        cases.append(Case(
+            f"inventory_consumer/batch={size}",
+            inventory_consumer.lambda_handler,
+            lambda size=size: (_sqs_event("OrderPlaced", [_order_placed(3) for _ in range(size)]), None),
+        ))
+    for lines in ORDER_LINES:
+        cases.append(Case(
+            f"inventory_consumer/lines={lines}",
+            inventory_consumer.lambda_handler,
+            lambda lines=lines: (_sqs_event("OrderPlaced", [_order_placed(lines)]), None),
+        ))
+    for size in BATCH_SIZES:
+        cases.append(Case(
+            f"payment_consumer/batch={size}",
+            payment_consumer.lambda_handler,
+            lambda size=size: (_sqs_event("OrderPlaced", [_order_placed(3) for _ in range(size)]), None),
+        ))
+    for size in BATCH_SIZES:
+        cases.append(Case(
+            f"status_consumer/batch={size}",
+            status_consumer.lambda_handler,
+            lambda size=size: (_sqs_event("PaymentProcessed", [_payment_processed() for _ in range(size)]), None),
+        ))
+    for size in BATCH_SIZES:
+        cases.append(Case(
+            f"notification_consumer/batch={size}",
+            notification_consumer.lambda_handler,
+            lambda size=size: (_sqs_event("PaymentProcessed", [_payment_processed() for _ in range(size)]), None),
+        ))
+    return cases
+
+
+def seed_inventory(quantity=10 ** 9):
+    """Stock every product the generated orders use"""
+    from dao.inventory_dao import apply_inventory_changes, MAX_TRANSACTION_ITEMS
+    from dao.records import InventoryChange
+
+    changes = [
+        InventoryChange(line["vendorId"], line["productId"], quantity)
+        for line in _order_lines(max(ORDER_LINES))
+    ]
+    changes.append(InventoryChange("vendor-1", "product-1", quantity))
+    for index in range(0, len(changes), MAX_TRANSACTION_ITEMS):
+        apply_inventory_changes(changes[index:index + MAX_TRANSACTION_ITEMS])
+
+
+def seed_catalog():
+    """List every product the generated orders use in the catalog table"""
+    from decimal import Decimal
+    from common.aws_clients import get_client
+    from dao.catalog_dao import CATALOG_TABLE
+    from dao.codecs import CATALOG
+    from offline_aws import CATALOG_PRICE
+
+    products = {(line["vendorId"], line["productId"]) for line in _order_lines(max(ORDER_LINES))}
+    products.add(("vendor-1", "product-1"))
+    puts = [
+        {"PutRequest": {"Item": CATALOG.encode({
+            "vendorId": vendor_id,
+            "productId": product_id,
+            "price": Decimal(CATALOG_PRICE),
+            "currency": "USD",
+        })}}
+        for vendor_id, product_id in sorted(products)
+    ]
+    client = get_client("dynamodb")
+    for index in range(0, len(puts), 25):
+        request = {CATALOG_TABLE: puts[index:index + 25]}
+        while request:
+            request = client.batch_write_item(RequestItems=request).get("UnprocessedItems")
+
+
+def install_aws(dynamodb="canned", latency_ms=0.0, throttle_rate=0.0, seed=None):
+    """Install the offline AWS clients; return the OfflineAWS transport"""
+    if dynamodb == "memory":
+        from fake_dynamodb import FakeDynamoDB
+
+        aws = FakeDynamoDB.from_template(
+            latency_ms=latency_ms, throttle_rate=throttle_rate, seed=seed
+        ).install()
+        seed_inventory()
+        seed_catalog()
+        return aws
+    aws = OfflineAWS().install()
+    reset_cached_clients()
+    return aws
+
+
+def silence_output():
+    """Send log lines and EMF metrics to /dev/null (they are still formatted)"""
+    from common import logger
+    from common.metrics import metrics
+
+    devnull = open(os.devnull, "w")
+    logger._handler.setStream(devnull)
+    metrics.stream = devnull
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+
+def measure(case, aws, min_time, min_iterations, alloc_iterations):
+    rejected_before = len(aws.rejected)
+    # Warm up caches, lazy clients and imports
+    case.func(*case.setup())
+
+    aws.reset_counts()
+    samples = []
+    total = 0.0
+    while len(samples) < min_iterations or total < min_time:
+        args = case.setup()
+        start = time.perf_counter()
+        case.func(*args)
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        total += elapsed
+    calls = {op: round(count / len(samples), 2) for op, count in sorted(aws.calls.items())}
+
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            args = case.setup()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            case.func(*args)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+            del args
+    finally:
+        tracemalloc.stop()
+
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "name": case.name,
+        "iterations": len(samples),
+        "ips": round(1.0 / median, 2),
+        "p50_ms": round(median * 1000, 4),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 4),
+        "peak_alloc_kb": round(statistics.median(peaks) / 1024, 2),
+        "retained_kb": round(statistics.median(retained) / 1024, 2),
+        "aws_calls": calls,
+        "rejected_requests": aws.rejected[rejected_before:],
+    }
+
+
+def compare(results, baseline, threshold, dynamodb="canned", check_calls=True):
+    """
+    Return a list of regression messages against the baseline: slower or
+    more allocating cases, and (unless check_calls is false, e.g. with
+    injected throttling) cases making more AWS calls of any operation
+    """
+    if baseline.get("dynamodb", "canned") != dynamodb:
+        print(f"Baseline was recorded with --dynamodb {baseline.get('dynamodb', 'canned')}; not comparing")
+        return []
+    previous = {entry["name"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        base = previous.get(result["name"])
+        if base is None:
+            continue
+        if result["ips"] < base["ips"] * (1 - threshold):
+            regressions.append(
+                f"{result['name']}: {result['ips']} ips vs baseline {base['ips']} ips"
+            )
+        if result["peak_alloc_kb"] > base["peak_alloc_kb"] * (1 + threshold) + 1:
+            regressions.append(
+                f"{result['name']}: {result['peak_alloc_kb']} KB peak vs baseline {base['peak_alloc_kb']} KB"
+            )
+        if check_calls:
+            base_calls = base.get("aws_calls", {})
+            for operation, count in result["aws_calls"].items():
+                # Counts are per-invocation averages rounded to 0.01
+                if count > base_calls.get(operation, 0) + 0.01:
+                    regressions.append(
+                        f"{result['name']}: {count} {operation} calls vs baseline "
+                        f"{base_calls.get(operation, 0)}"
+                    )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Shorter runs, for smoke checks")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--json", dest="json_out")
+    parser.add_argument("--baseline", help=f"Compare against a baseline (e.g. {os.path.relpath(DEFAULT_BASELINE, ROOT)})")
+    parser.add_argument("--save-baseline", help="Write the results as a new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed relative slowdown / allocation growth (default 0.25)")
+    parser.add_argument("--dynamodb", choices=("canned", "memory"), default="canned",
+                        help="Canned success responses, or the in-memory DynamoDB")
+    parser.add_argument("--ddb-latency-ms", type=float, default=0.0,
+                        help="Latency added to each in-memory DynamoDB call")
+    parser.add_argument("--ddb-throttle-rate", type=float, default=0.0,
+                        help="Share of in-memory DynamoDB calls that are throttled")
+    args = parser.parse_args(argv)
+
+    min_time, min_iterations, alloc_iterations = (0.2, 3, 2) if args.quick else (1.0, 10, 5)
+
+    silence_output()
+    aws = install_aws(args.dynamodb, args.ddb_latency_ms, args.ddb_throttle_rate, seed=1)
+
+    results = []
+    for case in build_cases():
+        if args.filter not in case.name:
+            continue
+        result = measure(case, aws, min_time, min_iterations, alloc_iterations)
+        results.append(result)
+        print(
+            f"{case.name:40s} {result['ips']:10.1f} ips  p50 {result['p50_ms']:9.3f} ms  "
+            f"p99 {result['p99_ms']:9.3f} ms  peak {result['peak_alloc_kb']:9.1f} KB",
+            flush=True,
+        )
+        for message in sorted(set(result["rejected_requests"])):
+            print(f"    REJECTED {message}", flush=True)
+
+    report = {"python": sys.version.split()[0], "dynamodb": args.dynamodb, "results": results}
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    # Malformed requests fail the run even when the code swallowed the error
+    rejected = [result["name"] for result in results if result["rejected_requests"]]
+    if rejected:
+        print(f"Malformed AWS requests in: {', '.join(rejected)}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.dynamodb,
+                                  check_calls=not args.ddb_throttle_rate)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+    return 1 if regressions or rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
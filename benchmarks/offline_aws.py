@@ -0,0 +1,319 @@
+"""
+Offline AWS transport for benchmarks
+
+Real boto3 clients are built (so request serialization, response parsing and
+retry handling are part of what is measured) but every HTTP request is
+answered in-process from a canned success response. Nothing leaves the
+machine and no credentials are needed. DynamoDB and PutEvents requests are
+checked against the tables' key schemas and the API's shape rules first, so
+malformed requests fail as they would against AWS.
+"""
+import json
+from collections import Counter
+
+import boto3
+from botocore.awsrequest import AWSResponse
+
+from common import aws_clients
+
+REGION = "us-east-1"
+
+
+class ServiceError(Exception):
+    """
+    Raised by a response function to answer with an AWS error; extra
+    fields (e.g. CancellationReasons) are added to the error body
+    """
+
+    def __init__(self, code, message, status=400, **fields):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.fields = fields
+
+
+class _Body:
+    """Minimal urllib3-style raw body for AWSResponse"""
+
+    def __init__(self, data):
+        self._data = data
+
+    def stream(self, **kwargs):
+        yield self._data
+
+
+# ---------------------------------------------------------------------------
+# Request shape checks
+#
+# boto3 validates parameter types but not what the values mean, so a
+# double-serialized attribute ({"M": {"S": {"S": "x"}}}) or an item keyed
+# with the wrong type is sent as-is. Such requests are answered with the
+# ValidationException DynamoDB would return and recorded in
+# OfflineAWS.rejected, whatever the response table says.
+# ---------------------------------------------------------------------------
+
+_SCALAR_TYPES = {"S": str, "N": str, "B": str}
+
+
+def _key_types():
+    """Table name -> {key attribute: S|N|B}, from the SAM template"""
+    global _KEY_TYPES
+    if _KEY_TYPES is None:
+        import yaml
+        from fake_dynamodb import TEMPLATE, default_table_names
+
+        with open(TEMPLATE) as f:
+            resources = yaml.safe_load(f)["Resources"]
+        _KEY_TYPES = {}
+        for logical_id, name in default_table_names().items():
+            properties = resources[logical_id]["Properties"]
+            types = {
+                attribute["AttributeName"]: attribute["AttributeType"]
+                for attribute in properties["AttributeDefinitions"]
+            }
+            _KEY_TYPES[name] = {
+                key["AttributeName"]: types[key["AttributeName"]] for key in properties["KeySchema"]
+            }
+    return _KEY_TYPES
+
+
+_KEY_TYPES = None
+
+
+def _check_value(value, path):
+    if not isinstance(value, dict) or len(value) != 1:
+        return f"{path}: not an attribute value"
+    (kind, raw), = value.items()
+    if kind in _SCALAR_TYPES:
+        if not isinstance(raw, str):
+            return f"{path}: {kind} value must be a string"
+        if kind == "N":
+            try:
+                float(raw)
+            except ValueError:
+                return f"{path}: invalid number {raw!r}"
+        return None
+    if kind == "BOOL":
+        return None if isinstance(raw, bool) else f"{path}: BOOL value must be a boolean"
+    if kind == "NULL":
+        return None if raw is True else f"{path}: NULL value must be true"
+    if kind == "M":
+        if not isinstance(raw, dict):
+            return f"{path}: M value must be a map"
+        return _check_attributes(raw, path)
+    if kind == "L":
+        if not isinstance(raw, list):
+            return f"{path}: L value must be a list"
+        for index, item in enumerate(raw):
+            error = _check_value(item, f"{path}[{index}]")
+            if error:
+                return error
+        return None
+    if kind in ("SS", "NS", "BS"):
+        if not raw or not all(isinstance(item, str) for item in raw):
+            return f"{path}: {kind} value must be a non-empty list of strings"
+        return None
+    return f"{path}: unknown attribute type {kind}"
+
+
+def _check_attributes(attributes, path):
+    for name, value in (attributes or {}).items():
+        error = _check_value(value, f"{path}.{name}")
+        if error:
+            return error
+    return None
+
+
+def _check_key(table, attributes, path, exact):
+    """Key attributes of table are present with their declared scalar type"""
+    key_types = _key_types().get(table)
+    if key_types is None:
+        return f"{path}: unknown table {table}"
+    if not isinstance(attributes, dict):
+        return f"{path}: not an attribute map"
+    if exact and set(attributes) != set(key_types):
+        return f"{path}: key attributes {sorted(attributes)} do not match {sorted(key_types)}"
+    for name, kind in key_types.items():
+        value = attributes.get(name)
+        if not isinstance(value, dict) or list(value) != [kind]:
+            return f"{path}.{name}: key attribute must be of type {kind}, got {value!r}"
+    return _check_attributes(attributes, path)
+
+
+def _check_action(table, action, path):
+    """One single-table request: Item/Key plus expression values"""
+    if "Item" in action:
+        error = _check_key(table, action["Item"], f"{path}.Item", exact=False)
+    elif "Key" in action:
+        error = _check_key(table, action["Key"], f"{path}.Key", exact=True)
+    elif table not in _key_types():
+        error = f"{path}: unknown table {table}"
+    else:
+        error = None
+    return error or _check_attributes(
+        action.get("ExpressionAttributeValues"), f"{path}.ExpressionAttributeValues"
+    )
+
+
+def check_dynamodb_request(operation, body):
+    """Description of what is wrong with a DynamoDB request, or None"""
+    if operation in ("PutItem", "GetItem", "DeleteItem", "UpdateItem", "Query"):
+        return _check_action(body.get("TableName"), body, operation)
+    if operation == "BatchGetItem":
+        for table, request in body.get("RequestItems", {}).items():
+            for index, key in enumerate(request.get("Keys", [])):
+                error = _check_key(table, key, f"{operation}.{table}.Keys[{index}]", exact=True)
+                if error:
+                    return error
+        return None
+    if operation == "BatchWriteItem":
+        for table, requests in body.get("RequestItems", {}).items():
+            for index, request in enumerate(requests):
+                (kind, action), = request.items()
+                error = _check_action(table, action, f"{operation}.{table}[{index}].{kind}")
+                if error:
+                    return error
+        return None
+    if operation == "TransactWriteItems":
+        for index, request in enumerate(body.get("TransactItems", [])):
+            (kind, action), = request.items()
+            error = _check_action(action.get("TableName"), action, f"{operation}[{index}].{kind}")
+            if error:
+                return error
+        return None
+    return None
+
+
+def check_events_request(operation, body):
+    """Description of what is wrong with a PutEvents request, or None"""
+    if operation != "PutEvents":
+        return None
+    entries = body.get("Entries", [])
+    if not 1 <= len(entries) <= 10:
+        return f"PutEvents: {len(entries)} entries (1 to 10 allowed)"
+    for index, entry in enumerate(entries):
+        for name in ("Source", "DetailType", "Detail"):
+            if not entry.get(name):
+                return f"PutEvents.Entries[{index}]: {name} is required"
+        try:
+            detail = json.loads(entry["Detail"])
+        except ValueError:
+            return f"PutEvents.Entries[{index}]: Detail is not JSON"
+        if not isinstance(detail, dict):
+            return f"PutEvents.Entries[{index}]: Detail must be a JSON object"
+    return None
+
+
+# Unit price of every product in the canned catalog
+CATALOG_PRICE = "9.99"
+
+
+def _batch_get_item(body):
+    """Every requested catalog product exists; other tables are empty"""
+    from dao.catalog_dao import CATALOG_TABLE
+
+    responses = {}
+    catalog = body["RequestItems"].get(CATALOG_TABLE)
+    if catalog:
+        responses[CATALOG_TABLE] = [
+            dict(key, price={"N": CATALOG_PRICE}, currency={"S": "USD"})
+            for key in catalog["Keys"]
+        ]
+    return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+# X-Amz-Target -> function(request body dict) -> response body dict
+DEFAULT_RESPONSES = {
+    "DynamoDB_20120810.PutItem": lambda body: {},
+    "DynamoDB_20120810.GetItem": lambda body: {},
+    "DynamoDB_20120810.DeleteItem": lambda body: {},
+    "DynamoDB_20120810.UpdateItem": lambda body: {
+        "Attributes": {"quantity": {"N": "1000000"}}
+    },
+    "DynamoDB_20120810.TransactWriteItems": lambda body: {},
+    "DynamoDB_20120810.BatchGetItem": _batch_get_item,
+    "DynamoDB_20120810.BatchWriteItem": lambda body: {"UnprocessedItems": {}},
+    "AWSEvents.PutEvents": lambda body: {
+        "FailedEntryCount": 0,
+        "Entries": [{"EventId": str(i)} for i in range(len(body.get("Entries", [])))],
+    },
+}
+
+
+class OfflineAWS:
+    """
+    Answers every request of the clients it installs from a table of canned
+    responses and counts the calls made per operation
+    """
+
+    def __init__(self, responses=None):
+        self.responses = dict(DEFAULT_RESPONSES, **(responses or {}))
+        self.calls = Counter()
+        # Requests refused by the shape checks, as messages
+        self.rejected = []
+        self.session = boto3.session.Session(
+            aws_access_key_id="benchmark",
+            aws_secret_access_key="benchmark",
+            region_name=REGION,
+        )
+        self.session.events.register("before-send", self._respond)
+
+    def _respond(self, request, **kwargs):
+        target = request.headers.get("X-Amz-Target")
+        if isinstance(target, bytes):
+            target = target.decode()
+        handler = self.responses.get(target)
+        if handler is None:
+            raise RuntimeError(f"No offline response for {target}")
+        operation = target.split(".", 1)[-1]
+        self.calls[operation] += 1
+        body = json.loads(request.body or b"{}")
+        headers = {"Content-Type": "application/x-amz-json-1.0"}
+        check = check_dynamodb_request if target.startswith("DynamoDB_") else check_events_request
+        try:
+            problem = check(operation, body)
+            if problem:
+                self.rejected.append(problem)
+                raise ServiceError("ValidationException", problem)
+            payload = handler(body)
+            status = 200
+        except ServiceError as e:
+            payload = dict(e.fields, __type=e.code, message=e.message)
+            headers["x-amzn-ErrorType"] = e.code
+            status = e.status
+        return AWSResponse(request.url, status, headers, _Body(json.dumps(payload).encode()))
+
+    def install(self):
+        """Make the shared client registry hand out the offline clients"""
+        aws_clients.reset_clients()
+        aws_clients.set_resource(
+            "dynamodb", self.session.resource("dynamodb", config=aws_clients.build_config("dynamodb"))
+        )
+        for service in ("dynamodb", "events"):
+            aws_clients.set_client(
+                service, self.session.client(service, config=aws_clients.build_config(service))
+            )
+        return self
+
+    def reset_counts(self):
+        self.calls.clear()
+
+
+def reset_cached_clients():
+    """Drop the clients cached by the DAOs and the producer, and cached catalog prices"""
+    import dao.order_dao
+    import dao.payment_dao
+    import dao.inventory_dao
+    import dao.catalog_dao
+    import common.idempotency
+    from events.producer import producer
+    from services import order_service
+
+    for module in (dao.order_dao, dao.payment_dao, dao.inventory_dao, dao.catalog_dao,
+                   common.idempotency):
+        for name in ("_dynamodb", "_client", "_table"):
+            if hasattr(module, name):
+                setattr(module, name, None)
+    producer.event_producer._eventbridge_client = None
+    order_service.clear_catalog_cache()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+End-to-end load driver for the order pipeline, run entirely in-process
+
+Synthetic API Gateway events are sent into order_handler at a target rate.
+OrderPlaced and the follow-up events travel through the EventBridge
+emulator (benchmarks/event_bus.py) to the consumers; DynamoDB is answered
+by the offline transport (canned responses, or the in-memory DynamoDB with
+--dynamodb memory, which tracks stock and idempotency for real). An order counts as done once the notification
+consumer has handled its OrderPlaced, PaymentProcessed and InventoryUpdated
+events, and the time from the API call to that point is its end-to-end
+latency.
+
+Usage:
+    python benchmarks/pipeline_load.py [--rate 50] [--duration 10] [--lines 3]
+        [--latency-ms 20] [--jitter-ms 5] [--batch-size N] [--batching-window S]
+        [--put-failure-rate 0] [--consumer-failure-rate 0] [--seed 1] [--json OUT]
+        [--dynamodb canned|memory] [--ddb-latency-ms MS] [--ddb-throttle-rate R]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from micro import _api_event, _order_lines, install_aws, silence_output
+from event_bus import EventBus
+
+# Notifications that complete an order
+FINAL_QUEUE = "NotificationQueue"
+COMPLETING_EVENTS = frozenset({"OrderPlaced", "PaymentProcessed", "InventoryUpdated"})
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class OrderTracker:
+    """Follows orders from the API call to their last notification"""
+
+    def __init__(self):
+        self.started = {}
+        self.seen = {}
+        self.completed = {}
+
+    def placed(self, order_id, started_at):
+        self.started[order_id] = started_at
+        self.seen[order_id] = set()
+
+    def on_delivered(self, queue_name, detail_type, detail, now):
+        order_id = detail.get("orderId")
+        if queue_name != FINAL_QUEUE or order_id not in self.seen:
+            return
+        self.seen[order_id].add(detail_type)
+        if order_id not in self.completed and COMPLETING_EVENTS <= self.seen[order_id]:
+            self.completed[order_id] = now
+
+    def latencies_ms(self):
+        return sorted(
+            (done - self.started[order_id]) * 1000.0 for order_id, done in self.completed.items()
+        )
+
+
+def run(args):
+    from handlers import order_handler
+
+    silence_output()
+    install_aws(args.dynamodb, args.ddb_latency_ms, args.ddb_throttle_rate, seed=args.seed)
+    bus = EventBus.from_template(
+        batch_size=args.batch_size,
+        batching_window=args.batching_window,
+        delivery_latency_ms=args.latency_ms,
+        delivery_jitter_ms=args.jitter_ms,
+        put_failure_rate=args.put_failure_rate,
+        consumer_failure_rate=args.consumer_failure_rate,
+        seed=args.seed,
+    ).install()
+
+    tracker = OrderTracker()
+    bus.listeners.append(tracker.on_delivered)
+    body = {"customerId": "load-test", "items": _order_lines(args.lines)}
+
+    interval = 1.0 / args.rate
+    start = time.monotonic()
+    next_send = start
+    end = start + args.duration
+    api_errors = 0
+    while True:
+        now = time.monotonic()
+        if now >= end:
+            break
+        if now >= next_send:
+            response = order_handler.lambda_handler(_api_event(body), None)
+            if response["statusCode"] == 201:
+                tracker.placed(json.loads(response["body"])["orderId"], now)
+            else:
+                api_errors += 1
+            next_send += interval
+            continue
+        if not bus.pump():
+            time.sleep(min(max(next_send - time.monotonic(), 0.0), 0.001))
+    sending_seconds = time.monotonic() - start
+    try:
+        bus.run_until_idle(timeout=args.drain_timeout)
+    except TimeoutError as e:
+        print(f"warning: {e}", file=sys.stderr)
+
+    latencies = tracker.latencies_ms()
+    return {
+        "targetRate": args.rate,
+        "achievedRate": round(len(tracker.started) / sending_seconds, 2),
+        "ordersPlaced": len(tracker.started),
+        "ordersCompleted": len(latencies),
+        "apiErrors": api_errors,
+        "endToEndMs": {
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else None,
+            "mean": statistics.fmean(latencies) if latencies else None,
+        },
+        "bus": bus.stats(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=50.0, help="Orders per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to send orders for")
+    parser.add_argument("--lines", type=int, default=3, help="Lines per order")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mean EventBridge->SQS delivery delay")
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, help="Override the template's consumer batch size")
+    parser.add_argument("--batching-window", type=float, help="Override the batching window (seconds)")
+    parser.add_argument("--put-failure-rate", type=float, default=0.0)
+    parser.add_argument("--consumer-failure-rate", type=float, default=0.0)
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--dynamodb", choices=("canned", "memory"), default="canned")
+    parser.add_argument("--ddb-latency-ms", type=float, default=0.0)
+    parser.add_argument("--ddb-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", dest="json_out")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    latency = report["endToEndMs"]
+    print(
+        f"orders placed {report['ordersPlaced']} ({report['achievedRate']}/s of {args.rate}/s), "
+        f"completed {report['ordersCompleted']}, API errors {report['apiErrors']}"
+    )
+    if latency["p50"] is not None:
+        print(
+            "end-to-end ms: "
+            + "  ".join(f"{name} {latency[name]:.1f}" for name in ("p50", "p90", "p99", "max"))
+        )
+    for name, queue in report["bus"]["queues"].items():
+        print(
+            f"  {name:20s} invocations {queue['invocations']:6d}  failed records "
+            f"{queue['failedRecords']:5d}  DLQ {queue['deadLetters']:4d}  pending {queue['pending']}"
+        )
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Request validation benchmark: cost of the compiled endpoint schemas per request
+
+Validates POST /orders bodies with 1 to 1000 lines, an invalid order (every
+line broken, so error collection stops at MAX_REPORTED_ERRORS), and the
+payment and inventory bodies, and prints the time per request next to the
+old top-level required-key check (validate_request) for reference.
+
+Usage:
+    python benchmarks/validation.py [--lines 1,10,100,1000] [--min-time 0.2] [--json OUT]
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from common.exceptions import BadRequestException  # noqa: E402
+from common.validation import (  # noqa: E402
+    INVENTORY_REQUEST,
+    ORDER_REQUEST,
+    PAYMENT_REQUEST,
+    validate_request,
+)
+from item_codecs import time_per_call  # noqa: E402
+from micro import _order_lines  # noqa: E402
+
+
+def rejects(validator):
+    """validate() as a function that returns once the body is rejected"""
+    def validate(body):
+        try:
+            validator.validate(body)
+        except BadRequestException:
+            return
+        raise SystemExit("invalid body was accepted")
+
+    return validate
+
+
+def cases(line_counts):
+    for n in line_counts:
+        body = {"customerId": "customer-1", "items": _order_lines(n)}
+        yield f"order lines={n}", ORDER_REQUEST.validate, body, ["customerId", "items"]
+    invalid = {
+        "customerId": "customer-1",
+        "items": [{"vendorId": "vendor-1", "quantity": -1}] * max(line_counts),
+    }
+    yield f"invalid order lines={max(line_counts)}", rejects(ORDER_REQUEST), invalid, ["customerId", "items"]
+    payment = {"orderId": "2f1c8f6e-6a0b-4f38-9a53-6d1e7b1c2a90", "amount": "59.97", "paymentMethod": "card"}
+    yield "payment", PAYMENT_REQUEST.validate, payment, ["orderId", "amount", "paymentMethod"]
+    inventory = {"vendorId": "vendor-1", "productId": "product-1", "quantity": -1}
+    yield "inventory", INVENTORY_REQUEST.validate, inventory, ["vendorId", "productId", "quantity"]
+
+
+def run(line_counts, min_time):
+    results = []
+    for name, validate, body, required in cases(line_counts):
+        schema_us = time_per_call(validate, body, min_time) * 1e6
+        keys_us = time_per_call(lambda b: validate_request(b, required_fields=required), body, min_time) * 1e6
+        row = {"case": name, "schemaUs": schema_us, "requiredKeysUs": keys_us}
+        results.append(row)
+        print(f"{name:28s} schema {schema_us:9.2f} us   required keys only {keys_us:7.2f} us", flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", default="1,10,100,1000", help="Comma-separated order line counts")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds to time each case for")
+    parser.add_argument("--json", dest="json_out")
+    args = parser.parse_args(argv)
+
+    results = run([int(n) for n in args.lines.split(",")], args.min_time)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
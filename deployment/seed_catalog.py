@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Load product prices into the Catalog table
+
+Order lines are priced from the Catalog table only, so every product that
+can be ordered must be listed there before POST /orders receives traffic;
+lines for unlisted products are rejected with a 400 (unknown product).
+
+Rollout for a new stack or a new product range:
+  1. sam deploy (creates the table, output CatalogTableName)
+  2. python deployment/seed_catalog.py --stack <stack_name> catalog.csv
+  3. Route traffic / announce the products
+
+Re-running the script with an updated file overwrites the listed prices;
+order handlers pick changes up within CATALOG_CACHE_TTL_SECONDS. Every row
+is validated (known currency, non-negative amount with no more decimal
+places than the currency allows) before anything is written.
+
+Input is CSV with a vendorId,productId,price,currency header, or a JSON
+array of objects with the same keys.
+
+Usage:
+    python deployment/seed_catalog.py (--table NAME | --stack STACK) FILE [--region R] [--dry-run]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import boto3  # noqa: E402
+
+from common.exceptions import ErrorDetail  # noqa: E402
+from common.money import from_minor_units, to_minor_units  # noqa: E402
+
+FIELDS = ("vendorId", "productId", "price", "currency")
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return list(csv.DictReader(f))
+
+
+def catalog_items(rows):
+    """Validated catalog items; exits listing every invalid row"""
+    items = {}
+    errors = []
+    for number, row in enumerate(rows, 1):
+        missing = [name for name in FIELDS if not row.get(name)]
+        if missing:
+            errors.append(f"row {number}: missing {', '.join(missing)}")
+            continue
+        try:
+            minor = to_minor_units(row["price"], row["currency"], "price")
+        except ErrorDetail as e:
+            errors.append(f"row {number}: {e.recommendedData['details']}")
+            continue
+        if minor < 0:
+            errors.append(f"row {number}: price is negative")
+            continue
+        key = (row["vendorId"], row["productId"])
+        if key in items:
+            errors.append(f"row {number}: duplicate product {key[0]}/{key[1]}")
+            continue
+        items[key] = {
+            "vendorId": key[0],
+            "productId": key[1],
+            "price": from_minor_units(minor, row["currency"]),
+            "currency": row["currency"],
+        }
+    if errors:
+        raise SystemExit("\n".join(errors))
+    return list(items.values())
+
+
+def stack_table_name(session, stack):
+    outputs = session.client("cloudformation").describe_stacks(StackName=stack)["Stacks"][0]["Outputs"]
+    for output in outputs:
+        if output["OutputKey"] == "CatalogTableName":
+            return output["OutputValue"]
+    raise SystemExit(f"Stack {stack} has no CatalogTableName output")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--table", help="Catalog table name")
+    target.add_argument("--stack", help="Stack whose CatalogTableName output is used")
+    parser.add_argument("file", help="CSV or JSON file of products")
+    parser.add_argument("--region")
+    parser.add_argument("--dry-run", action="store_true", help="Validate the file only")
+    args = parser.parse_args(argv)
+
+    items = catalog_items(read_rows(args.file))
+    if args.dry_run:
+        print(f"{len(items)} catalog entries are valid")
+        return 0
+
+    session = boto3.session.Session(region_name=args.region)
+    table_name = args.table or stack_table_name(session, args.stack)
+    # batch_writer sends 25-item BatchWriteItem calls and retries unprocessed items
+    with session.resource("dynamodb").Table(table_name).batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+    print(f"Wrote {len(items)} catalog entries to {table_name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# Caches for the custom authorizer, kept per warm container
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+from common.aws_clients import get_client
+from common.cache import TTLCache
+
+logger = logging.getLogger()
+
+SECRET_CACHE_TTL_SECONDS = int(os.getenv("AUTH_SECRET_CACHE_TTL_SECONDS", "300"))
+# Unknown users are remembered for a shorter time so new users appear quickly
+NEGATIVE_CACHE_TTL_SECONDS = int(os.getenv("AUTH_NEGATIVE_CACHE_TTL_SECONDS", "60"))
+SECRET_CACHE_SIZE = int(os.getenv("AUTH_SECRET_CACHE_SIZE", "1024"))
+VERIFIED_CACHE_TTL_SECONDS = int(os.getenv("AUTH_VERIFIED_CACHE_TTL_SECONDS", "300"))
+VERIFIED_CACHE_SIZE = int(os.getenv("AUTH_VERIFIED_CACHE_SIZE", "1024"))
+
+# Marker stored for users that do not exist in Secrets Manager
+_UNKNOWN_USER = object()
+
+_secret_cache = TTLCache(SECRET_CACHE_SIZE, SECRET_CACHE_TTL_SECONDS)
+_verified_cache = TTLCache(VERIFIED_CACHE_SIZE, VERIFIED_CACHE_TTL_SECONDS)
+# Per-container key so cached token digests are useless outside this process
+_digest_key = secrets.token_bytes(32)
+
+
+def token_digest(token):
+    """Keyed digest of a raw credential, used as the verification cache key"""
+    return hmac.new(_digest_key, token.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def get_user_secret(username):
+    """
+    Fetch user/{username} from Secrets Manager through a TTL cache.
+
+    Unknown users are cached negatively; transient errors are not cached.
+    Returns the secret dict ({"password_hash": ..., "role": ...}) or None.
+    """
+    cached = _secret_cache.get(username)
+    if cached is _UNKNOWN_USER:
+        return None
+    if cached is not None:
+        return cached
+
+    client = get_client("secretsmanager")
+    try:
+        response = client.get_secret_value(SecretId=f"user/{username}")
+    except client.exceptions.ResourceNotFoundException:
+        _secret_cache.put(username, _UNKNOWN_USER, ttl_seconds=NEGATIVE_CACHE_TTL_SECONDS)
+        return None
+    except Exception as e:
+        logger.error(f"Secrets Manager error: {e}")
+        return None
+    secret = json.loads(response["SecretString"])
+    _secret_cache.put(username, secret)
+    return secret
+
+
+def verify_password(password, stored_hash):
+    """
+    Check a password against its stored hash.
+
+    Supports salted PBKDF2 hashes ("pbkdf2_sha256$<iterations>$<salt>$<hex>")
+    and, for existing users, unsalted SHA-256 hex digests.
+    """
+    if not stored_hash:
+        return False
+    if stored_hash.startswith("pbkdf2_sha256$"):
+        try:
+            _, iterations, salt, expected = stored_hash.split("$", 3)
+            derived = hashlib.pbkdf2_hmac(
+                "sha256", password.encode("utf-8"), salt.encode("utf-8"), int(iterations)
+            ).hex()
+        except ValueError:
+            return False
+        return hmac.compare_digest(derived, expected)
+    legacy = hashlib.sha256(password.encode("utf-8")).hexdigest()
+    return hmac.compare_digest(legacy, stored_hash)
+
+
+def verify_basic_credentials(token, username, password):
+    """
+    Verify Basic credentials, returning the user context or None.
+
+    Successful verifications are cached by token digest, so the (deliberately
+    slow) KDF runs once per credential per VERIFIED_CACHE_TTL_SECONDS. The
+    cached entry is bound to the stored hash it was checked against, so a
+    password change invalidates it as soon as the secret cache refreshes.
+    """
+    user_secret = get_user_secret(username)
+    if not user_secret:
+        logger.warning("User not found in Secrets Manager")
+        return None
+    stored_hash = user_secret.get("password_hash")
+
+    digest = token_digest(token)
+    cached = _verified_cache.get(digest)
+    if cached is not None and cached[0] == stored_hash:
+        return cached[1]
+
+    if not verify_password(password, stored_hash):
+        return None
+    user_context = {
+        "role": user_secret.get("role", "user"),
+        "username": username,
+    }
+    _verified_cache.put(digest, (stored_hash, user_context))
+    return user_context
+
+
+def clear_caches():
+    _secret_cache.clear()
+    _verified_cache.clear()
@@ -1,9 +1,10 @@
 import base64
-import json
-import os
 import logging
-import boto3
-import hashlib
+from authorizers.auth_cache import verify_basic_credentials
+from authorizers import jwt_verifier
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
 
 
 def generate_policy(principal_id, effect, resource, context=None):
@@ -25,31 +26,27 @@ def generate_policy(principal_id, effect, resource, context=None):
     return auth_response
 
 
-def lambda_handler(event, context):
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
+def api_wide_resource(method_arn):
+    """
+    Widen a method ARN to every method and path of the same API stage.
+
+    API Gateway caches the authorizer result per token; a policy scoped to
+    the single method that triggered it would deny the user's other routes.
+    """
+    if not method_arn:
+        return method_arn
+    # arn:aws:execute-api:{region}:{account}:{apiId}/{stage}/{method}/{path}
+    api_stage = method_arn.split("/", 2)[:2]
+    return "/".join(api_stage + ["*", "*"])
 
+
+def lambda_handler(event, context):
     token = event.get("authorizationToken")
     method_arn = event.get("methodArn")
     if not token:
         logger.warning("No authorization token provided")
         raise PermissionError("Unauthorized")
-
-    # Helper: fetch user secrets from AWS Secrets Manager
-    def get_user_secret(username):
-        secret_name = f"user/{username}"
-        # AWS Lambda automatically provides the region in the execution environment
-        region = boto3.Session().region_name or "us-east-1"
-        client = boto3.client("secretsmanager", region_name=region)
-        try:
-            get_secret_value_response = client.get_secret_value(SecretId=secret_name)
-            secret = json.loads(get_secret_value_response["SecretString"])
-            return secret  # expects {"password_hash": ..., "role": ...}
-        except client.exceptions.ResourceNotFoundException:
-            return None
-        except Exception as e:
-            logger.error(f"Secrets Manager error: {e}")
-            return None
+    resource = api_wide_resource(method_arn)
 
     # Example: Basic Auth (username:password base64)
     if token.startswith("Basic "):
@@ -57,18 +54,9 @@ def lambda_handler(event, context):
             b64_creds = token.split(" ")[1]
             creds = base64.b64decode(b64_creds).decode("utf-8")
             username, password = creds.split(":", 1)
-            user_secret = get_user_secret(username)
-            if not user_secret:
-                logger.warning("User not found in Secrets Manager")
-                raise PermissionError("Unauthorized")
-            # Passwords should be stored as salted hashes (e.g., SHA256)
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-            if password_hash == user_secret.get("password_hash"):
-                user_context = {
-                    "role": user_secret.get("role", "user"),
-                    "username": username,
-                }
-                return generate_policy(username, "Allow", method_arn, user_context)
+            user_context = verify_basic_credentials(token, username, password)
+            if user_context:
+                return generate_policy(username, "Allow", resource, user_context)
             else:
                 logger.warning("Invalid username or password")
                 raise PermissionError("Unauthorized")
@@ -76,17 +64,19 @@ def lambda_handler(event, context):
             logger.error(f"Basic auth error: {e}")
             raise PermissionError("Unauthorized")
 
-    # Example: Bearer token (role-based)
+    # Bearer token: JWT verified locally against cached JWKS keys
     if token.startswith("Bearer "):
-        jwt_token = token.split(" ")[1]
-        # Replace with real JWT validation and role extraction
-        # For demo, accept a static token
-        if jwt_token == os.getenv("AUTH_TOKEN", "demo-token"):
-            user_context = {"role": "user", "username": "demo"}
-            return generate_policy("demo", "Allow", method_arn, user_context)
-        else:
-            logger.warning("Invalid bearer token")
+        if not jwt_verifier.is_configured():
+            logger.error("Bearer token rejected: JWT_JWKS_URL/JWT_JWKS_FILE and JWT_AUDIENCE are not set")
+            raise PermissionError("Unauthorized")
+        try:
+            claims = jwt_verifier.verify_token(token.split(" ")[1])
+            user_context = jwt_verifier.user_context_from_claims(claims)
+        except jwt_verifier.InvalidTokenError as e:
+            logger.warning(f"Invalid bearer token: {e}")
             raise PermissionError("Unauthorized")
+        principal_id = str(claims.get("sub") or user_context["username"])
+        return generate_policy(principal_id, "Allow", resource, user_context)
 
     logger.warning("Unsupported authorization method")
     raise PermissionError("Unauthorized")
@@ -0,0 +1,224 @@
+# Local JWT verification for Bearer tokens, with cached signing keys
+#
+# Signing keys come from a JWKS document (JWT_JWKS_FILE or JWT_JWKS_URL)
+# loaded once per container and refreshed only when a token names an
+# unknown "kid". Tokens must name JWT_AUDIENCE in their aud claim; without
+# keys and an audience every Bearer token is rejected. Verified tokens are
+# cached until they expire, so warm invocations never touch the network
+# and rarely redo the RSA math.
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from common.cache import TTLCache
+
+logger = logging.getLogger()
+
+JWKS_FILE = os.getenv("JWT_JWKS_FILE")
+JWKS_URL = os.getenv("JWT_JWKS_URL")
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE")
+JWT_ISSUER = os.getenv("JWT_ISSUER")
+JWT_ROLES_CLAIM = os.getenv("JWT_ROLES_CLAIM", "roles")
+JWT_LEEWAY_SECONDS = int(os.getenv("JWT_LEEWAY_SECONDS", "30"))
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "4096"))
+# Unknown kids trigger at most one JWKS reload per interval
+JWKS_MIN_REFRESH_SECONDS = int(os.getenv("JWKS_MIN_REFRESH_SECONDS", "60"))
+JWKS_FETCH_TIMEOUT_SECONDS = float(os.getenv("JWKS_FETCH_TIMEOUT_SECONDS", "2"))
+
+# ASN.1 DigestInfo prefixes for EMSA-PKCS1-v1_5 (RFC 8017, section 9.2)
+_RSA_DIGESTS = {
+    "RS256": (hashlib.sha256, bytes.fromhex("3031300d060960864801650304020105000420")),
+    "RS384": (hashlib.sha384, bytes.fromhex("3041300d060960864801650304020205000430")),
+    "RS512": (hashlib.sha512, bytes.fromhex("3051300d060960864801650304020305000440")),
+}
+_HMAC_DIGESTS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+
+class InvalidTokenError(Exception):
+    """Raised when a bearer token fails verification"""
+
+
+_keys = {}
+_keys_loaded_at = None
+_keys_lock = threading.Lock()
+_verified_tokens = TTLCache(JWT_CACHE_SIZE)
+
+
+def is_configured():
+    """Bearer tokens are only accepted with signing keys and an expected audience"""
+    return bool((JWKS_FILE or JWKS_URL) and JWT_AUDIENCE)
+
+
+def _b64url_decode(value):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _b64url_int(value):
+    return int.from_bytes(_b64url_decode(value), "big")
+
+
+def _parse_jwk(jwk):
+    """Convert a JWK into the form used for verification"""
+    if jwk.get("kty") == "RSA":
+        return ("RSA", _b64url_int(jwk["n"]), _b64url_int(jwk["e"]))
+    if jwk.get("kty") == "oct":
+        return ("oct", _b64url_decode(jwk["k"]))
+    return None
+
+
+def _fetch_jwks():
+    if JWKS_FILE:
+        with open(JWKS_FILE) as f:
+            return json.load(f)
+    # Imported here: urllib.request pulls in http.client and ssl, which the
+    # file-based configuration never needs
+    import urllib.request
+
+    with urllib.request.urlopen(JWKS_URL, timeout=JWKS_FETCH_TIMEOUT_SECONDS) as response:
+        return json.loads(response.read())
+
+
+def _load_keys():
+    """(Re)load the JWKS document into the key cache"""
+    global _keys, _keys_loaded_at
+    document = _fetch_jwks()
+    keys = {}
+    for jwk in document.get("keys", []):
+        parsed = _parse_jwk(jwk)
+        if parsed is not None:
+            keys[jwk.get("kid")] = parsed
+    _keys = keys
+    _keys_loaded_at = time.monotonic()
+    logger.info(f"Loaded {len(keys)} JWT signing keys")
+
+
+def get_signing_key(kid):
+    """Return the cached key for kid, reloading the JWKS once if it is unknown"""
+    key = _keys.get(kid)
+    if key is not None:
+        return key
+    with _keys_lock:
+        key = _keys.get(kid)
+        if key is not None:
+            return key
+        stale = (
+            _keys_loaded_at is None
+            or time.monotonic() - _keys_loaded_at >= JWKS_MIN_REFRESH_SECONDS
+        )
+        if stale:
+            try:
+                _load_keys()
+            except Exception as e:
+                logger.error(f"Failed to load JWKS: {e}")
+        return _keys.get(kid)
+
+
+def _verify_rsa(key, alg, signing_input, signature):
+    _, modulus, exponent = key
+    digest, prefix = _RSA_DIGESTS[alg]
+    size = (modulus.bit_length() + 7) // 8
+    signature_int = int.from_bytes(signature, "big")
+    if len(signature) != size or signature_int >= modulus:
+        return False
+    encoded = pow(signature_int, exponent, modulus).to_bytes(size, "big")
+    digest_info = prefix + digest(signing_input).digest()
+    padding = size - len(digest_info) - 3
+    if padding < 8:
+        return False
+    expected = b"\x00\x01" + b"\xff" * padding + b"\x00" + digest_info
+    return hmac.compare_digest(encoded, expected)
+
+
+def _verify_signature(key, alg, signing_input, signature):
+    if alg in _RSA_DIGESTS and key[0] == "RSA":
+        return _verify_rsa(key, alg, signing_input, signature)
+    if alg in _HMAC_DIGESTS and key[0] == "oct":
+        expected = hmac.new(key[1], signing_input, _HMAC_DIGESTS[alg]).digest()
+        return hmac.compare_digest(expected, signature)
+    return False
+
+
+def _check_claims(claims, now):
+    exp = claims.get("exp")
+    if not isinstance(exp, (int, float)):
+        raise InvalidTokenError("Token has no exp claim")
+    if exp + JWT_LEEWAY_SECONDS < now:
+        raise InvalidTokenError("Token has expired")
+    nbf = claims.get("nbf")
+    if isinstance(nbf, (int, float)) and nbf - JWT_LEEWAY_SECONDS > now:
+        raise InvalidTokenError("Token is not valid yet")
+    if not JWT_AUDIENCE:
+        raise InvalidTokenError("JWT_AUDIENCE is not configured")
+    audience = claims.get("aud")
+    audiences = audience if isinstance(audience, list) else [audience]
+    if JWT_AUDIENCE not in audiences:
+        raise InvalidTokenError("Token audience mismatch")
+    if JWT_ISSUER and claims.get("iss") != JWT_ISSUER:
+        raise InvalidTokenError("Token issuer mismatch")
+
+
+def verify_token(token):
+    """
+    Verify a compact JWS and return its claims.
+
+    Raises InvalidTokenError for malformed, unsigned, expired or otherwise
+    invalid tokens.
+    """
+    now = time.time()
+    cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+    claims = _verified_tokens.get(cache_key)
+    if claims is not None:
+        return claims
+
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64url_decode(header_b64))
+        claims = json.loads(_b64url_decode(payload_b64))
+        signature = _b64url_decode(signature_b64)
+    except ValueError:
+        raise InvalidTokenError("Malformed token")
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise InvalidTokenError("Malformed token")
+
+    alg = header.get("alg")
+    if alg not in _RSA_DIGESTS and alg not in _HMAC_DIGESTS:
+        raise InvalidTokenError(f"Unsupported algorithm: {alg}")
+    key = get_signing_key(header.get("kid"))
+    if key is None:
+        raise InvalidTokenError("Unknown signing key")
+    signing_input = f"{header_b64}.{payload_b64}".encode("ascii")
+    if not _verify_signature(key, alg, signing_input, signature):
+        raise InvalidTokenError("Invalid signature")
+
+    _check_claims(claims, now)
+    # Cache until the token itself expires
+    _verified_tokens.put(cache_key, claims, ttl_seconds=max(claims["exp"] - now, 0))
+    return claims
+
+
+def user_context_from_claims(claims):
+    """
+    Authorizer context (string values only) derived from verified claims;
+    raises InvalidTokenError for claims of the wrong type
+    """
+    roles = claims.get(JWT_ROLES_CLAIM) or []
+    if isinstance(roles, str):
+        roles = roles.split()
+    if not isinstance(roles, list) or not all(isinstance(role, str) for role in roles):
+        raise InvalidTokenError(f"Claim {JWT_ROLES_CLAIM} must be a string or a list of strings")
+    username = claims.get("username") or claims.get("sub", "")
+    if not isinstance(username, (str, int)):
+        raise InvalidTokenError("Claim username must be a string")
+    return {
+        "username": str(username),
+        "role": roles[0] if roles else "user",
+        "roles": ",".join(roles),
+    }
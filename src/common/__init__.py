@@ -6,27 +6,41 @@
 # This ensures boto3 is patched before any DAO operations
 from . import xray_auto_patch
 
-# Now import other common modules safely
-from .logger import get_logger
-from .constants import ERROR_CODES
-from .exceptions import ErrorDetail, BadRequestException, InternalServerError
-from .validation import validate_request
-from .idempotency import is_idempotent, mark_idempotent
-from .utils import get_utc_timestamp, generate_idempotency_key
-from .exception_handler import exception_handler
+import importlib
+
+# Exports are resolved on first access (PEP 562) so that importing one
+# common module does not load every other one on a cold start
+_EXPORTS = {
+    'get_logger': 'logger',
+    'ERROR_CODES': 'constants',
+    'ErrorDetail': 'exceptions',
+    'BadRequestException': 'exceptions',
+    'InternalServerError': 'exceptions',
+    'validate_request': 'validation',
+    'RequestValidator': 'validation',
+    'is_idempotent': 'idempotency',
+    'mark_idempotent': 'idempotency',
+    'idempotent': 'idempotency',
+    'get_utc_timestamp': 'utils',
+    'generate_idempotency_key': 'utils',
+    'exception_handler': 'exception_handler',
+    'metrics': 'metrics',
+    'emits_metrics': 'metrics',
+    'span': 'tracing',
+    'traced': 'tracing',
+    'traced_handler': 'tracing',
+    'Money': 'money',
+}
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
 
 # Export commonly used items for easy importing
-__all__ = [
-    'get_logger', 
-    'ERROR_CODES',
-    'ErrorDetail',
-    'BadRequestException',
-    'InternalServerError',
-    'validate_request',
-    'is_idempotent',
-    'mark_idempotent',
-    'get_utc_timestamp',
-    'generate_idempotency_key',
-    'exception_handler',
-    'xray_auto_patch'
-]
+__all__ = list(_EXPORTS) + ['xray_auto_patch']
@@ -0,0 +1,109 @@
+# Process-wide registry of tuned AWS SDK clients and resources
+#
+# Every module asks the registry instead of calling boto3 directly, so one
+# client (and one connection pool) per service is shared by the whole
+# container. Connection settings are tuned per service through environment
+# variables, most specific first:
+#   AWS_CLIENT_<SERVICE>_<SETTING>   e.g. AWS_CLIENT_DYNAMODB_READ_TIMEOUT=3
+#   AWS_CLIENT_<SETTING>             e.g. AWS_CLIENT_MAX_POOL_CONNECTIONS=20
+import os
+import threading
+from .lazy import lazy_import
+
+# botocore/boto3 are only imported when the first client is requested
+boto3 = lazy_import("boto3")
+botocore_config = lazy_import("botocore.config")
+
+DEFAULT_SETTINGS = {
+    "MAX_POOL_CONNECTIONS": 50,
+    "CONNECT_TIMEOUT": 2.0,
+    "READ_TIMEOUT": 5.0,
+    "MAX_ATTEMPTS": 3,
+    "RETRY_MODE": "adaptive",
+    "TCP_KEEPALIVE": True,
+}
+
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_resources = {}
+
+
+def _setting(service, name):
+    default = DEFAULT_SETTINGS[name]
+    raw = os.environ.get(f"AWS_CLIENT_{service.upper().replace('-', '_')}_{name}")
+    if raw is None:
+        raw = os.environ.get(f"AWS_CLIENT_{name}")
+    if raw is None:
+        return default
+    if isinstance(default, bool):
+        return raw.strip().lower() in ("1", "true", "yes")
+    return type(default)(raw)
+
+
+def build_config(service):
+    """botocore Config for a service, with environment overrides applied"""
+    return botocore_config.Config(
+        max_pool_connections=_setting(service, "MAX_POOL_CONNECTIONS"),
+        connect_timeout=_setting(service, "CONNECT_TIMEOUT"),
+        read_timeout=_setting(service, "READ_TIMEOUT"),
+        tcp_keepalive=_setting(service, "TCP_KEEPALIVE"),
+        retries={
+            "total_max_attempts": _setting(service, "MAX_ATTEMPTS"),
+            "mode": _setting(service, "RETRY_MODE"),
+        },
+    )
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+def get_resource(service):
+    """Process-wide boto3 resource for service"""
+    resource = _resources.get(service)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service)
+            if resource is None:
+                resource = _get_session().resource(service, config=build_config(service))
+                _resources[service] = resource
+    return resource
+
+
+def get_client(service):
+    """Process-wide low-level client for service"""
+    client = _clients.get(service)
+    if client is None:
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                # Not resource.meta.client: boto3 installs hooks on that client
+                # that re-serialize already typed DynamoDB attribute values
+                client = _get_session().client(service, config=build_config(service))
+                _clients[service] = client
+    return client
+
+
+def set_client(service, client):
+    """Install a client (e.g. a stub or in-memory fake) for service"""
+    with _lock:
+        _clients[service] = client
+
+
+def set_resource(service, resource):
+    """Install a resource (e.g. an in-memory fake) for service"""
+    with _lock:
+        _resources[service] = resource
+
+
+def reset_clients():
+    """Drop every cached client and resource"""
+    global _session
+    with _lock:
+        _clients.clear()
+        _resources.clear()
+        _session = None
@@ -0,0 +1,200 @@
+# Batch processing runtime for SQS-backed event consumers
+import json
+from contextlib import contextmanager
+from .logger import get_logger
+from .idempotency import get_completed_keys
+from .tracing import continue_trace, span
+
+# messageIds of the records being processed right now (see current_records)
+_current_records = ()
+
+
+def current_records():
+    """
+    messageIds of the records whose processing is running, so work done on
+    their behalf (e.g. buffered events) can be attributed to them; empty
+    outside process_batch / process_batch_by_key
+    """
+    return _current_records
+
+
+@contextmanager
+def _processing(message_ids):
+    global _current_records
+    previous, _current_records = _current_records, tuple(message_ids)
+    try:
+        yield
+    finally:
+        _current_records = previous
+
+
+def extract_event(record):
+    """
+    Return (detail-type, detail) for a consumer record.
+
+    Supports SQS messages whose body is an EventBridge event (the
+    EventBridge -> SQS -> Lambda topology), SQS messages whose body is the
+    detail itself (detail-type None), and EventBridge events delivered
+    directly.
+    """
+    if "body" in record:
+        body = json.loads(record["body"])
+        if isinstance(body, dict) and "detail-type" in body:
+            return body["detail-type"], body.get("detail", {})
+        return None, body
+    return record.get("detail-type"), record.get("detail", {})
+
+
+def extract_detail(record):
+    """Return the event detail carried by a consumer record (see extract_event)"""
+    return extract_event(record)[1]
+
+
+def process_batch(event, process_func, logger_name="batch-processor"):
+    """
+    Run process_func for every record in the event and report failures
+    individually.
+
+    For SQS batches the response follows the ReportBatchItemFailures
+    contract, so only the failed messages become visible again and are
+    redelivered (and eventually moved to the DLQ by the redrive policy).
+    A directly delivered EventBridge event is processed as a single record
+    and errors are re-raised so Lambda's async retry applies.
+    """
+    logger = get_logger(logger_name)
+    records = event.get("Records")
+    if records is None:
+        detail = extract_detail(event)
+        with continue_trace(detail), span("process_record"):
+            process_func(detail)
+        return {"batchItemFailures": []}
+
+    failures = []
+    entries = []
+    for record in records:
+        message_id = record.get("messageId")
+        try:
+            entries.append((message_id, extract_detail(record)))
+        except Exception as e:
+            logger.error(
+                "Failed to parse record",
+                extra={"messageId": message_id, "error": str(e)},
+            )
+            failures.append({"itemIdentifier": message_id})
+
+    key_func = getattr(process_func, "idempotency_key", None)
+    if key_func is not None:
+        with span("dedupe"):
+            entries = dedupe_entries(entries, key_func, logger)
+
+    for message_id, detail in entries:
+        try:
+            # Each record continues the trace it was published under
+            with _processing((message_id,)), continue_trace(detail), span("process_record"):
+                process_func(detail)
+        except Exception as e:
+            logger.error(
+                "Failed to process record",
+                extra={"messageId": message_id, "traceId": detail.get("trace_id"), "error": str(e)},
+            )
+            failures.append({"itemIdentifier": message_id})
+
+    if failures:
+        logger.warning(
+            "Batch completed with failures",
+            extra={"failed": len(failures), "total": len(records)},
+        )
+    return {"batchItemFailures": failures}
+
+
+def dedupe_entries(entries, key_func, logger):
+    """
+    Drop (message_id, detail) entries that repeat an earlier entry of the
+    same batch or whose idempotency key is already completed.
+
+    All keys in the batch are resolved in bulk, so only unseen records reach
+    the processing function. Dropped records count as successes: the first
+    occurrence of a key is the one that gets retried if it fails.
+    """
+    unique = {}
+    for message_id, detail in entries:
+        key = key_func(detail)
+        # Records without a key are always passed through
+        unique.setdefault(key if key is not None else ("no-key", message_id), (message_id, detail))
+
+    keys = [key for key in unique if isinstance(key, str)]
+    completed = get_completed_keys(keys) if keys else set()
+    fresh = [entry for key, entry in unique.items() if key not in completed]
+
+    skipped = len(entries) - len(fresh)
+    if skipped:
+        logger.info(
+            "Skipped duplicate records",
+            extra={
+                "inBatchDuplicates": len(entries) - len(unique),
+                "alreadyProcessed": len(completed),
+                "total": len(entries),
+            },
+        )
+    return fresh
+
+
+def process_batch_by_key(event, key_func, process_func, logger_name="batch-processor"):
+    """
+    Group the records of a batch and process each group with one call.
+
+    key_func(detail_type, detail) returns the group key, or None for records
+    that are acknowledged without processing. process_func(key, events) gets
+    the group's (detail_type, detail) pairs in delivery order. If it raises,
+    every record of the group is reported as a batch item failure, so the
+    group is retried together. A directly delivered EventBridge event is a
+    group of one and errors are re-raised.
+    """
+    logger = get_logger(logger_name)
+    records = event.get("Records")
+    if records is None:
+        detail_type, detail = extract_event(event)
+        key = key_func(detail_type, detail)
+        if key is not None:
+            with continue_trace(detail), span("process_group"):
+                process_func(key, [(detail_type, detail)])
+        return {"batchItemFailures": []}
+
+    failures = []
+    groups = {}
+    for record in records:
+        message_id = record.get("messageId")
+        try:
+            detail_type, detail = extract_event(record)
+            key = key_func(detail_type, detail)
+        except Exception as e:
+            logger.error(
+                "Failed to parse record",
+                extra={"messageId": message_id, "error": str(e)},
+            )
+            failures.append({"itemIdentifier": message_id})
+            continue
+        if key is None:
+            continue
+        group = groups.setdefault(key, ([], []))
+        group[0].append(message_id)
+        group[1].append((detail_type, detail))
+
+    for key, (message_ids, events) in groups.items():
+        try:
+            # A group continues the trace of its first event
+            with _processing(message_ids), continue_trace(events[0][1]), span("process_group"):
+                process_func(key, events)
+        except Exception as e:
+            logger.error(
+                "Failed to process record group",
+                extra={"key": str(key), "records": len(message_ids), "error": str(e)},
+            )
+            failures.extend({"itemIdentifier": message_id} for message_id in message_ids)
+
+    if failures:
+        logger.warning(
+            "Batch completed with failures",
+            extra={"failed": len(failures), "total": len(records)},
+        )
+    return {"batchItemFailures": failures}
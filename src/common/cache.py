@@ -0,0 +1,104 @@
+# In-process caches shared across warm Lambda invocations
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded, thread-safe least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        """Stored value or _MISSING; called with the lock held"""
+        value = self._data.get(key, _MISSING)
+        if value is not _MISSING:
+            self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Size and hit/miss/eviction counters since the container started"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxSize": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": self.hits / lookups if lookups else None,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TTLCache(LRUCache):
+    """LRU cache whose entries also expire ttl_seconds after being stored."""
+
+    def __init__(self, max_size=1024, ttl_seconds=300, clock=time.monotonic):
+        super().__init__(max_size)
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self.expirations = 0
+
+    def _lookup(self, key):
+        entry = super()._lookup(key)
+        if entry is _MISSING:
+            return entry
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            self.expirations += 1
+            return _MISSING
+        return value
+
+    def put(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        super().put(key, (self._clock() + ttl, value))
+
+    def pop(self, key, default=None):
+        entry = super().pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def stats(self):
+        stats = super().stats()
+        stats["expirations"] = self.expirations
+        return stats
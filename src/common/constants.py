@@ -3,5 +3,7 @@ ERROR_CODES = {
     "UNAUTHORIZED": "Unauthorized",
     "NOT_FOUND": "Resource not found",
     "BAD_REQUEST": "Bad request",
+    "CONFLICT": "Request conflicts with the current state of the resource",
+    "OUT_OF_STOCK": "Insufficient inventory",
     "INTERNAL_SERVER_ERROR": "Internal server error",
 }
@@ -1,27 +1,17 @@
 # DLQ replay utility for EventBridge consumers
-import json
-import boto3
 from .logger import get_logger
-from .exception_handler import exception_handler
+from .batch_processor import process_batch, process_batch_by_key
 
 
-def replay_dlq_events(event, context, process_func):
+def replay_dlq_events(event, context, process_func, key_func=None):
     """
     Utility to replay events from a DLQ (e.g., SQS) and process them with the given function.
-    Ensures idempotency and logs replay attempts.
+    Ensures idempotency and logs replay attempts. Records that fail again are
+    reported as batch item failures so they stay on the DLQ. With key_func,
+    records are grouped as in process_batch_by_key.
     """
     logger = get_logger("dlq-replay")
-    for record in event.get("Records", []):
-        try:
-            detail = (
-                json.loads(record["body"])
-                if "body" in record
-                else record.get("detail", {})
-            )
-            logger.info("Replaying DLQ event", extra={"event": detail})
-            process_func(detail)
-        except Exception as e:
-            logger.error(
-                "Failed to replay DLQ event", extra={"error": str(e), "event": record}
-            )
-    return {"statusCode": 200}
+    logger.info("Replaying DLQ events", extra={"count": len(event.get("Records", []))})
+    if key_func is not None:
+        return process_batch_by_key(event, key_func, process_func, logger_name="dlq-replay")
+    return process_batch(event, process_func, logger_name="dlq-replay")
@@ -8,6 +8,9 @@ def exception_handler(func):
         logger = get_logger("order-handler")
         try:
             return func(event, context)
+        except InternalServerError as e:
+            logger.error("Internal error", extra={"error": e.to_dict()})
+            return {"statusCode": 500, "body": json.dumps(e.to_dict())}
         except ErrorDetail as e:
             logger.error("Handled error", extra={"error": e.to_dict()})
             return {"statusCode": 400, "body": json.dumps(e.to_dict())}
@@ -53,6 +53,24 @@ class BadRequestException(ErrorDetail):
         )
 
 
+class ConflictException(ErrorDetail):
+    def __init__(self, message=None, recommended_data=None):
+        super().__init__(
+            "CONFLICT",
+            message or ERROR_CODES["CONFLICT"],
+            recommended_data,
+        )
+
+
+class OutOfStockException(ErrorDetail):
+    def __init__(self, message=None, recommended_data=None):
+        super().__init__(
+            "OUT_OF_STOCK",
+            message or ERROR_CODES["OUT_OF_STOCK"],
+            recommended_data,
+        )
+
+
 class InternalServerError(ErrorDetail):
     def __init__(self, message=None, recommended_data=None):
         super().__init__(
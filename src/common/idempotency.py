@@ -1,25 +1,384 @@
 # Idempotency utility for event processing
 import os
-import boto3
+import json
+import random
+import time
+import zlib
+import functools
+from contextlib import contextmanager
 from botocore.exceptions import ClientError
+from .cache import LRUCache
+from .exceptions import ConflictException
+from .logger import get_logger
+from .aws_clients import get_resource
 
 IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE", "IdempotencyKeys")
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(IDEMPOTENCY_TABLE)
+# How long a completed key suppresses repeats (stored in the table's TTL attribute)
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# How long an in-progress claim blocks other workers if its holder dies
+IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS = int(
+    os.getenv("IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS", "180")
+)
+# BatchGetItem limits and retry policy for unprocessed keys
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+BATCH_GET_BACKOFF_SECONDS = 0.05
+# Recently completed keys kept per container to skip DynamoDB for repeats
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1024"))
+
+STATUS_IN_PROGRESS = "IN_PROGRESS"
+STATUS_COMPLETED = "COMPLETED"
+# The work is done but some of its events still have to be published; the
+# record keeps those events (see save_unpublished)
+STATUS_UNPUBLISHED = "UNPUBLISHED"
+
+# Outcomes of claim()
+CLAIMED = "CLAIMED"
+ALREADY_IN_PROGRESS = "ALREADY_IN_PROGRESS"
+ALREADY_COMPLETED = "ALREADY_COMPLETED"
+COMPLETED_UNPUBLISHED = "COMPLETED_UNPUBLISHED"
+
+# Lazy initialization to ensure X-Ray patching happens first
+_dynamodb = None
+_table = None
+_completed_keys = LRUCache(IDEMPOTENCY_CACHE_SIZE)
+# Keys whose completion waits until the invocation's buffered events are
+# published (see defer_completions); None when completions are immediate
+_deferred_keys = None
+# Puts stored events back into the invocation's event buffer (set by defer_completions)
+_republish = None
+# Key of the idempotent() call running right now (see current_key)
+_current_key = None
+
+
+def get_idempotency_table():
+    """Get the idempotency table with lazy initialization"""
+    global _dynamodb, _table
+    if _table is None:
+        _dynamodb = get_resource("dynamodb")
+        _table = _dynamodb.Table(IDEMPOTENCY_TABLE)
+    return _table
+
+
+def _is_completed(item, now):
+    if item.get("status") in (STATUS_IN_PROGRESS, STATUS_UNPUBLISHED):
+        return False
+    expiration = item.get("expiration")
+    return expiration is None or expiration >= now
+
+
+def _attribute(item, name):
+    """Read an attribute from a resource-level or low-level item"""
+    value = item.get(name)
+    if isinstance(value, dict):
+        return next(iter(value.values()), None)
+    return value
+
+
+def current_key():
+    """Idempotency key whose work is running (None outside idempotent())"""
+    return _current_key
+
+
+@contextmanager
+def _working_on(key):
+    global _current_key
+    previous, _current_key = _current_key, key
+    try:
+        yield
+    finally:
+        _current_key = previous
+
+
+def claim(key):
+    """
+    Atomically claim a key with a single conditional write.
+
+    The key is written as IN_PROGRESS unless a live record already exists
+    (expired records are reclaimable). Returns CLAIMED, ALREADY_IN_PROGRESS,
+    ALREADY_COMPLETED or COMPLETED_UNPUBLISHED (done, with events still to
+    publish; see unpublished_events).
+    """
+    return _claim(key)[0]
+
+
+def _claim(key):
+    """claim() returning (outcome, existing record or None)"""
+    if key in _completed_keys:
+        return ALREADY_COMPLETED, None
+    now = int(time.time())
+    try:
+        get_idempotency_table().put_item(
+            Item={
+                "id": key,
+                "status": STATUS_IN_PROGRESS,
+                "expiration": now + IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS,
+            },
+            ConditionExpression="attribute_not_exists(id) OR expiration < :now",
+            ExpressionAttributeValues={":now": now},
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+        return CLAIMED, None
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        item = e.response.get("Item", {})
+        status = _attribute(item, "status")
+        if status == STATUS_IN_PROGRESS:
+            return ALREADY_IN_PROGRESS, item
+        if status == STATUS_UNPUBLISHED:
+            return COMPLETED_UNPUBLISHED, item
+        # Completed records, and markers written without a status, suppress repeats
+        _completed_keys.put(key, True)
+        return ALREADY_COMPLETED, item
+
+
+def complete(key):
+    """Mark a claimed key as completed for IDEMPOTENCY_TTL_SECONDS"""
+    get_idempotency_table().put_item(
+        Item={
+            "id": key,
+            "status": STATUS_COMPLETED,
+            "expiration": int(time.time()) + IDEMPOTENCY_TTL_SECONDS,
+        }
+    )
+    _completed_keys.put(key, True)
+
+
+def save_unpublished(key, entries):
+    """
+    Mark a key whose work is done as UNPUBLISHED, keeping the PutEvents
+    entries that could not be published, so a retry publishes them instead
+    of repeating the work. The entries are stored zlib-compressed: an
+    order's InventoryUpdated events would otherwise not fit in one item.
+    """
+    get_idempotency_table().put_item(
+        Item={
+            "id": key,
+            "status": STATUS_UNPUBLISHED,
+            "events": zlib.compress(json.dumps(entries).encode("utf-8")),
+            "expiration": int(time.time()) + IDEMPOTENCY_TTL_SECONDS,
+        }
+    )
+
+
+def unpublished_events(item):
+    """PutEvents entries kept by save_unpublished in a claimed-against record"""
+    value = _attribute(item, "events")
+    if value is None:
+        return []
+    # boto3 wraps resource-level binary attributes in Binary
+    return json.loads(zlib.decompress(getattr(value, "value", value)))
+
+
+def release(key):
+    """Drop an in-progress claim so the work can be retried immediately"""
+    try:
+        get_idempotency_table().delete_item(
+            Key={"id": key},
+            ConditionExpression="#status = :in_progress",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":in_progress": STATUS_IN_PROGRESS},
+        )
+    except ClientError:
+        # The claim expires on its own; nothing else to do
+        pass
 
 
 def is_idempotent(key):
+    if key in _completed_keys:
+        return True
     try:
         # Use correct key name 'id' as defined in template.yaml
-        response = table.get_item(Key={"id": key})
-        return "Item" in response
+        response = get_idempotency_table().get_item(Key={"id": key})
+        item = response.get("Item")
+        if not item:
+            return False
+        expiration = item.get("expiration")
+        # DynamoDB TTL deletion is lazy, so expired records are ignored here
+        return expiration is None or expiration >= int(time.time())
     except ClientError:
         return False
 
 
+def get_completed_keys(keys):
+    """
+    Resolve which of the given keys are already completed.
+
+    Keys held in the local cache are answered without DynamoDB; the rest are
+    read with BatchGetItem in chunks of BATCH_GET_MAX_KEYS, retrying
+    UnprocessedKeys with backoff. Keys that cannot be resolved are treated
+    as unseen (claim() still guards them).
+    """
+    completed = {key for key in keys if key in _completed_keys}
+    pending = [key for key in dict.fromkeys(keys) if key not in completed]
+    if not pending:
+        return completed
+
+    get_idempotency_table()
+    now = int(time.time())
+    for start in range(0, len(pending), BATCH_GET_MAX_KEYS):
+        chunk = pending[start:start + BATCH_GET_MAX_KEYS]
+        request = {
+            IDEMPOTENCY_TABLE: {
+                "Keys": [{"id": key} for key in chunk],
+                "ProjectionExpression": "id, #status, expiration",
+                "ExpressionAttributeNames": {"#status": "status"},
+            }
+        }
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(random.uniform(0, BATCH_GET_BACKOFF_SECONDS * (2 ** attempt)))
+            try:
+                response = _dynamodb.batch_get_item(RequestItems=request)
+            except ClientError as e:
+                get_logger("idempotency").warning(
+                    "BatchGetItem failed", extra={"error": str(e), "attempt": attempt + 1}
+                )
+                continue
+            for item in response.get("Responses", {}).get(IDEMPOTENCY_TABLE, []):
+                if _is_completed(item, now):
+                    completed.add(item["id"])
+                    _completed_keys.put(item["id"], True)
+            request = response.get("UnprocessedKeys")
+            if not request:
+                break
+    return completed
+
+
+def defer_completions(republish):
+    """
+    Hold the completions of idempotent() until finish_deferred_completions(),
+    so a key is only marked completed once the events its work produced have
+    been published. republish(entries) puts the events of an UNPUBLISHED
+    record back into the invocation's event buffer; events buffered while a
+    key's work runs must be attributed to current_key().
+    """
+    global _deferred_keys, _republish
+    _deferred_keys = {}
+    _republish = republish
+
+
+def finish_deferred_completions(unpublished):
+    """
+    Settle the held keys once the invocation's events were sent.
+
+    unpublished maps keys to the PutEvents entries of theirs that failed.
+    Their work is already done, so instead of releasing them (and having a
+    retry repeat it) they are saved as UNPUBLISHED with those entries; the
+    other keys are completed.
+    """
+    global _deferred_keys, _republish
+    deferred, _deferred_keys, _republish = _deferred_keys or {}, None, None
+    for key, scope in deferred.items():
+        entries = unpublished.get(key)
+        if entries:
+            _save_unpublished_logged(scope, key, entries)
+        else:
+            _complete_logged(scope, key)
+
+
+def _complete_logged(scope, key):
+    try:
+        complete(key)
+    except ClientError as e:
+        # The work is done; retrying the record would repeat it
+        get_logger(scope).warning(
+            "Failed to mark event completed",
+            extra={"idempotencyKey": key, "error": str(e)},
+        )
+
+
+def _save_unpublished_logged(scope, key, entries):
+    try:
+        save_unpublished(key, entries)
+    except ClientError as e:
+        # The IN_PROGRESS claim expires and a retry then repeats the work
+        get_logger(scope).error(
+            "Failed to keep unpublished events",
+            extra={"idempotencyKey": key, "count": len(entries), "error": str(e)},
+        )
+
+
+def _republish_events(scope, key, item):
+    """Publish the kept events of an UNPUBLISHED key instead of redoing its work"""
+    if _deferred_keys is None:
+        # Only buffered invocations can tell whether the events went out
+        raise ConflictException(
+            "Event was processed but its events are not published yet",
+            recommended_data={"idempotencyKey": key},
+        )
+    entries = unpublished_events(item)
+    get_logger(scope).info(
+        "Republishing events of a processed event",
+        extra={"idempotencyKey": key, "count": len(entries)},
+    )
+    with _working_on(key):
+        _republish(entries)
+    _deferred_keys[key] = scope
+    return None
+
+
 def mark_idempotent(key):
     try:
-        # Use correct key name 'id' as defined in template.yaml
-        table.put_item(Item={"id": key})
+        complete(key)
     except ClientError:
         pass
+
+
+def idempotent(scope, key_func):
+    """
+    Decorator for event processing functions taking the event detail.
+
+    key_func(detail) returns the per-event key (or None to skip the check);
+    it is namespaced with scope so consumers never share markers. Repeats of
+    completed keys are skipped, events being processed elsewhere raise
+    ConflictException so the record is retried later, and failures release
+    the claim. Inside buffered_events the key is completed only after the
+    invocation's events are published; if some are not, the key keeps them
+    (UNPUBLISHED) and a retry republishes them without running func again.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(detail, *args, **kwargs):
+            key = idempotency_key(detail)
+            if key is None:
+                return func(detail, *args, **kwargs)
+            if _deferred_keys and key in _deferred_keys:
+                # A repeat of a key whose completion is deferred in this invocation
+                outcome, item = ALREADY_COMPLETED, None
+            else:
+                outcome, item = _claim(key)
+            if outcome == COMPLETED_UNPUBLISHED:
+                return _republish_events(scope, key, item)
+            if outcome == ALREADY_COMPLETED:
+                get_logger(scope).info(
+                    "Duplicate event ignored (idempotent)", extra={"idempotencyKey": key}
+                )
+                return None
+            if outcome == ALREADY_IN_PROGRESS:
+                raise ConflictException(
+                    "Event is already being processed",
+                    recommended_data={"idempotencyKey": key},
+                )
+            try:
+                with _working_on(key):
+                    result = func(detail, *args, **kwargs)
+            except Exception:
+                release(key)
+                raise
+            if _deferred_keys is not None:
+                _deferred_keys[key] = scope
+            else:
+                _complete_logged(scope, key)
+            return result
+
+        def idempotency_key(detail):
+            value = key_func(detail)
+            return f"{scope}#{value}" if value else None
+
+        wrapper.idempotency_key = idempotency_key
+        return wrapper
+
+    return decorator
@@ -0,0 +1,59 @@
+# Lazy initialisation helpers for AWS clients and heavy modules
+# Keeps Lambda cold starts down by deferring work until a code path needs it
+import functools
+import importlib
+import threading
+
+_UNSET = object()
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """Return a proxy for module name that is imported on first use"""
+    return LazyModule(name)
+
+
+def lazy(factory):
+    """
+    Decorator for zero-argument factories: build the value on first call and
+    return the cached instance afterwards. The cache can be dropped with
+    .reset() (e.g. to swap in a fake client).
+    """
+    lock = threading.Lock()
+    value = _UNSET
+
+    @functools.wraps(factory)
+    def wrapper():
+        nonlocal value
+        if value is _UNSET:
+            with lock:
+                if value is _UNSET:
+                    value = factory()
+        return value
+
+    def reset():
+        nonlocal value
+        with lock:
+            value = _UNSET
+
+    wrapper.reset = reset
+    return wrapper
@@ -1,29 +1,292 @@
 # Centralized JSON logger
+import functools
 import json
 import logging
+import math
+import os
 import sys
-from datetime import datetime, timezone
+import random
+import threading
+import time
+import zlib
+
+
+def _config_warning(message, **fields):
+    """Report a bad setting on stderr; logging is not configured yet at import"""
+    sys.stderr.write(json.dumps({"level": "WARNING", "message": message, **fields}) + "\n")
+
+
+def _env_number(name, default, cast=float):
+    """Numeric setting from the environment; invalid values fall back to default"""
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = cast(raw)
+    except ValueError:
+        value = None
+    if value is None or not math.isfinite(value) or value < 0:
+        _config_warning("Ignoring invalid logging setting", setting=name, value=raw, default=default)
+        return default
+    return value
+
+
+def _env_level(name, default):
+    """Level name from the environment; unknown levels fall back to default"""
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    level = raw.strip().upper()
+    # getLevelName maps a registered level name to its number
+    if not isinstance(logging.getLevelName(level), int):
+        _config_warning("Ignoring invalid logging setting", setting=name, value=raw, default=default)
+        return default
+    return level
+
+
+LOG_LEVEL = _env_level("LOG_LEVEL", "INFO")
+# Longest JSON encoding kept for a single extra field; larger values are truncated
+LOG_MAX_FIELD_CHARS = _env_number("LOG_MAX_FIELD_CHARS", 2048, int)
+# Buffer records in memory and write them once at the end of each invocation
+LOG_BUFFERED = os.getenv("LOG_BUFFERED", "false").lower() == "true"
+LOG_BUFFER_MAX_RECORDS = _env_number("LOG_BUFFER_MAX_RECORDS", 1000, int)
+
+# Sampling: "logger=rate" pairs, e.g. "inventory-service=0.1,event-producer=0.05";
+# loggers not listed use LOG_SAMPLE_RATE. Records with an orderId are sampled
+# deterministically, so a sampled order is logged end to end.
+# Invalid values are reported on stderr and ignored rather than failing the import.
+LOG_SAMPLE_RATE = min(_env_number("LOG_SAMPLE_RATE", 1.0), 1.0)
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+# Token bucket per (logger, message template); 0 disables rate limiting
+LOG_RATE_LIMIT_PER_SECOND = _env_number("LOG_RATE_LIMIT_PER_SECOND", 0.0)
+LOG_RATE_LIMIT_BURST = _env_number("LOG_RATE_LIMIT_BURST", 50, int)
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RESERVED_ATTRS = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", (), None))
+) | {"message", "asctime"}
+
+_encode = json.JSONEncoder(separators=(",", ":"), default=str, ensure_ascii=False).encode
+
+
+def _static_fields():
+    """Fields that are the same for every record of this container"""
+    fields = {}
+    if os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+        fields["function"] = os.environ["AWS_LAMBDA_FUNCTION_NAME"]
+    if os.getenv("AWS_REGION"):
+        fields["region"] = os.environ["AWS_REGION"]
+    return fields
+
+
+def _encode_field(value, limit=LOG_MAX_FIELD_CHARS):
+    if isinstance(value, str):
+        if len(value) > limit:
+            value = value[:limit] + "...(truncated)"
+        return _encode(value)
+    encoded = _encode(value)
+    if len(encoded) > limit:
+        # Keep the output valid JSON: emit the truncated encoding as a string
+        return _encode(encoded[:limit] + "...(truncated)")
+    return encoded
 
 
 class JsonFormatter(logging.Formatter):
+    def __init__(self, static_fields=None):
+        super().__init__()
+        static = _static_fields() if static_fields is None else static_fields
+        # Pre-encoded once instead of per record
+        self._static = "".join(f",{_encode(k)}:{_encode(v)}" for k, v in static.items())
+        self._second = None
+        self._second_prefix = ""
+
+    def _timestamp(self, created):
+        second = int(created)
+        if second != self._second:
+            self._second = second
+            self._second_prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        return f"{self._second_prefix}.{int((created - second) * 1e6):06d}+00:00"
+
     def format(self, record):
-        log_record = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "level": record.levelname,
-            "message": record.getMessage(),
-            "logger": record.name,
-        }
-        # Support extra fields
-        if hasattr(record, "extra") and record.extra:
-            log_record.update(record.extra)
-        return json.dumps(log_record)
+        parts = [
+            '{"timestamp":"', self._timestamp(record.created),
+            '","level":"', record.levelname,
+            '","message":', _encode_field(record.getMessage()),
+            ',"logger":', _encode(record.name),
+            self._static,
+        ]
+        # Support extra fields (logging sets them as record attributes)
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                parts.append(f",{_encode(key)}:{_encode_field(value)}")
+        if record.exc_info:
+            parts.append(f',"exception":{_encode(self.formatException(record.exc_info))}')
+        parts.append("}")
+        return "".join(parts)
+
+
+def parse_sample_rates(spec):
+    """Parse "name=rate,name=rate" into a dict of floats; bad pairs are skipped"""
+    rates = {}
+    for pair in spec.split(","):
+        name, sep, rate = pair.partition("=")
+        if not pair.strip():
+            continue
+        try:
+            value = float(rate) if sep and name.strip() else None
+        except ValueError:
+            value = None
+        if value is None or math.isnan(value):
+            _config_warning("Ignoring invalid sample rate", setting="LOG_SAMPLE_RATES", value=pair)
+            continue
+        rates[name.strip()] = min(max(value, 0.0), 1.0)
+    return rates
+
+
+class _TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drop a share of low-severity records to keep log volume bounded.
+
+    - Per-logger sample rates; records carrying an orderId are kept or
+      dropped by a hash of the orderId, so one order is either fully logged
+      or not at all.
+    - A token bucket per (logger, message template) caps bursts of the
+      same line.
+    - Records at ERROR and above always pass.
+    """
+
+    def __init__(self, rates=None, default_rate=LOG_SAMPLE_RATE,
+                 rate_limit=LOG_RATE_LIMIT_PER_SECOND, burst=LOG_RATE_LIMIT_BURST,
+                 clock=time.monotonic):
+        super().__init__()
+        self.rates = parse_sample_rates(LOG_SAMPLE_RATES) if rates is None else rates
+        self.default_rate = default_rate
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self._clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def is_sampled(self, logger_name, order_id=None):
+        rate = self.rates.get(logger_name, self.default_rate)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        if order_id is not None:
+            return zlib.crc32(str(order_id).encode("utf-8")) < rate * 0x100000000
+        return random.random() < rate
+
+    def _take_token(self, key):
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _TokenBucket(self.burst, now)
+            else:
+                bucket.tokens = min(
+                    self.burst, bucket.tokens + (now - bucket.updated) * self.rate_limit
+                )
+                bucket.updated = now
+            if bucket.tokens < 1:
+                return False
+            bucket.tokens -= 1
+            return True
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        if not self.is_sampled(record.name, getattr(record, "orderId", None)):
+            return False
+        if self.rate_limit > 0 and not self._take_token((record.name, record.msg)):
+            return False
+        return True
+
+
+class BufferingStreamHandler(logging.StreamHandler):
+    """
+    Stream handler that, while buffering is on, keeps formatted records in
+    memory and writes them in a single call on flush_buffer(). Records at
+    ERROR and above flush immediately so nothing important is lost if the
+    invocation dies.
+    """
+
+    def __init__(self, stream=None, max_records=LOG_BUFFER_MAX_RECORDS):
+        super().__init__(stream)
+        self.max_records = max_records
+        self.buffering = False
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+
+    def emit(self, record):
+        if not self.buffering:
+            return super().emit(record)
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._buffer_lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.max_records
+        if full or record.levelno >= logging.ERROR:
+            self.flush_buffer()
+
+    def flush_buffer(self):
+        with self._buffer_lock:
+            lines, self._buffer = self._buffer, []
+        if lines:
+            self.stream.write("\n".join(lines) + self.terminator)
+            self.flush()
+
+
+# One handler shared by every logger, so buffered records keep their order
+_handler = BufferingStreamHandler(sys.stdout)
+_handler.setFormatter(JsonFormatter())
+if LOG_SAMPLE_RATE < 1.0 or LOG_SAMPLE_RATES or LOG_RATE_LIMIT_PER_SECOND > 0:
+    _handler.addFilter(SamplingFilter())
 
 
 def get_logger(name="order-processing-system"):
     logger = logging.getLogger(name)
     if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(JsonFormatter())
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
+        logger.addHandler(_handler)
+        logger.setLevel(LOG_LEVEL)
+        # The Lambda runtime puts its own handler on the root logger
+        logger.propagate = False
     return logger
+
+
+def flush_logs():
+    """Write any buffered log records"""
+    _handler.flush_buffer()
+
+
+def buffered_logs(func):
+    """
+    Decorator for Lambda handlers: when LOG_BUFFERED is enabled, hold log
+    records in memory during the invocation and write them once at the end
+    """
+    if not LOG_BUFFERED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(event, context):
+        outermost = not _handler.buffering
+        _handler.buffering = True
+        try:
+            return func(event, context)
+        finally:
+            if outermost:
+                _handler.buffering = False
+                flush_logs()
+
+    return wrapper
@@ -0,0 +1,184 @@
+# In-process metrics aggregation with CloudWatch Embedded Metric Format output
+#
+# Counters and latency histograms are aggregated in memory during an
+# invocation and written once at the end as EMF JSON lines on stdout, which
+# CloudWatch turns into metrics without any PutMetricData calls.
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "OrderProcessing")
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+SERVICE_NAME = os.getenv("AWS_LAMBDA_FUNCTION_NAME", "order-processing-system")
+
+# EMF accepts at most 100 values per metric in one document
+EMF_MAX_VALUES = 100
+# Latencies are bucketed on a log scale (~5% resolution) to keep them compact
+_BUCKET_BASE = 1.05
+
+OUTCOME_SUCCESS = "Success"
+OUTCOME_ERROR = "Error"
+
+
+def _bucket(value):
+    """Representative value of the log-scale bucket containing value"""
+    if value <= 0.01:
+        return round(value, 3)
+    return round(_BUCKET_BASE ** round(math.log(value, _BUCKET_BASE)), 3)
+
+
+class MetricsRegistry:
+    """Aggregates metrics per (dimensions) until flush()"""
+
+    def __init__(self, namespace=METRICS_NAMESPACE, stream=None):
+        self.namespace = namespace
+        self.stream = stream
+        self._lock = threading.Lock()
+        # dimensions tuple -> metric name -> (unit, {value: count})
+        self._data = {}
+
+    def _record(self, name, unit, value, dimensions):
+        key = tuple(sorted((k, str(v)) for k, v in dimensions.items() if v is not None))
+        with self._lock:
+            metrics = self._data.setdefault(key, {})
+            _, values = metrics.setdefault(name, (unit, {}))
+            values[value] = values.get(value, 0) + 1
+
+    def increment(self, name, value=1, **dimensions):
+        """Add value to a counter"""
+        self._record(name, "Count", value, dimensions)
+
+    def record_latency(self, name, milliseconds, **dimensions):
+        """Add one latency sample (milliseconds) to a histogram"""
+        self._record(name, "Milliseconds", _bucket(milliseconds), dimensions)
+
+    @contextmanager
+    def timer(self, stage, **dimensions):
+        """
+        Time a block as Latency/Count for the stage. The outcome dimension
+        is Error if the block raises; callers may also set timing.outcome.
+        """
+        timing = _Timing()
+        start = time.perf_counter()
+        try:
+            yield timing
+        except BaseException:
+            timing.outcome = OUTCOME_ERROR
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000.0
+            dims = dict(dimensions, Stage=stage, Outcome=timing.outcome)
+            self.record_latency("Latency", elapsed, **dims)
+            self.increment("Count", **dims)
+
+    def timed(self, stage, **dimensions):
+        """Decorator form of timer()"""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage, **dimensions):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _documents(self, data):
+        timestamp = int(time.time() * 1000)
+        for key, metrics in data.items():
+            dimension_names = [name for name, _ in key]
+            # EMF members are plain value arrays: counters are emitted as
+            # their sum, histogram buckets are repeated once per sample, and
+            # metrics with more than EMF_MAX_VALUES values are split across
+            # documents
+            chunks = {}
+            for name, (unit, values) in metrics.items():
+                if unit == "Count":
+                    samples = [sum(value * count for value, count in values.items())]
+                else:
+                    samples = [
+                        value for value, count in sorted(values.items()) for _ in range(count)
+                    ]
+                for index in range(0, len(samples), EMF_MAX_VALUES):
+                    chunks.setdefault(index // EMF_MAX_VALUES, {})[name] = (
+                        unit, samples[index:index + EMF_MAX_VALUES]
+                    )
+            for chunk in chunks.values():
+                document = {
+                    "_aws": {
+                        "Timestamp": timestamp,
+                        "CloudWatchMetrics": [
+                            {
+                                "Namespace": self.namespace,
+                                "Dimensions": [["Service"] + dimension_names],
+                                "Metrics": [
+                                    {"Name": name, "Unit": unit}
+                                    for name, (unit, _) in chunk.items()
+                                ],
+                            }
+                        ],
+                    },
+                    "Service": SERVICE_NAME,
+                }
+                document.update(dict(key))
+                for name, (_, samples) in chunk.items():
+                    document[name] = samples[0] if len(samples) == 1 else samples
+                yield document
+
+    def flush(self):
+        """Write all aggregated metrics as EMF in a single write and reset"""
+        with self._lock:
+            data, self._data = self._data, {}
+        if not data or not METRICS_ENABLED:
+            return
+        lines = [json.dumps(doc, separators=(",", ":")) for doc in self._documents(data)]
+        stream = self.stream or sys.stdout
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+
+
+class _Timing:
+    __slots__ = ("outcome",)
+
+    def __init__(self):
+        self.outcome = OUTCOME_SUCCESS
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
+
+
+def emits_metrics(stage):
+    """
+    Decorator for Lambda handlers: time the invocation as stage and flush
+    all metrics aggregated during it as EMF when it returns. Responses with
+    a 5xx status count as errors; SQS batch responses also report the
+    number of failed records.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(event, context):
+            try:
+                with metrics.timer(stage) as timing:
+                    result = func(event, context)
+                    if isinstance(result, dict):
+                        if result.get("statusCode", 200) >= 500:
+                            timing.outcome = OUTCOME_ERROR
+                        failures = result.get("batchItemFailures")
+                        if failures is not None:
+                            metrics.increment("Records", len(event.get("Records", [])), Stage=stage)
+                            metrics.increment("FailedRecords", len(failures), Stage=stage)
+                    return result
+            finally:
+                metrics.flush()
+
+        return wrapper
+
+    return decorator
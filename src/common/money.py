@@ -0,0 +1,470 @@
+# Exact money amounts in integer minor units, and line-level order pricing
+#
+# Amounts are held as integers of the currency's minor unit (cents for USD,
+# yen for JPY), so sums never drift. They leave the system as Decimal for
+# DynamoDB and as decimal strings ("59.97") in events and API responses.
+#
+# Orders are priced column-wise: resolve every line to (unit price, quantity)
+# integers once, then apply the discount and tax rules to whole columns.
+# Large orders use NumPy when it is installed (PRICING_BACKEND=auto|python|
+# numpy); NumPy is imported only when an order is big enough to need it.
+import math
+import os
+from decimal import Decimal, InvalidOperation
+
+from .exceptions import BadRequestException
+
+# ISO 4217 minor-unit exponents of the currencies we accept
+CURRENCY_EXPONENTS = {
+    "USD": 2,
+    "EUR": 2,
+    "GBP": 2,
+    "CAD": 2,
+    "AUD": 2,
+    "CHF": 2,
+    "SEK": 2,
+    "JPY": 0,
+    "KRW": 0,
+    "BHD": 3,
+    "KWD": 3,
+}
+DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "USD")
+
+# Amounts must stay below 10**MAX_AMOUNT_DIGITS major units. Even summed over
+# the largest orders this keeps every stored number far inside DynamoDB's 38
+# significant digits, and amount strings are bounded before they are parsed.
+MAX_AMOUNT_DIGITS = 12
+MAX_AMOUNT = 10 ** MAX_AMOUNT_DIGITS
+MAX_AMOUNT_CHARS = 32
+
+# Tax applied to every order line, in percent (e.g. "8.25")
+TAX_RATE_PERCENT = os.getenv("TAX_RATE_PERCENT", "0")
+
+# Backend for pricing whole orders, and the line count from which "auto"
+# switches to NumPy (below it the array setup costs more than it saves)
+PRICING_BACKEND = os.getenv("PRICING_BACKEND", "auto").lower()
+NUMPY_MIN_LINES = int(os.getenv("PRICING_NUMPY_MIN_LINES", "512"))
+
+# Rates are integer basis points: 825 == 8.25%
+BASIS_POINTS = 10000
+
+
+def currency_exponent(currency):
+    """Minor-unit exponent of a supported currency code"""
+    try:
+        return CURRENCY_EXPONENTS[currency]
+    except (KeyError, TypeError):
+        raise BadRequestException(
+            recommended_data={"details": f"Unsupported currency: {currency}"}
+        ) from None
+
+
+def _plain_minor_units(text, exponent):
+    """Minor units of a plain "123" / "123.45" string without Decimal, else None"""
+    whole, _, fraction = text.partition(".")
+    digits = whole + fraction.ljust(exponent, "0")
+    if (len(fraction) <= exponent and len(whole) <= MAX_AMOUNT_DIGITS and (whole or fraction)
+            and digits.isascii() and digits.isdigit()):
+        return int(digits)
+    return None
+
+
+def to_minor_units(value, currency=DEFAULT_CURRENCY, field="amount"):
+    """
+    Exact integer minor units of a decimal amount (int, str, Decimal or
+    float). Amounts with more decimal places than the currency allows are
+    rejected rather than rounded, and so are amounts of MAX_AMOUNT or more.
+    """
+    exponent = currency_exponent(currency)
+    cls = value.__class__
+    if cls is int:
+        if -MAX_AMOUNT < value < MAX_AMOUNT:
+            return value * 10 ** exponent
+        raise BadRequestException(
+            recommended_data={"details": f"{field} must be less than {MAX_AMOUNT}"}
+        )
+    if cls is str:
+        minor = _plain_minor_units(value, exponent)
+        if minor is not None:
+            return minor
+    try:
+        if cls is float:
+            if not math.isfinite(value):
+                raise InvalidOperation
+            # The shortest repr is what the client wrote (0.1, not 0.1000000000000000055)
+            value = Decimal(repr(value))
+        elif cls is not Decimal:
+            # Decimal() also accepts non-ASCII digits ("١٢"), which are not amounts
+            if cls is not str or len(value) > MAX_AMOUNT_CHARS or not value.isascii():
+                raise InvalidOperation
+            value = Decimal(value)
+        if not value.is_finite():
+            raise InvalidOperation
+    except (InvalidOperation, ValueError, OverflowError):
+        raise BadRequestException(
+            recommended_data={"details": f"{field} is not a valid amount"}
+        ) from None
+    if not abs(value) < MAX_AMOUNT:
+        raise BadRequestException(
+            recommended_data={"details": f"{field} must be less than {MAX_AMOUNT}"}
+        )
+    scaled = value.scaleb(exponent)
+    minor = int(scaled)
+    if minor != scaled:
+        raise BadRequestException(
+            recommended_data={"details": f"{field} has more decimal places than {currency} allows"}
+        )
+    return minor
+
+
+# Decimal value of one minor unit per currency (USD -> Decimal('0.01'))
+_MINOR_UNIT = {code: Decimal(1).scaleb(-exponent) for code, exponent in CURRENCY_EXPONENTS.items()}
+
+
+def from_minor_units(minor, currency=DEFAULT_CURRENCY):
+    """Decimal with the currency's scale (5997 USD -> Decimal('59.97'))"""
+    return _MINOR_UNIT[currency] * minor
+
+
+def format_minor_units(minor, currency=DEFAULT_CURRENCY):
+    """Decimal string of an amount without building a Decimal (5997 -> "59.97")"""
+    exponent = CURRENCY_EXPONENTS[currency]
+    if not exponent:
+        return str(minor)
+    if minor < 0:
+        return "-" + format_minor_units(-minor, currency)
+    digits = str(minor).rjust(exponent + 1, "0")
+    return f"{digits[:-exponent]}.{digits[-exponent:]}"
+
+
+class Money:
+    """An exact amount of one currency"""
+
+    __slots__ = ("minor", "currency")
+
+    def __init__(self, minor, currency=DEFAULT_CURRENCY):
+        currency_exponent(currency)
+        self.minor = int(minor)
+        self.currency = currency
+
+    @classmethod
+    def parse(cls, value, currency=None, field="amount"):
+        """Money from a request or event value (Money values pass through)"""
+        if isinstance(value, Money):
+            return value
+        currency = currency or DEFAULT_CURRENCY
+        return cls(to_minor_units(value, currency, field), currency)
+
+    def to_decimal(self):
+        return from_minor_units(self.minor, self.currency)
+
+    def to_json(self):
+        """Decimal string, exact and JSON-safe"""
+        return format_minor_units(self.minor, self.currency)
+
+    def _check(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        if other.currency != self.currency:
+            raise ValueError(f"Cannot combine {self.currency} and {other.currency}")
+        return other
+
+    def __add__(self, other):
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return Money(self.minor + other.minor, self.currency)
+
+    def __sub__(self, other):
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return Money(self.minor - other.minor, self.currency)
+
+    def __mul__(self, quantity):
+        if not isinstance(quantity, int) or isinstance(quantity, bool):
+            return NotImplemented
+        return Money(self.minor * quantity, self.currency)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.minor, self.currency)
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.minor == other.minor and self.currency == other.currency
+
+    def __lt__(self, other):
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return self.minor < other.minor
+
+    def __hash__(self):
+        return hash((self.minor, self.currency))
+
+    def __bool__(self):
+        return self.minor != 0
+
+    def __str__(self):
+        return f"{self.to_json()} {self.currency}"
+
+    def __repr__(self):
+        return f"Money({self.to_json()!r}, {self.currency!r})"
+
+
+# ---------------------------------------------------------------------------
+# Line-level pricing rules
+# ---------------------------------------------------------------------------
+
+def rate_to_basis_points(percent):
+    """Basis points of a percentage given as str/int/Decimal ("8.25" -> 825)"""
+    scaled = Decimal(str(percent)) * 100
+    if scaled != scaled.to_integral_value() or scaled < 0:
+        raise ValueError(f"Rate must be a non-negative multiple of 0.01%: {percent}")
+    return int(scaled)
+
+
+class LineRule:
+    """
+    A percentage applied to the order lines it matches. Lines match when
+    vendor/product (if given) are equal and the quantity is at least
+    min_quantity. Amounts are rounded half-up per line.
+    """
+
+    __slots__ = ("rate_bp", "vendor_id", "product_id", "min_quantity")
+    kind = None
+
+    def __init__(self, percent, vendor_id=None, product_id=None, min_quantity=1):
+        self.rate_bp = rate_to_basis_points(percent)
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.min_quantity = min_quantity
+
+    @property
+    def applies_to_all(self):
+        return self.vendor_id is None and self.product_id is None and self.min_quantity <= 1
+
+    def matches(self, vendor_id, product_id, quantity):
+        return (
+            (self.vendor_id is None or self.vendor_id == vendor_id)
+            and (self.product_id is None or self.product_id == product_id)
+            and quantity >= self.min_quantity
+        )
+
+
+class Discount(LineRule):
+    """Percentage off the line subtotal"""
+
+    __slots__ = ()
+    kind = "discount"
+
+
+class Tax(LineRule):
+    """Percentage added to the line subtotal after discounts"""
+
+    __slots__ = ()
+    kind = "tax"
+
+
+def default_rules():
+    """Rules from the environment: TAX_RATE_PERCENT on every line"""
+    rate = rate_to_basis_points(TAX_RATE_PERCENT)
+    return (Tax(TAX_RATE_PERCENT),) if rate else ()
+
+
+class PricedOrder:
+    """
+    Column-wise pricing result; every amount is in minor units. Per-line
+    columns are lists aligned with the input lines.
+    """
+
+    __slots__ = (
+        "currency", "unit_prices", "quantities", "discounts", "taxes",
+        "subtotal", "discount", "tax", "total",
+    )
+
+    def __init__(self, currency, unit_prices, quantities, discounts, taxes):
+        self.currency = currency
+        self.unit_prices = unit_prices
+        self.quantities = quantities
+        self.discounts = discounts
+        self.taxes = taxes
+        self.subtotal = sum(map(int.__mul__, unit_prices, quantities))
+        self.discount = sum(discounts)
+        self.tax = sum(taxes)
+        self.total = self.subtotal - self.discount + self.tax
+
+    def decimals(self, column):
+        """A per-line column as Decimals"""
+        unit = _MINOR_UNIT[self.currency]
+        return [unit * minor for minor in column]
+
+
+def _parse_quantity(value, index):
+    if value.__class__ is int and value > 0:
+        return value
+    if not isinstance(value, bool):
+        try:
+            quantity = Decimal(str(value))
+            if quantity > 0 and quantity == quantity.to_integral_value():
+                return int(quantity)
+        except InvalidOperation:
+            pass
+    raise BadRequestException(
+        recommended_data={"details": f"items[{index}].quantity must be a positive integer"}
+    )
+
+
+def _rule_amounts(rule, bases, vendors, products, quantities):
+    """Half-up rounded rule amounts per line (0 where the rule does not match)"""
+    bp = rule.rate_bp
+    half = BASIS_POINTS // 2
+    if rule.applies_to_all:
+        return [(base * bp + half) // BASIS_POINTS for base in bases]
+    # Narrow a selection column one condition at a time
+    selected = [quantity >= rule.min_quantity for quantity in quantities]
+    if rule.vendor_id is not None:
+        vendor_id = rule.vendor_id
+        selected = [s and v == vendor_id for s, v in zip(selected, vendors)]
+    if rule.product_id is not None:
+        product_id = rule.product_id
+        selected = [s and p == product_id for s, p in zip(selected, products)]
+    return [
+        (base * bp + half) // BASIS_POINTS if s else 0 for base, s in zip(bases, selected)
+    ]
+
+
+def _price_python(unit_prices, quantities, vendors, products, rules):
+    subtotals = list(map(int.__mul__, unit_prices, quantities))
+    count = len(subtotals)
+    discounts = [0] * count
+    for rule in rules:
+        if rule.kind == "discount":
+            amounts = _rule_amounts(rule, subtotals, vendors, products, quantities)
+            discounts = [
+                d + a if d + a < s else s for d, a, s in zip(discounts, amounts, subtotals)
+            ]
+    taxes = [0] * count
+    taxable = list(map(int.__sub__, subtotals, discounts)) if any(discounts) else subtotals
+    for rule in rules:
+        if rule.kind == "tax":
+            amounts = _rule_amounts(rule, taxable, vendors, products, quantities)
+            taxes = list(map(int.__add__, taxes, amounts))
+    return discounts, taxes
+
+
+def _price_numpy(np, unit_prices, quantities, vendors, products, rules):
+    units = np.asarray(unit_prices, dtype=np.int64)
+    qty = np.asarray(quantities, dtype=np.int64)
+    subtotals = units * qty
+    discounts = np.zeros_like(subtotals)
+    taxes = np.zeros_like(subtotals)
+    half = BASIS_POINTS // 2
+    vendor_array = product_array = None
+
+    def mask(rule):
+        nonlocal vendor_array, product_array
+        selected = qty >= rule.min_quantity
+        if rule.vendor_id is not None:
+            if vendor_array is None:
+                vendor_array = np.asarray(vendors, dtype=object)
+            selected &= vendor_array == rule.vendor_id
+        if rule.product_id is not None:
+            if product_array is None:
+                product_array = np.asarray(products, dtype=object)
+            selected &= product_array == rule.product_id
+        return selected
+
+    for rule in rules:
+        if rule.kind == "discount":
+            amounts = (subtotals * rule.rate_bp + half) // BASIS_POINTS
+            discounts = np.minimum(discounts + np.where(mask(rule), amounts, 0), subtotals)
+    taxable = subtotals - discounts
+    for rule in rules:
+        if rule.kind == "tax":
+            amounts = (taxable * rule.rate_bp + half) // BASIS_POINTS
+            taxes += np.where(mask(rule), amounts, 0)
+    return discounts.tolist(), taxes.tolist()
+
+
+_numpy = None
+
+
+def _load_numpy():
+    """NumPy module, or False when it is not installed"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy
+
+
+def _use_numpy(unit_prices, quantities, rules, backend):
+    if backend == "python" or not rules or not unit_prices:
+        return None
+    if backend != "numpy" and len(unit_prices) < NUMPY_MIN_LINES:
+        return None
+    # int64 must hold subtotal * rate without overflowing
+    largest_rate = max(BASIS_POINTS, max(rule.rate_bp for rule in rules))
+    if max(unit_prices) * max(quantities) * largest_rate >= 2 ** 62:
+        return None
+    return _load_numpy() or None
+
+
+def _catalog_prices(catalog, vendors, products, currency):
+    """Minor units of each line's catalog price; unknown products are rejected"""
+    unit_prices = []
+    append = unit_prices.append
+    get = catalog.get
+    for index, key in enumerate(zip(vendors, products)):
+        try:
+            price = get(key)
+        except TypeError:
+            price = None
+        if price is None:
+            details = f"items[{index}]: unknown product {key[1]!r} of vendor {key[0]!r}"
+            raise BadRequestException(recommended_data={"details": details})
+        if price.currency != currency:
+            details = f"items[{index}]: product {key[1]!r} is not sold in {currency}"
+            raise BadRequestException(recommended_data={"details": details})
+        append(price.minor)
+    return unit_prices
+
+
+def price_lines(lines, catalog, currency=None, rules=None, backend=None):
+    """
+    Price order lines exactly.
+
+    Args:
+        lines: Request order lines (vendorId, productId, quantity)
+        catalog: (vendorId, productId) -> Money. Unit prices come from it;
+            prices sent in the lines are ignored
+        currency: ISO currency code (DEFAULT_CURRENCY when None)
+        rules: Discount/Tax rules (default_rules() when None)
+        backend: "auto", "python" or "numpy" (PRICING_BACKEND when None)
+
+    Returns:
+        PricedOrder
+    """
+    currency = currency or DEFAULT_CURRENCY
+    currency_exponent(currency)
+    rules = default_rules() if rules is None else tuple(rules)
+
+    vendors = [line.get("vendorId") for line in lines]
+    products = [line.get("productId") for line in lines]
+    unit_prices = _catalog_prices(catalog, vendors, products, currency)
+    quantities = [line.get("quantity", 1) for line in lines]
+    if not all(q.__class__ is int and q > 0 for q in quantities):
+        quantities = [_parse_quantity(q, index) for index, q in enumerate(quantities)]
+
+    np = _use_numpy(unit_prices, quantities, rules, backend or PRICING_BACKEND)
+    if np:
+        discounts, taxes = _price_numpy(np, unit_prices, quantities, vendors, products, rules)
+    elif rules:
+        discounts, taxes = _price_python(unit_prices, quantities, vendors, products, rules)
+    else:
+        discounts = taxes = [0] * len(unit_prices)
+    return PricedOrder(currency, unit_prices, quantities, discounts, taxes)
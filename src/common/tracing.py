@@ -0,0 +1,171 @@
+# Lightweight stage timing and trace-id propagation
+#
+# A trace lives for one Lambda invocation. Spans time the stages run inside
+# it (nested spans are named by path, e.g. "place_order/save_order") and the
+# invocation ends with a single summary log line showing where the wall-clock
+# time went. The trace id is carried across EventBridge in the event detail,
+# so an order can be followed from the API through every consumer.
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+
+from .logger import get_logger
+from .metrics import metrics
+from .utils import TRACE_ID_HEADER, extract_trace_id, generate_trace_id
+
+# Detail field holding the publish time (epoch ms) next to "trace_id"
+PUBLISHED_AT_FIELD = "trace_published_at"
+# Trace ids of consumed events listed in one summary
+MAX_SUMMARY_TRACE_IDS = 20
+
+logger = get_logger("tracing")
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Span timings of one invocation"""
+
+    __slots__ = ("name", "trace_id", "started", "spans", "linked_trace_ids", "_path")
+
+    def __init__(self, name, trace_id):
+        self.name = name
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        # span path -> [count, total_ms, max_ms]
+        self.spans = {}
+        self.linked_trace_ids = []
+        self._path = []
+
+    def record(self, path, elapsed_ms):
+        stats = self.spans.get(path)
+        if stats is None:
+            self.spans[path] = [1, elapsed_ms, elapsed_ms]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed_ms
+            stats[2] = max(stats[2], elapsed_ms)
+
+    def summary(self):
+        total_ms = (time.perf_counter() - self.started) * 1000.0
+        attributed = sum(stats[1] for path, stats in self.spans.items() if "/" not in path)
+        summary = {
+            "traceId": self.trace_id,
+            "handler": self.name,
+            "durationMs": round(total_ms, 3),
+            "unattributedMs": round(max(total_ms - attributed, 0.0), 3),
+            "spans": {
+                path: {"count": count, "totalMs": round(total, 3), "maxMs": round(peak, 3)}
+                for path, (count, total, peak) in self.spans.items()
+            },
+        }
+        if self.linked_trace_ids:
+            summary["linkedTraceIds"] = self.linked_trace_ids[:MAX_SUMMARY_TRACE_IDS]
+        return summary
+
+
+def current_trace_id():
+    """Trace id of the active invocation or consumed event, if any"""
+    trace = _current.get()
+    return trace.trace_id if trace is not None else None
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as a stage of the current trace"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    trace._path.append(name)
+    path = "/".join(trace._path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(path, (time.perf_counter() - start) * 1000.0)
+        trace._path.pop()
+
+
+def traced(name):
+    """Decorator form of span()"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def inject_trace(detail):
+    """
+    Add the current trace id and publish time to an outgoing event detail
+    and return it; detail is returned unchanged outside a trace.
+
+    The detail is updated in place rather than copied: the producer always
+    passes a dict it has just built for this event.
+    """
+    trace_id = current_trace_id()
+    if trace_id is None:
+        return detail
+    detail["trace_id"] = trace_id
+    detail[PUBLISHED_AT_FIELD] = int(time.time() * 1000)
+    return detail
+
+
+@contextmanager
+def continue_trace(detail):
+    """
+    Process a consumed event under the trace id it was published with.
+
+    The delay between publishing and this point (the EventBridge and queue
+    hop) is recorded as the DeliveryLatency metric.
+    """
+    trace = _current.get()
+    trace_id = detail.get("trace_id") if isinstance(detail, dict) else None
+    if trace is None or not trace_id:
+        yield
+        return
+    published_at = detail.get(PUBLISHED_AT_FIELD)
+    if isinstance(published_at, (int, float)):
+        lag_ms = max(time.time() * 1000 - published_at, 0.0)
+        metrics.record_latency("DeliveryLatency", lag_ms, Stage=trace.name)
+    if len(trace.linked_trace_ids) < MAX_SUMMARY_TRACE_IDS:
+        trace.linked_trace_ids.append(trace_id)
+    previous, trace.trace_id = trace.trace_id, trace_id
+    try:
+        yield
+    finally:
+        trace.trace_id = previous
+
+
+def traced_handler(name):
+    """
+    Decorator for Lambda handlers: start a trace for the invocation (from
+    the X-Trace-Id header when present), echo the trace id on API responses
+    and log the span summary when the invocation ends
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(event, context):
+            trace_id = extract_trace_id(event) if isinstance(event, dict) else generate_trace_id()
+            trace = Trace(name, trace_id)
+            token = _current.set(trace)
+            try:
+                result = func(event, context)
+                if isinstance(result, dict) and "statusCode" in result:
+                    result.setdefault("headers", {})[TRACE_ID_HEADER] = trace_id
+                return result
+            finally:
+                _current.reset(token)
+                logger.info("Invocation summary", extra=trace.summary())
+
+        return wrapper
+
+    return decorator
@@ -25,9 +25,13 @@ def generate_trace_id():
 
 def extract_trace_id(event):
     """Extract trace ID from Lambda event headers or context."""
-    headers = event.get("headers", {})
-    trace_id = headers.get(TRACE_ID_HEADER) or event.get("trace_id")
-    return trace_id or generate_trace_id()
+    headers = event.get("headers") or {}
+    trace_id = headers.get(TRACE_ID_HEADER)
+    if trace_id is None:
+        # HTTP APIs and some clients send lower-cased header names
+        wanted = TRACE_ID_HEADER.lower()
+        trace_id = next((v for k, v in headers.items() if k.lower() == wanted), None)
+    return trace_id or event.get("trace_id") or generate_trace_id()
 
 
 def propagate_trace_id(payload, trace_id):
@@ -1,4 +1,60 @@
+# Request validation for the API handlers
+#
+# Each endpoint has a declarative schema that is compiled once, at import,
+# into a validator function. A request is checked completely before any
+# service code runs, and every problem found (up to MAX_REPORTED_ERRORS) is
+# reported in one BadRequestException:
+#
+#   {"details": "items[2].quantity: must be at least 1; ...",
+#    "errors": [{"field": "items[2].quantity", "message": "must be at least 1"}, ...]}
+#
+# Field kinds:
+#   "str"     non-empty string, optionally limited to choices
+#   "int"     integer (not bool) within min/max
+#   "amount"  positive decimal amount below money.MAX_AMOUNT: number or
+#             plain ASCII decimal string
+#   "list"    list (length within min_length/max_length) of maps with the
+#             given item schema
+# Fields that are not in a schema are allowed and left alone; optional
+# fields may also be null.
+import json
+import math
+import os
+import re
+
 from .exceptions import BadRequestException
+from .money import CURRENCY_EXPONENTS, MAX_AMOUNT, MAX_AMOUNT_DIGITS
+
+# Size limits of incoming requests
+MAX_ORDER_LINES = int(os.getenv("MAX_ORDER_LINES", "1000"))
+MAX_LINE_QUANTITY = int(os.getenv("MAX_LINE_QUANTITY", "10000"))
+MAX_INVENTORY_CHANGE = int(os.getenv("MAX_INVENTORY_CHANGE", "1000000000"))
+MAX_ID_LENGTH = 256
+
+# Errors listed in one response; a badly broken 1000-line order stops early
+MAX_REPORTED_ERRORS = 20
+
+# ASCII digits only (\d also matches other scripts' digits), with a bounded
+# number of integer and decimal digits
+_AMOUNT_STRING = re.compile(
+    rf"[0-9]{{1,{MAX_AMOUNT_DIGITS}}}(?:\.[0-9]{{1,{max(CURRENCY_EXPONENTS.values())}}})?"
+)
+
+
+def parse_json_body(event):
+    """
+    The API Gateway event's body parsed as JSON; raises BadRequestException
+    if it is not valid JSON
+    """
+    body = event.get("body")
+    if isinstance(body, (str, bytes)):
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise BadRequestException(
+                recommended_data={"details": "Request body is not valid JSON"}
+            ) from None
+    return body
 
 
 def validate_request(data, required_fields=None):
@@ -19,3 +75,248 @@ def validate_request(data, required_fields=None):
                 }
             )
     return True
+
+
+class Field:
+    """One field of a request schema"""
+
+    __slots__ = ("kind", "required", "min", "max", "min_length", "max_length", "choices", "items")
+
+    def __init__(self, kind, required=True, min=None, max=None, min_length=None,
+                 max_length=None, choices=None, items=None):
+        self.kind = kind
+        self.required = required
+        self.min = min
+        self.max = max
+        self.min_length = min_length
+        self.max_length = max_length
+        self.choices = choices
+        self.items = items
+
+
+# ---------------------------------------------------------------------------
+# Scalar checks: value -> error message or None
+# ---------------------------------------------------------------------------
+
+def _compile_str(field):
+    max_length = field.max_length
+    choices = frozenset(field.choices) if field.choices is not None else None
+
+    def check(value):
+        if value.__class__ is not str:
+            return "must be a string"
+        if not value:
+            return "must not be empty"
+        if max_length is not None and len(value) > max_length:
+            return f"must be at most {max_length} characters"
+        if choices is not None and value not in choices:
+            return f"must be one of {', '.join(sorted(choices))}"
+        return None
+
+    return check
+
+
+def _compile_int(field):
+    low = field.min
+    high = field.max
+
+    def check(value):
+        if value.__class__ is not int:
+            return "must be an integer"
+        if low is not None and value < low:
+            return f"must be at least {low}"
+        if high is not None and value > high:
+            return f"must be at most {high}"
+        return None
+
+    return check
+
+
+def _compile_amount(field):
+    fullmatch = _AMOUNT_STRING.fullmatch
+
+    def check(value):
+        cls = value.__class__
+        if cls is str:
+            if not fullmatch(value):
+                return "must be a decimal amount"
+            positive = value.strip("0.") != ""
+        elif cls is int:
+            positive = value > 0
+        elif cls is float:
+            if not math.isfinite(value):
+                return "must be a decimal amount"
+            positive = value > 0
+        else:
+            return "must be a decimal amount"
+        if not positive:
+            return "must be greater than 0"
+        if cls is not str and value >= MAX_AMOUNT:
+            return f"must be less than {MAX_AMOUNT}"
+        return None
+
+    return check
+
+
+_SCALARS = {
+    "str": _compile_str,
+    "int": _compile_int,
+    "amount": _compile_amount,
+}
+
+
+# ---------------------------------------------------------------------------
+# Containers: check(value, path, errors)
+# ---------------------------------------------------------------------------
+
+def _error(path, message):
+    return {"field": path, "message": message}
+
+
+def _compile_list(field):
+    check_item = _compile_map(field.items) if field.items is not None else None
+    min_length = field.min_length
+    max_length = field.max_length
+    too_short = "must not be empty" if min_length == 1 else f"must have at least {min_length} entries"
+
+    def check(value, path, errors):
+        if value.__class__ is not list:
+            errors.append(_error(path, "must be a list"))
+            return
+        if min_length is not None and len(value) < min_length:
+            errors.append(_error(path, too_short))
+            return
+        if max_length is not None and len(value) > max_length:
+            errors.append(_error(path, f"must have at most {max_length} entries"))
+            return
+        if check_item is None:
+            return
+        for index, item in enumerate(value):
+            if check_item(item, path, errors, index):
+                break
+
+    return check
+
+
+def _compile_map(schema):
+    """
+    check(record, path, errors, index=None) for a map schema; returns True
+    once MAX_REPORTED_ERRORS have been collected
+    """
+    fields = []
+    for name, field in schema.items():
+        if field.kind == "list":
+            fields.append((name, field.required, True, _compile_list(field)))
+        else:
+            try:
+                compile_scalar = _SCALARS[field.kind]
+            except KeyError:
+                raise ValueError(f"Unknown field kind: {field.kind!r}") from None
+            fields.append((name, field.required, False, compile_scalar(field)))
+    fields = tuple(fields)
+
+    def check(record, path, errors, index=None):
+        if record.__class__ is not dict:
+            where = path if index is None else f"{path}[{index}]"
+            errors.append(_error(where or "body", "must be an object"))
+            return len(errors) >= MAX_REPORTED_ERRORS
+        get = record.get
+        for name, required, nested, check_field in fields:
+            value = get(name)
+            if value is None:
+                if required:
+                    errors.append(_error(_path(path, index, name), "is required"))
+                continue
+            if nested:
+                check_field(value, _path(path, index, name), errors)
+            else:
+                message = check_field(value)
+                if message is not None:
+                    errors.append(_error(_path(path, index, name), message))
+        return len(errors) >= MAX_REPORTED_ERRORS
+
+    return check
+
+
+def _path(path, index, name):
+    """Field path as reported to the client: items[2].quantity"""
+    if index is not None:
+        return f"{path}[{index}].{name}"
+    return f"{path}.{name}" if path else name
+
+
+class RequestValidator:
+    """A compiled request schema; validate(body) raises BadRequestException"""
+
+    __slots__ = ("schema", "_check")
+
+    def __init__(self, schema):
+        self.schema = schema
+        self._check = _compile_map(schema)
+
+    def errors(self, body):
+        """Every problem with body (up to MAX_REPORTED_ERRORS), as dicts"""
+        errors = []
+        self._check(body, "", errors)
+        return errors[:MAX_REPORTED_ERRORS]
+
+    def validate(self, body):
+        if not body:
+            raise BadRequestException(
+                recommended_data={"details": "Request body is missing or empty."}
+            )
+        errors = self.errors(body)
+        if errors:
+            raise BadRequestException(
+                recommended_data={
+                    "details": "; ".join(f"{e['field']}: {e['message']}" for e in errors),
+                    "errors": errors,
+                }
+            )
+        return body
+
+
+# ---------------------------------------------------------------------------
+# Endpoint schemas
+# ---------------------------------------------------------------------------
+
+_ID = Field("str", max_length=MAX_ID_LENGTH)
+
+ORDER_LINE_SCHEMA = {
+    "vendorId": _ID,
+    "productId": _ID,
+    # Defaults to 1; the unit price comes from the catalog, not the client
+    "quantity": Field("int", required=False, min=1, max=MAX_LINE_QUANTITY),
+}
+
+ORDER_SCHEMA = {
+    "customerId": _ID,
+    "items": Field("list", min_length=1, max_length=MAX_ORDER_LINES, items=ORDER_LINE_SCHEMA),
+    "currency": Field("str", required=False, choices=CURRENCY_EXPONENTS),
+    "idempotencyKey": Field("str", required=False, max_length=MAX_ID_LENGTH),
+}
+
+# Orders in a batch are validated one by one, so one bad order does not
+# reject the others
+ORDER_BATCH_SCHEMA = {
+    "orders": Field("list", min_length=1),
+}
+
+PAYMENT_SCHEMA = {
+    "orderId": _ID,
+    "amount": Field("amount"),
+    "currency": Field("str", required=False, choices=CURRENCY_EXPONENTS),
+    "paymentMethod": Field("str", max_length=64),
+}
+
+INVENTORY_SCHEMA = {
+    "vendorId": _ID,
+    "productId": _ID,
+    # Stock delta: negative reserves, positive restocks
+    "quantity": Field("int", min=-MAX_INVENTORY_CHANGE, max=MAX_INVENTORY_CHANGE),
+}
+
+ORDER_REQUEST = RequestValidator(ORDER_SCHEMA)
+ORDER_BATCH_REQUEST = RequestValidator(ORDER_BATCH_SCHEMA)
+PAYMENT_REQUEST = RequestValidator(PAYMENT_SCHEMA)
+INVENTORY_REQUEST = RequestValidator(INVENTORY_SCHEMA)
@@ -2,32 +2,32 @@
 # This module automatically patches AWS services for X-Ray tracing
 # Import this module FIRST to ensure all boto3 calls are traced
 
+import logging
 import os
 
+logger = logging.getLogger("xray-auto-patch")
+
+# Only the AWS SDK needs tracing; patch_all() would also import and patch
+# every other supported library, which costs cold-start time
+PATCHED_MODULES = ('botocore',)
+
 # Check if X-Ray auto-patching is enabled via environment variable
 if os.environ.get('XRAY_AUTO_PATCH', '').lower() == 'true':
     try:
         from aws_xray_sdk.core import xray_recorder
-        from aws_xray_sdk.core import patch_all
+        from aws_xray_sdk.core import patch
         
-        # Auto-patch all AWS services for X-Ray tracing (including DynamoDB)
-        patch_all()
+        # Auto-patch AWS services for X-Ray tracing (including DynamoDB)
+        patch(PATCHED_MODULES)
         
         # Configure X-Ray recorder for Lambda environment
-        xray_recorder.configure(
-            context_missing='LOG_ERROR',
-            plugins=('EC2Plugin', 'ECSPlugin'),
-        )
+        xray_recorder.configure(context_missing='LOG_ERROR')
         
-        print("X-Ray auto-patching enabled for all AWS services including DynamoDB")
+        logger.debug("X-Ray auto-patching enabled for %s", PATCHED_MODULES)
         
     except ImportError:
         # X-Ray SDK not available - silently skip patching
-        print("X-Ray SDK not available - skipping patching")
-        pass
+        logger.debug("X-Ray SDK not available - skipping patching")
     except Exception as e:
-        # Any other X-Ray configuration error - silently skip
-        print(f"X-Ray configuration error: {e} - skipping patching")
-        pass
-else:
-    print("X-Ray auto-patching disabled - set XRAY_AUTO_PATCH=true to enable")
+        # Any other X-Ray configuration error - skip patching
+        logger.warning("X-Ray configuration error: %s - skipping patching", e)
@@ -0,0 +1,85 @@
+# Data access for the product catalog (authoritative unit prices)
+import os
+import random
+import time
+from botocore.exceptions import ClientError
+from common.exceptions import InternalServerError
+from common.aws_clients import get_client
+from common.metrics import metrics
+from dao.codecs import CATALOG
+
+CATALOG_TABLE = os.getenv("CATALOG_TABLE", "Catalog")
+
+# BatchGetItem limits and retry policy for unprocessed keys
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+BATCH_GET_BACKOFF_SECONDS = 0.05
+
+_RETRYABLE_ERRORS = (
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+)
+
+# Lazy initialization to ensure X-Ray patching happens first;
+# clients come from the shared, tuned registry in common.aws_clients
+_client = None
+
+
+def get_dynamodb_client():
+    """Get the low-level DynamoDB client with lazy initialization"""
+    global _client
+    if _client is None:
+        _client = get_client("dynamodb")
+    return _client
+
+
+@metrics.timed("get_catalog_items")
+def get_catalog_items(keys):
+    """
+    Read catalog entries with BatchGetItem, 100 keys per request.
+
+    Only the price attributes are projected. UnprocessedKeys are retried with
+    exponential backoff; keys still unprocessed after all attempts raise
+    InternalServerError, since an order cannot be priced without them.
+
+    Args:
+        keys: Distinct (vendorId, productId) pairs
+
+    Returns:
+        dict: (vendorId, productId) -> {"price": Decimal, "currency": str} for
+        the products that exist; unknown products are absent
+    """
+    client = get_dynamodb_client()
+    keys = list(keys)
+    found = {}
+    for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        request = {
+            CATALOG_TABLE: {
+                "Keys": [
+                    CATALOG.encode({"vendorId": vendor_id, "productId": product_id})
+                    for vendor_id, product_id in keys[start:start + BATCH_GET_MAX_KEYS]
+                ],
+                "ProjectionExpression": "vendorId, productId, price, currency",
+            }
+        }
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(random.uniform(0, BATCH_GET_BACKOFF_SECONDS * (2 ** attempt)))
+            try:
+                response = client.batch_get_item(RequestItems=request)
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in _RETRYABLE_ERRORS:
+                    raise InternalServerError(recommended_data={"details": str(e)})
+                continue
+            for item in response.get("Responses", {}).get(CATALOG_TABLE, []):
+                entry = CATALOG.decode(item)
+                found[(entry["vendorId"], entry["productId"])] = entry
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+        if request:
+            raise InternalServerError(
+                recommended_data={"details": "Catalog prices could not be read"}
+            )
+    return found
@@ -0,0 +1,276 @@
+# Conversion between Python records and low-level DynamoDB attribute values
+#
+# Each table has a declarative schema that is compiled once, at import, into
+# encode/decode functions. Known fields skip the per-value type dispatch of
+# boto3's TypeSerializer; unknown fields and unexpected values fall back to
+# the generic encode_value/decode_value, so a schema never rejects a record
+# that TypeSerializer would have accepted.
+#
+# Schema values:
+#   "S"      string
+#   "N"      number, decoded as Decimal
+#   "int"    number, decoded as int
+#   "BOOL"   boolean
+#   {...}    nested map with its own schema
+#   [{...}]  list of maps with the given schema (e.g. order lines)
+import math
+from collections.abc import Mapping
+from decimal import Decimal
+
+
+def _number_string(value):
+    """DynamoDB N string for an int, Decimal or float; NaN/Infinity are rejected"""
+    cls = value.__class__
+    if cls is int:
+        return str(value)
+    if cls is Decimal or isinstance(value, Decimal):
+        if value.is_finite():
+            return str(value)
+    elif isinstance(value, float):
+        # repr is the shortest string that round-trips, so 0.1 stays "0.1"
+        if math.isfinite(value):
+            return repr(value)
+    elif isinstance(value, int):
+        return str(int(value))
+    raise TypeError(f"{value!r} is not a valid DynamoDB number")
+
+
+def encode_value(value):
+    """Encode any supported Python value (the TypeSerializer type rules)"""
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, (int, float, Decimal)):
+        return {"N": _number_string(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"B": bytes(value)}
+    if isinstance(value, Mapping):
+        return {"M": {str(k): encode_value(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {"L": [encode_value(v) for v in value]}
+    if isinstance(value, (set, frozenset)) and value:
+        if all(isinstance(v, str) for v in value):
+            return {"SS": list(value)}
+        if all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in value):
+            return {"NS": [_number_string(v) for v in value]}
+        if all(isinstance(v, (bytes, bytearray)) for v in value):
+            return {"BS": [bytes(v) for v in value]}
+    raise TypeError(f"Unsupported type for DynamoDB: {type(value).__name__}")
+
+
+def decode_value(attribute):
+    """Decode any low-level attribute value (numbers become Decimal)"""
+    (tag, value), = attribute.items()
+    if tag == "S" or tag == "BOOL" or tag == "B":
+        return value
+    if tag == "N":
+        return Decimal(value)
+    if tag == "NULL":
+        return None
+    if tag == "M":
+        return {k: decode_value(v) for k, v in value.items()}
+    if tag == "L":
+        return [decode_value(v) for v in value]
+    if tag == "SS" or tag == "BS":
+        return set(value)
+    if tag == "NS":
+        return {Decimal(v) for v in value}
+    raise TypeError(f"Unknown DynamoDB attribute type: {tag}")
+
+
+# ---------------------------------------------------------------------------
+# Per-field encoders and decoders
+# ---------------------------------------------------------------------------
+
+def _encode_string(value):
+    if value.__class__ is str:
+        return {"S": value}
+    return encode_value(value)
+
+
+def _encode_number(value):
+    if value.__class__ is Decimal and value.is_finite():
+        return {"N": str(value)}
+    if value.__class__ is bool or value is None:
+        return encode_value(value)
+    return {"N": _number_string(value)}
+
+
+def _encode_bool(value):
+    if value.__class__ is bool:
+        return {"BOOL": value}
+    return encode_value(value)
+
+
+def _decode_string(attribute):
+    value = attribute.get("S")
+    return decode_value(attribute) if value is None else value
+
+
+def _decode_decimal(attribute):
+    value = attribute.get("N")
+    return decode_value(attribute) if value is None else Decimal(value)
+
+
+def _decode_int(attribute):
+    value = attribute.get("N")
+    if value is None:
+        return decode_value(attribute)
+    try:
+        return int(value)
+    except ValueError:
+        # Exponent or fractional form; keep the exact value
+        return Decimal(value)
+
+
+def _decode_bool(attribute):
+    value = attribute.get("BOOL")
+    return decode_value(attribute) if value is None else value
+
+
+_SCALARS = {
+    "S": (_encode_string, _decode_string),
+    "N": (_encode_number, _decode_decimal),
+    "int": (_encode_number, _decode_int),
+    "BOOL": (_encode_bool, _decode_bool),
+}
+
+
+def _compile_map(schema):
+    """encode(record) -> item and decode(item) -> record for a map schema"""
+    encoders = {}
+    decoders = {}
+    for name, spec in schema.items():
+        encoders[name], decoders[name] = _compile_field(spec)
+    encoder_for = encoders.get
+    decoder_for = decoders.get
+
+    def encode(record):
+        return {
+            name: encoder_for(name, encode_value)(value) for name, value in record.items()
+        }
+
+    def decode(item):
+        return {
+            name: decoder_for(name, decode_value)(value) for name, value in item.items()
+        }
+
+    return encode, decode
+
+
+def _compile_field(spec):
+    if isinstance(spec, str):
+        try:
+            return _SCALARS[spec]
+        except KeyError:
+            raise ValueError(f"Unknown schema type: {spec!r}") from None
+
+    if isinstance(spec, dict):
+        encode_map, decode_map = _compile_map(spec)
+
+        def encode(value):
+            if isinstance(value, Mapping):
+                return {"M": encode_map(value)}
+            return encode_value(value)
+
+        def decode(attribute):
+            value = attribute.get("M")
+            return decode_value(attribute) if value is None else decode_map(value)
+
+        return encode, decode
+
+    if isinstance(spec, list) and len(spec) == 1 and isinstance(spec[0], dict):
+        encode_map, decode_map = _compile_map(spec[0])
+
+        def encode(value):
+            if value.__class__ is list or value.__class__ is tuple:
+                return {
+                    "L": [
+                        {"M": encode_map(v)} if isinstance(v, Mapping) else encode_value(v)
+                        for v in value
+                    ]
+                }
+            return encode_value(value)
+
+        def decode(attribute):
+            value = attribute.get("L")
+            if value is None:
+                return decode_value(attribute)
+            return [
+                decode_map(v["M"]) if "M" in v else decode_value(v) for v in value
+            ]
+
+        return encode, decode
+
+    raise ValueError(f"Unknown schema type: {spec!r}")
+
+
+class ItemCodec:
+    """Compiled encode/decode functions for one table's items"""
+
+    __slots__ = ("schema", "encode", "decode")
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.encode, self.decode = _compile_map(schema)
+
+
+# ---------------------------------------------------------------------------
+# Table schemas
+# ---------------------------------------------------------------------------
+
+ORDER_LINE_SCHEMA = {
+    "vendorId": "S",
+    "productId": "S",
+    "quantity": "int",
+    "price": "N",
+    "discount": "N",
+    "tax": "N",
+}
+
+ORDER_SCHEMA = {
+    "orderId": "S",
+    "customerId": "S",
+    "status": "S",
+    "createdAt": "S",
+    "currency": "S",
+    "subtotalAmount": "N",
+    "discountAmount": "N",
+    "taxAmount": "N",
+    "totalAmount": "N",
+    "items": [ORDER_LINE_SCHEMA],
+    "version": "int",
+    "statusUpdatedAt": "S",
+}
+
+PAYMENT_SCHEMA = {
+    "paymentId": "S",
+    "orderId": "S",
+    "amount": "N",
+    "currency": "S",
+    "paymentMethod": "S",
+    "status": "S",
+    "processedAt": "S",
+}
+
+INVENTORY_SCHEMA = {
+    "vendorId": "S",
+    "productId": "S",
+    "quantity": "int",
+    "updatedAt": "S",
+}
+
+CATALOG_SCHEMA = {
+    "vendorId": "S",
+    "productId": "S",
+    "price": "N",
+    "currency": "S",
+}
+
+ORDERS = ItemCodec(ORDER_SCHEMA)
+PAYMENTS = ItemCodec(PAYMENT_SCHEMA)
+INVENTORY = ItemCodec(INVENTORY_SCHEMA)
+CATALOG = ItemCodec(CATALOG_SCHEMA)
@@ -1,15 +1,19 @@
 # Data access for inventory records
 import os
-import boto3
 import json
 from datetime import datetime
 from botocore.exceptions import ClientError
-from common.exceptions import InternalServerError
+from common.exceptions import InternalServerError, OutOfStockException
+from common.aws_clients import get_client, get_resource
+from common.metrics import metrics
+from dao.codecs import INVENTORY, encode_value
+from dao.records import InventoryChange
 
 INVENTORY_TABLE = os.getenv("INVENTORY_TABLE", "Inventory")
 IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE", "IdempotencyKeys")
 
-# Lazy initialization to ensure X-Ray patching happens first
+# Lazy initialization to ensure X-Ray patching happens first;
+# clients come from the shared, tuned registry in common.aws_clients
 _dynamodb = None
 _client = None
 _table = None
@@ -18,40 +22,159 @@ def get_dynamodb_resources():
     """Get DynamoDB resources with lazy initialization to ensure X-Ray patching"""
     global _dynamodb, _client, _table
     if _dynamodb is None:
-        _dynamodb = boto3.resource("dynamodb")
-        _client = boto3.client("dynamodb")
+        _dynamodb = get_resource("dynamodb")
+        _client = get_client("dynamodb")
         _table = _dynamodb.Table(INVENTORY_TABLE)
     return _dynamodb, _client, _table
 
 
-def update_inventory_record(inventory_record):
+# TransactWriteItems accepts at most 100 actions per request
+MAX_TRANSACTION_ITEMS = 100
+
+
+def _stock_update(vendor_id, product_id, quantity_change, updated_at=None, conditional=True):
+    """Build UpdateItem parameters that ADD quantity_change to a stock counter"""
+    params = {
+        "TableName": INVENTORY_TABLE,
+        "Key": INVENTORY.encode({"vendorId": vendor_id, "productId": product_id}),
+        "UpdateExpression": "ADD quantity :delta SET updatedAt = :updated_at",
+        "ExpressionAttributeValues": {
+            ":delta": encode_value(quantity_change),
+            ":updated_at": encode_value(updated_at or datetime.utcnow().isoformat()),
+        },
+    }
+    if conditional and quantity_change < 0:
+        params["ConditionExpression"] = "quantity >= :required"
+        params["ExpressionAttributeValues"][":required"] = encode_value(-quantity_change)
+    return params
+
+
+@metrics.timed("update_inventory_record")
+def update_inventory_record(change: InventoryChange):
+    """
+    Atomically apply a stock change and return the new stock level.
+
+    change.quantity is the delta. Counters are updated in place
+    with ADD; decrements are conditional so stock never goes negative, and
+    an insufficient level raises OutOfStockException.
+    """
     # Get DynamoDB resources with lazy initialization
     dynamodb, client, table = get_dynamodb_resources()
-    
-    order_id = inventory_record.get("orderId")
-    transact_items = [
-        {
-            "Put": {
-                "TableName": INVENTORY_TABLE,
-                "Item": {
-                    k: {"S": str(v)} if isinstance(v, str) else {"N": str(v)}
-                    for k, v in inventory_record.items()
-                },
+
+    vendor_id = change.vendor_id
+    product_id = change.product_id
+    quantity_change = change.quantity
+    params = _stock_update(vendor_id, product_id, quantity_change, change.updated_at)
+    params["ReturnValues"] = "UPDATED_NEW"
+    try:
+        response = client.update_item(**params)
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            raise OutOfStockException(
+                recommended_data={
+                    "vendorId": vendor_id,
+                    "productId": product_id,
+                    "requested": -quantity_change,
+                }
+            )
+        raise InternalServerError(recommended_data={"details": str(e)})
+    return INVENTORY.decode(response["Attributes"])["quantity"]
+
+
+@metrics.timed("apply_inventory_changes")
+def apply_inventory_changes(changes):
+    """
+    Apply several stock changes all-or-nothing.
+
+    changes is a list of InventoryChange deltas with at most one entry per
+    product. Up to MAX_TRANSACTION_ITEMS changes are
+    written in a single TransactWriteItems call. Larger sets are written as
+    consecutive transactions; if a later transaction fails, the chunks
+    already committed are compensated with the inverse deltas before the
+    error is raised, so callers still see all-or-nothing behaviour.
+    Raises OutOfStockException listing every product that was short.
+    """
+    dynamodb, client, table = get_dynamodb_resources()
+    updated_at = datetime.utcnow().isoformat()
+
+    applied = []
+    for start in range(0, len(changes), MAX_TRANSACTION_ITEMS):
+        chunk = changes[start:start + MAX_TRANSACTION_ITEMS]
+        transact_items = [
+            {
+                "Update": _stock_update(
+                    change.vendor_id, change.product_id, change.quantity, updated_at
+                )
             }
+            for change in chunk
+        ]
+        try:
+            client.transact_write_items(TransactItems=transact_items)
+        except ClientError as e:
+            if applied:
+                _compensate(client, applied, updated_at)
+            raise _transaction_error(e, chunk)
+        applied.extend(chunk)
+
+
+def _compensate(client, applied, updated_at):
+    """Reverse already committed changes after a later transaction failed"""
+    for start in range(0, len(applied), MAX_TRANSACTION_ITEMS):
+        chunk = applied[start:start + MAX_TRANSACTION_ITEMS]
+        try:
+            client.transact_write_items(
+                TransactItems=[
+                    {
+                        "Update": _stock_update(
+                            change.vendor_id,
+                            change.product_id,
+                            -change.quantity,
+                            updated_at,
+                            conditional=False,
+                        )
+                    }
+                    for change in chunk
+                ]
+            )
+        except ClientError as e:
+            raise InternalServerError(
+                "Failed to roll back partial inventory update",
+                recommended_data={
+                    "details": str(e),
+                    "changes": [change.to_dict() for change in chunk],
+                },
+            )
+
+
+def _transaction_error(error, chunk):
+    """Map a TransactWriteItems failure to a typed exception"""
+    reasons = error.response.get("CancellationReasons") or []
+    short = [
+        {
+            "vendorId": change.vendor_id,
+            "productId": change.product_id,
+            "requested": -change.quantity,
         }
+        for change, reason in zip(chunk, reasons)
+        if reason.get("Code") == "ConditionalCheckFailed"
     ]
-    # Add idempotency record if order_id is present
-    if order_id:
-        transact_items.append(
-            {
-                "Put": {
-                    "TableName": IDEMPOTENCY_TABLE,
-                    "Item": {"id": {"S": order_id}},
-                    "ConditionExpression": "attribute_not_exists(id)",
-                }
-            }
-        )
+    if short:
+        return OutOfStockException(recommended_data={"items": short})
+    return InternalServerError(recommended_data={"details": str(error)})
+
+
+def get_inventory_quantity(vendor_id, product_id):
+    """Return the current stock level, or 0 for unknown products"""
+    dynamodb, client, table = get_dynamodb_resources()
     try:
-        client.transact_write_items(TransactItems=transact_items)
+        response = client.get_item(
+            TableName=INVENTORY_TABLE,
+            Key=INVENTORY.encode({"vendorId": vendor_id, "productId": product_id}),
+            ProjectionExpression="quantity",
+        )
     except ClientError as e:
         raise InternalServerError(recommended_data={"details": str(e)})
+    item = response.get("Item")
+    if not item or "quantity" not in item:
+        return 0
+    return INVENTORY.decode(item)["quantity"]
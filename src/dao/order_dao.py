@@ -1,52 +1,331 @@
 # Data access for order records
 import os
-import boto3
-import json
-from datetime import datetime
-from decimal import Decimal
+import random
+import time
+from dataclasses import dataclass
+from itertools import islice
+from datetime import datetime, timezone
+from typing import Optional
 from botocore.exceptions import ClientError
 from common.exceptions import InternalServerError
+from common.logger import get_logger
+from common.aws_clients import get_client, get_resource
+from common.metrics import metrics
+from common.idempotency import STATUS_COMPLETED, STATUS_UNPUBLISHED, IDEMPOTENCY_TTL_SECONDS
+from dao.codecs import ORDERS
+from dao.records import OrderRecord
 
 # Use the correct environment variable names from template.yaml
 ORDERS_TABLE = os.getenv("ORDERS_TABLE", "Orders")
 IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE", "IdempotencyKeys")
 
-# Lazy initialization to ensure X-Ray patching happens first
+# BatchWriteItem limits and retry policy for unprocessed items
+BATCH_WRITE_MAX_ITEMS = 25
+BATCH_WRITE_MAX_ATTEMPTS = 5
+BATCH_WRITE_BACKOFF_SECONDS = 0.05
+
+# Lazy initialization to ensure X-Ray patching happens first;
+# clients come from the shared, tuned registry in common.aws_clients
 _dynamodb = None
+_client = None
 _table = None
 
+
+@dataclass(frozen=True)
+class StatusUpdateResult:
+    """
+    Outcome of update_order_status_record. When the condition failed,
+    status/version are the stored ones (None if the order does not exist).
+    """
+
+    updated: bool
+    status: Optional[str]
+    version: Optional[int]
+
+    @property
+    def found(self):
+        return self.status is not None
+
+
+@dataclass(frozen=True)
+class SaveOrderResult:
+    """
+    Outcome of save_order; duplicates carry the previously stored orderId,
+    and published is False while that order's OrderPlaced is unconfirmed
+    """
+
+    order_id: str
+    created: bool
+    published: bool = True
+
+    @property
+    def duplicate(self):
+        return not self.created
+
+
 def get_dynamodb_table():
     """Get DynamoDB table with lazy initialization to ensure X-Ray patching"""
-    global _dynamodb, _table
+    global _dynamodb, _client, _table
     if _table is None:
-        _dynamodb = boto3.resource("dynamodb")
+        _dynamodb = get_resource("dynamodb")
+        _client = get_client("dynamodb")
         _table = _dynamodb.Table(ORDERS_TABLE)
     return _table
 
 
-def save_order(order_record):
-    """Save order using high-level DynamoDB resource for simplicity"""
+def get_dynamodb_client():
+    """Get the low-level DynamoDB client used for transactions"""
+    get_dynamodb_table()
+    return _client
+
+
+def order_idempotency_key(order_id, idempotency_key: Optional[str] = None,
+                          customer_id: Optional[str] = None):
+    """
+    Idempotency marker id for an order. Client keys are scoped to the
+    customer, so two customers reusing a key never see each other's orders.
+    """
+    if idempotency_key:
+        return f"order#{customer_id}#{idempotency_key}"
+    return f"order#{order_id}"
+
+
+@metrics.timed("save_order")
+def save_order(order_record: OrderRecord, idempotency_key: Optional[str] = None) -> SaveOrderResult:
+    """
+    Write the order and its idempotency marker in one TransactWriteItems call.
+
+    The marker is keyed by the customer and the client's idempotency key
+    when supplied (else the orderId). If the marker already exists the transaction is cancelled
+    and the stored orderId is returned as a duplicate result.
+
+    A client key's marker starts out UNPUBLISHED and is completed by
+    complete_order_markers once OrderPlaced is published, so a retry of an
+    order whose event never went out can tell and publish it.
+    """
+    client = get_dynamodb_client()
+    order_id = order_record.order_id
+    now = int(time.time())
+    marker_status = STATUS_UNPUBLISHED if idempotency_key else STATUS_COMPLETED
+    transact_items = [
+        {
+            "Put": {
+                "TableName": ORDERS_TABLE,
+                "Item": order_record.to_item(),
+                "ConditionExpression": "attribute_not_exists(orderId)",
+            }
+        },
+        {
+            "Put": {
+                "TableName": IDEMPOTENCY_TABLE,
+                "Item": {
+                    "id": {"S": order_idempotency_key(
+                        order_id, idempotency_key, order_record.customer_id
+                    )},
+                    "orderId": {"S": order_id},
+                    "status": {"S": marker_status},
+                    "expiration": {"N": str(now + IDEMPOTENCY_TTL_SECONDS)},
+                },
+                # Expired markers (not yet removed by TTL) can be replaced
+                "ConditionExpression": "attribute_not_exists(id) OR expiration < :now",
+                "ExpressionAttributeValues": {":now": {"N": str(now)}},
+                "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+            }
+        },
+    ]
+    try:
+        client.transact_write_items(TransactItems=transact_items)
+    except ClientError as e:
+        reasons = e.response.get("CancellationReasons") or []
+        if len(reasons) > 1 and reasons[1].get("Code") == "ConditionalCheckFailed":
+            marker = reasons[1].get("Item", {})
+            return SaveOrderResult(
+                order_id=marker.get("orderId", {}).get("S", order_id),
+                created=False,
+                published=marker.get("status", {}).get("S") != STATUS_UNPUBLISHED,
+            )
+        raise InternalServerError(recommended_data={"details": str(e)})
+    return SaveOrderResult(order_id=order_id, created=True)
+
+
+@metrics.timed("complete_order_markers")
+def complete_order_markers(markers):
+    """
+    Mark idempotency markers COMPLETED once their orders' OrderPlaced events
+    are published; markers maps marker ids (order_idempotency_key) to orderIds.
+
+    Written with BatchWriteItem like save_orders. Markers that cannot be
+    written are logged and stay UNPUBLISHED, which only makes a retry
+    publish OrderPlaced once more.
+
+    Returns:
+        list: marker ids that could not be written
+    """
+    client = get_dynamodb_client()
+    logger = get_logger("order-dao")
+    expiration = {"N": str(int(time.time()) + IDEMPOTENCY_TTL_SECONDS)}
+    puts = [
+        {"PutRequest": {"Item": {
+            "id": {"S": marker_id},
+            "orderId": {"S": order_id},
+            "status": {"S": STATUS_COMPLETED},
+            "expiration": expiration,
+        }}}
+        for marker_id, order_id in markers.items()
+    ]
+    failed = [
+        put["PutRequest"]["Item"]["id"]["S"]
+        for put in _batch_write(client, IDEMPOTENCY_TABLE, puts, logger)
+    ]
+    if failed:
+        logger.error("Idempotency markers not completed", extra={"markers": failed})
+    return failed
+
+
+@metrics.timed("get_order")
+def get_order(order_id: str) -> Optional[OrderRecord]:
+    """The stored order, or None if it does not exist"""
+    client = get_dynamodb_client()
     try:
-        # Get DynamoDB table with lazy initialization
-        table = get_dynamodb_table()
-        
-        # Use high-level put_item instead of low-level transact_write
-        table.put_item(Item=order_record)
-        
-        # Handle idempotency separately if needed
-        order_id = order_record.get("orderId")
-        if order_id:
-            idempotency_table = _dynamodb.Table(IDEMPOTENCY_TABLE)
+        response = client.get_item(
+            TableName=ORDERS_TABLE, Key={"orderId": {"S": order_id}}, ConsistentRead=True
+        )
+    except ClientError as e:
+        raise InternalServerError(recommended_data={"details": str(e)})
+    item = response.get("Item")
+    return OrderRecord.from_item(item) if item else None
+
+
+@metrics.timed("save_orders")
+def save_orders(order_records):
+    """
+    Bulk-write orders with BatchWriteItem in chunks of 25.
+
+    UnprocessedItems and throttled requests are retried with exponential
+    backoff; any other error fails the rest of that chunk and the next chunk
+    is still written. Batch writes are unconditional, so no idempotency
+    markers are written here: orders carrying a client idempotency key must
+    go through save_order instead.
+
+    Returns:
+        list: orderIds that could not be written after all retries
+    """
+    client = get_dynamodb_client()
+    logger = get_logger("order-dao")
+    # Items are encoded chunk by chunk as _batch_write consumes them
+    puts = ({"PutRequest": {"Item": record.to_item()}} for record in order_records)
+    return [
+        put["PutRequest"]["Item"]["orderId"]["S"]
+        for put in _batch_write(client, ORDERS_TABLE, puts, logger)
+    ]
+
+
+def _batch_write(client, table_name, puts, logger):
+    """
+    BatchWriteItem an iterable of puts in chunks of 25, retrying
+    UnprocessedItems and throttled requests with exponential backoff; any
+    other error fails the rest of that chunk and the next chunk is still
+    written.
+
+    Returns:
+        list: the puts that could not be written after all retries
+    """
+    failed = []
+    puts = iter(puts)
+    while True:
+        chunk = list(islice(puts, BATCH_WRITE_MAX_ITEMS))
+        if not chunk:
+            break
+        request = {table_name: chunk}
+        for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(random.uniform(0, BATCH_WRITE_BACKOFF_SECONDS * (2 ** attempt)))
             try:
-                # Use the correct key name 'id' as defined in template.yaml
-                idempotency_table.put_item(
-                    Item={"id": order_id},
-                    ConditionExpression="attribute_not_exists(id)"
-                )
+                response = client.batch_write_item(RequestItems=request)
             except ClientError as e:
-                # If idempotency check fails, it's likely a duplicate - that's okay
-                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
-                    raise
-                    
+                if e.response["Error"]["Code"] not in (
+                    "ProvisionedThroughputExceededException",
+                    "ThrottlingException",
+                    "RequestLimitExceeded",
+                ):
+                    logger.error(
+                        "BatchWriteItem failed",
+                        extra={"error": str(e), "table": table_name, "items": len(chunk)},
+                    )
+                    break
+                continue
+            request = response.get("UnprocessedItems") or {}
+            if not request:
+                break
+        failed.extend(request.get(table_name, []))
+    return failed
+
+
+@metrics.timed("update_order_status")
+def update_order_status_record(order_id: str, current_status: str, new_status: str,
+                               expected_version: int) -> StatusUpdateResult:
+    """
+    Compare-and-set an order's status with one conditional UpdateItem.
+
+    The write only succeeds if the order is still at expected_version (and
+    current_status); it then bumps the version. Orders written before the
+    version attribute existed count as version 1. When the condition fails
+    the stored item comes back with the error (ALL_OLD), so the caller
+    learns the actual status and version without a separate read.
+    """
+    client = get_dynamodb_client()
+    condition = "#status = :current AND #version = :expected"
+    if expected_version == 1:
+        condition = "#status = :current AND (#version = :expected OR attribute_not_exists(#version))"
+    try:
+        client.update_item(
+            TableName=ORDERS_TABLE,
+            Key={"orderId": {"S": order_id}},
+            UpdateExpression="SET #status = :new, #version = :next, statusUpdatedAt = :now",
+            ConditionExpression=condition,
+            ExpressionAttributeNames={"#status": "status", "#version": "version"},
+            ExpressionAttributeValues={
+                ":current": {"S": current_status},
+                ":new": {"S": new_status},
+                ":expected": {"N": str(expected_version)},
+                ":next": {"N": str(expected_version + 1)},
+                ":now": {"S": datetime.now(timezone.utc).isoformat()},
+            },
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise InternalServerError(recommended_data={"details": str(e)})
+        item = e.response.get("Item")
+        if not item:
+            return StatusUpdateResult(updated=False, status=None, version=None)
+        stored = ORDERS.decode({
+            name: item[name] for name in ("status", "version") if name in item
+        })
+        return StatusUpdateResult(
+            updated=False, status=stored.get("status"), version=stored.get("version", 1)
+        )
+    return StatusUpdateResult(updated=True, status=new_status, version=expected_version + 1)
+
+
+def get_order_status(order_id: str) -> StatusUpdateResult:
+    """
+    Stored status and version of an order (updated is always False; status
+    is None if the order does not exist)
+    """
+    client = get_dynamodb_client()
+    try:
+        response = client.get_item(
+            TableName=ORDERS_TABLE,
+            Key={"orderId": {"S": order_id}},
+            ProjectionExpression="#status, #version",
+            ExpressionAttributeNames={"#status": "status", "#version": "version"},
+            ConsistentRead=True,
+        )
     except ClientError as e:
         raise InternalServerError(recommended_data={"details": str(e)})
+    item = response.get("Item")
+    if not item:
+        return StatusUpdateResult(updated=False, status=None, version=None)
+    stored = ORDERS.decode(item)
+    return StatusUpdateResult(updated=False, status=stored.get("status"), version=stored.get("version", 1))
@@ -1,15 +1,18 @@
 # Data access for payment records
 import os
-import boto3
 import json
 from datetime import datetime
 from botocore.exceptions import ClientError
 from common.exceptions import InternalServerError
+from common.aws_clients import get_client, get_resource
+from common.metrics import metrics
+from dao.records import PaymentRecord
 
 PAYMENTS_TABLE = os.getenv("PAYMENTS_TABLE", "Payments")
 IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE", "IdempotencyKeys")
 
-# Lazy initialization to ensure X-Ray patching happens first
+# Lazy initialization to ensure X-Ray patching happens first;
+# clients come from the shared, tuned registry in common.aws_clients
 _dynamodb = None
 _client = None
 _table = None
@@ -18,25 +21,23 @@ def get_dynamodb_resources():
     """Get DynamoDB resources with lazy initialization to ensure X-Ray patching"""
     global _dynamodb, _client, _table
     if _dynamodb is None:
-        _dynamodb = boto3.resource("dynamodb")
-        _client = boto3.client("dynamodb")
+        _dynamodb = get_resource("dynamodb")
+        _client = get_client("dynamodb")
         _table = _dynamodb.Table(PAYMENTS_TABLE)
     return _dynamodb, _client, _table
 
 
-def save_payment(payment_record):
+@metrics.timed("save_payment")
+def save_payment(payment_record: PaymentRecord):
     # Get DynamoDB resources with lazy initialization
     dynamodb, client, table = get_dynamodb_resources()
     
-    order_id = payment_record.get("orderId")
+    order_id = payment_record.order_id
     transact_items = [
         {
             "Put": {
                 "TableName": PAYMENTS_TABLE,
-                "Item": {
-                    k: {"S": str(v)} if isinstance(v, str) else {"N": str(v)}
-                    for k, v in payment_record.items()
-                },
+                "Item": payment_record.to_item(),
             }
         }
     ]
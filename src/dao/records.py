@@ -0,0 +1,306 @@
+# Slotted record types passed between the services, DAOs and producer
+#
+# A record is parsed once from a request body or event detail and then
+# converts straight to what each layer needs: a low-level DynamoDB item
+# (to_item, encoded by the table's schema in dao.codecs), an event detail
+# (to_event_detail) or a JSON-safe dict for API responses (to_dict).
+# Amounts are integer minor units (common.money), so every output carries
+# the same exact value.
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from common.money import (
+    CURRENCY_EXPONENTS, Money, format_minor_units, from_minor_units, price_lines,
+)
+from dao.codecs import ORDERS, PAYMENTS
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _stored_minor_units(amount, currency):
+    """Minor units of a stored (already validated) Decimal amount"""
+    return int(amount.scaleb(CURRENCY_EXPONENTS[currency]))
+
+
+class OrderLine:
+    """One priced order line; amounts are minor units of the order currency"""
+
+    __slots__ = ("vendor_id", "product_id", "quantity", "price", "discount", "tax")
+
+    def __init__(self, vendor_id, product_id, quantity, price, discount=0, tax=0):
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.quantity = quantity
+        self.price = price
+        self.discount = discount
+        self.tax = tax
+
+    def to_record(self, currency):
+        """Stored line as Python values (Decimal amounts), see dao.codecs.ORDER_LINE_SCHEMA"""
+        # Only lines that a pricing rule applied to carry the adjustments
+        line = {
+            "vendorId": self.vendor_id,
+            "productId": self.product_id,
+            "quantity": self.quantity,
+            "price": from_minor_units(self.price, currency),
+        }
+        if self.discount:
+            line["discount"] = from_minor_units(self.discount, currency)
+        if self.tax:
+            line["tax"] = from_minor_units(self.tax, currency)
+        return line
+
+    def to_dict(self, currency):
+        line = {
+            "vendorId": self.vendor_id,
+            "productId": self.product_id,
+            "quantity": self.quantity,
+            "price": format_minor_units(self.price, currency),
+        }
+        if self.discount:
+            line["discount"] = format_minor_units(self.discount, currency)
+        if self.tax:
+            line["tax"] = format_minor_units(self.tax, currency)
+        return line
+
+
+class OrderRecord:
+    """
+    A priced order as stored in the Orders table. version starts at 1 and
+    is incremented by every status change (services.order_status).
+    """
+
+    __slots__ = (
+        "order_id", "customer_id", "currency", "lines",
+        "subtotal", "discount", "tax", "total", "status", "created_at", "version",
+    )
+
+    def __init__(self, order_id, customer_id, currency, lines, subtotal, discount, tax,
+                 total, status="PLACED", created_at=None, version=1):
+        self.order_id = order_id
+        self.customer_id = customer_id
+        self.currency = currency
+        self.lines = lines
+        self.subtotal = subtotal
+        self.discount = discount
+        self.tax = tax
+        self.total = total
+        self.status = status
+        self.created_at = created_at or _utc_now()
+        self.version = version
+
+    @classmethod
+    def from_request(cls, body, catalog, rules=None):
+        """
+        Price a POST /orders body at catalog prices ((vendorId, productId) ->
+        Money); raises BadRequestException for unknown products or bad quantities.
+        """
+        items = body.get("items", [])
+        priced = price_lines(items, catalog, currency=body.get("currency"), rules=rules)
+        lines = [
+            OrderLine(item.get("vendorId"), item.get("productId"), quantity, price, discount, tax)
+            for item, price, quantity, discount, tax in zip(
+                items, priced.unit_prices, priced.quantities, priced.discounts, priced.taxes
+            )
+        ]
+        return cls(
+            order_id=str(uuid.uuid4()),
+            customer_id=body["customerId"],
+            currency=priced.currency,
+            lines=lines,
+            subtotal=priced.subtotal,
+            discount=priced.discount,
+            tax=priced.tax,
+            total=priced.total,
+        )
+
+    @classmethod
+    def from_item(cls, item):
+        """OrderRecord of a low-level Orders item (the inverse of to_item)"""
+        data = ORDERS.decode(item)
+        currency = data["currency"]
+        lines = [
+            OrderLine(
+                line["vendorId"],
+                line["productId"],
+                line["quantity"],
+                _stored_minor_units(line["price"], currency),
+                _stored_minor_units(line.get("discount", Decimal(0)), currency),
+                _stored_minor_units(line.get("tax", Decimal(0)), currency),
+            )
+            for line in data.get("items", [])
+        ]
+        return cls(
+            order_id=data["orderId"],
+            customer_id=data["customerId"],
+            currency=currency,
+            lines=lines,
+            subtotal=_stored_minor_units(data["subtotalAmount"], currency),
+            discount=_stored_minor_units(data["discountAmount"], currency),
+            tax=_stored_minor_units(data["taxAmount"], currency),
+            total=_stored_minor_units(data["totalAmount"], currency),
+            status=data.get("status", "PLACED"),
+            created_at=data.get("createdAt"),
+            version=data.get("version", 1),
+        )
+
+    @property
+    def total_amount(self):
+        return format_minor_units(self.total, self.currency)
+
+    def to_item(self):
+        """Low-level Orders item, encoded by the ORDERS codec"""
+        currency = self.currency
+        return ORDERS.encode({
+            "orderId": self.order_id,
+            "customerId": self.customer_id,
+            "items": [line.to_record(currency) for line in self.lines],
+            "currency": currency,
+            "subtotalAmount": from_minor_units(self.subtotal, currency),
+            "discountAmount": from_minor_units(self.discount, currency),
+            "taxAmount": from_minor_units(self.tax, currency),
+            "totalAmount": from_minor_units(self.total, currency),
+            "status": self.status,
+            "createdAt": self.created_at,
+            "version": self.version,
+        })
+
+    def to_event_detail(self):
+        """OrderPlaced payload"""
+        currency = self.currency
+        return {
+            "orderId": self.order_id,
+            "customerId": self.customer_id,
+            "items": [line.to_dict(currency) for line in self.lines],
+            "currency": currency,
+            "totalAmount": self.total_amount,
+        }
+
+    def to_dict(self):
+        currency = self.currency
+        return {
+            "orderId": self.order_id,
+            "customerId": self.customer_id,
+            "items": [line.to_dict(currency) for line in self.lines],
+            "currency": currency,
+            "subtotalAmount": format_minor_units(self.subtotal, currency),
+            "discountAmount": format_minor_units(self.discount, currency),
+            "taxAmount": format_minor_units(self.tax, currency),
+            "totalAmount": self.total_amount,
+            "status": self.status,
+            "createdAt": self.created_at,
+            "version": self.version,
+        }
+
+
+class PaymentRecord:
+    """A payment as stored in the Payments table"""
+
+    __slots__ = ("payment_id", "order_id", "amount", "payment_method", "status", "processed_at")
+
+    def __init__(self, payment_id, order_id, amount, payment_method="card",
+                 status="PROCESSED", processed_at=None):
+        self.payment_id = payment_id
+        self.order_id = order_id
+        self.amount = amount
+        self.payment_method = payment_method
+        self.status = status
+        self.processed_at = processed_at or _utc_now()
+
+    @classmethod
+    def from_request(cls, data):
+        """New payment from a request body or OrderPlaced-derived dict"""
+        return cls(
+            payment_id=str(uuid.uuid4()),
+            order_id=data["orderId"],
+            amount=Money.parse(data["amount"], data.get("currency")),
+            payment_method=data.get("paymentMethod", "card"),
+        )
+
+    def to_item(self):
+        """Low-level Payments item, encoded by the PAYMENTS codec"""
+        return PAYMENTS.encode({
+            "paymentId": self.payment_id,
+            "orderId": self.order_id,
+            "amount": self.amount.to_decimal(),
+            "currency": self.amount.currency,
+            "paymentMethod": self.payment_method,
+            "status": self.status,
+            "processedAt": self.processed_at,
+        })
+
+    def to_event_detail(self, status="completed"):
+        """PaymentProcessed payload"""
+        return {
+            "paymentId": self.payment_id,
+            "orderId": self.order_id,
+            "amount": self.amount.to_json(),
+            "currency": self.amount.currency,
+            "status": status,
+        }
+
+    def to_dict(self):
+        return {
+            "paymentId": self.payment_id,
+            "orderId": self.order_id,
+            "amount": self.amount.to_json(),
+            "currency": self.amount.currency,
+            "paymentMethod": self.payment_method,
+            "status": self.status,
+            "processedAt": self.processed_at,
+        }
+
+
+class InventoryChange:
+    """
+    A stock delta for one product (negative reserves stock), with the order
+    it came from and the resulting level once applied
+    """
+
+    __slots__ = ("vendor_id", "product_id", "quantity", "updated_at", "order_id", "new_quantity")
+
+    def __init__(self, vendor_id, product_id, quantity, updated_at=None, order_id=None,
+                 new_quantity=None):
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.quantity = quantity
+        self.updated_at = updated_at
+        self.order_id = order_id
+        self.new_quantity = new_quantity
+
+    @classmethod
+    def from_request(cls, data):
+        """Change from a PUT /inventory body"""
+        return cls(
+            vendor_id=data["vendorId"],
+            product_id=data["productId"],
+            quantity=int(data["quantity"]),
+            updated_at=_utc_now(),
+        )
+
+    def to_event_detail(self):
+        """InventoryUpdated payload; newQuantity is only known for single updates"""
+        detail = {
+            "orderId": self.order_id,
+            "vendorId": self.vendor_id,
+            "productId": self.product_id,
+            "quantityChange": self.quantity,
+        }
+        if self.new_quantity is not None:
+            detail["newQuantity"] = self.new_quantity
+        return detail
+
+    def to_dict(self):
+        change = {
+            "vendorId": self.vendor_id,
+            "productId": self.product_id,
+            "quantityChange": self.quantity,
+        }
+        if self.order_id is not None:
+            change["orderId"] = self.order_id
+        if self.new_quantity is not None:
+            change["newQuantity"] = self.new_quantity
+        return change
@@ -1,61 +1,45 @@
-from common.idempotency import is_idempotent, mark_idempotent
+from common.logger import get_logger, buffered_logs
+from common.metrics import emits_metrics
+from common.tracing import traced_handler
+from common.idempotency import idempotent
 from common.dlq_replay import replay_dlq_events
+from common.batch_processor import process_batch
+from services.inventory_service import apply_order_inventory
+from events.producer.producer import buffered_events
+
+IDEMPOTENCY_SCOPE = "inventory-consumer"
 
 
 # DLQ replay Lambda entrypoint
+@buffered_logs
+@emits_metrics("inventory-consumer-replay")
+@traced_handler("inventory-consumer-replay")
+@buffered_events
 def replay_handler(event, context):
     return replay_dlq_events(event, context, process_func=_process_inventory_event)
 
 
 # Internal processing function for both normal and replay
+@idempotent(IDEMPOTENCY_SCOPE, key_func=lambda detail: detail.get("orderId"))
 def _process_inventory_event(detail):
     logger = get_logger("inventory-consumer")
     order_id = detail.get("orderId")
     if not order_id:
         logger.error("Missing orderId in event detail", extra={"event": detail})
         return
-    if is_idempotent(order_id):
-        logger.info("Duplicate event ignored (idempotent)", extra={"orderId": order_id})
-        return
     logger.info(
         "Processing OrderPlaced event for inventory",
         extra={"orderId": order_id},
     )
-    for item in detail.get("items", []):
-        update_inventory(
-            {
-                "vendorId": item.get("vendorId"),
-                "productId": item.get("productId"),
-                "quantity": -item.get("quantity", 1),
-            }
-        )
-    mark_idempotent(order_id)
-
+    # All lines are decremented in one transaction; once it has committed, a
+    # retry only republishes the events that did not go out (see idempotent)
+    apply_order_inventory(order_id, detail.get("items", []))
 
-import json
-from common.logger import get_logger
-from common.exception_handler import exception_handler
-from services.inventory_service import update_inventory
 
-
-@exception_handler
+# SQS batch entrypoint: only failed records are redelivered
+@buffered_logs
+@emits_metrics("inventory-consumer")
+@traced_handler("inventory-consumer")
+@buffered_events
 def lambda_handler(event, context):
-    logger = get_logger("inventory-consumer")
-    for record in event.get("Records", []):
-        detail = (
-            json.loads(record["body"]) if "body" in record else record.get("detail", {})
-        )
-        logger.info(
-            "Processing OrderPlaced event for inventory",
-            extra={"orderId": detail.get("orderId")},
-        )
-        # Example: update inventory for each item
-        for item in detail.get("items", []):
-            update_inventory(
-                {
-                    "vendorId": item.get("vendorId"),
-                    "productId": item.get("productId"),
-                    "quantity": -item.get("quantity", 1),  # Decrement inventory
-                }
-            )
-    return {"statusCode": 200}
+    return process_batch(event, _process_inventory_event, logger_name="inventory-consumer")
@@ -1,22 +1,36 @@
-from common.idempotency import is_idempotent, mark_idempotent
+from common.logger import get_logger, buffered_logs
+from common.metrics import emits_metrics
+from common.tracing import traced_handler
+from common.idempotency import idempotent
 from common.dlq_replay import replay_dlq_events
-im
+from common.batch_processor import process_batch
+
+IDEMPOTENCY_SCOPE = "notification-consumer"
+
 
 # DLQ replay Lambda entrypoint
+@buffered_logs
+@emits_metrics("notification-consumer-replay")
+@traced_handler("notification-consumer-replay")
 def replay_handler(event, context):
     return replay_dlq_events(event, context, process_func=_process_notification_event)
 
 
+def _notification_key(detail):
+    # OrderPlaced and PaymentProcessed share an orderId, so notifications are
+    # deduplicated per order and per event status
+    order_id = detail.get("orderId")
+    return f"{order_id}#{detail.get('status', '')}" if order_id else None
+
+
 # Internal processing function for both normal and replay
+@idempotent(IDEMPOTENCY_SCOPE, key_func=_notification_key)
 def _process_notification_event(detail):
     logger = get_logger("notification-consumer")
     order_id = detail.get("orderId")
     if not order_id:
         logger.error("Missing orderId in event detail", extra={"event": detail})
         return
-    if is_idempotent(order_id):
-        logger.info("Duplicate event ignored (idempotent)", extra={"orderId": order_id})
-        return
     logger.info(
         "Sending notification for order",
         extra={
@@ -25,24 +39,13 @@ def _process_notification_event(detail):
         },
     )
     # Integrate with notification service here
-    mark_idempotent(order_id)
 
 
-import json
-from common.logger import get_logger
-from common.exception_handler import exception_handler
-andler(event, context):
-    logger = get_logger("notification-consumer")
-    for record in event.get("Records", []):
-        detail = (
-            json.loads(record["body"]) if "body" in record else record.get("detail", {})
-        )
-        logger.info(
-            "Sending notification for order",
-            extra={
-                "orderId": detail.get("orderId"),
-                "customerId": detail.get("customerId"),
-            },
-        )
-        # Here you would integrate with email/SMS/notification service
-    return {"statusCode": 200}
+# SQS batch entrypoint: only failed records are redelivered
+@buffered_logs
+@emits_metrics("notification-consumer")
+@traced_handler("notification-consumer")
+def lambda_handler(event, context):
+    return process_batch(
+        event, _process_notification_event, logger_name="notification-consumer"
+    )
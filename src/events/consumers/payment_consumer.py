@@ -1,22 +1,32 @@
-from common.idempotency import is_idempotent, mark_idempotent
+from common.logger import get_logger, buffered_logs
+from common.metrics import emits_metrics
+from common.tracing import traced_handler
+from common.idempotency import idempotent
 from common.dlq_replay import replay_dlq_events
+from common.batch_processor import process_batch
+from services.payment_service import process_payment
+from events.producer.producer import buffered_events
+
+IDEMPOTENCY_SCOPE = "payment-consumer"
 
 
 # DLQ replay Lambda entrypoint
+@buffered_logs
+@emits_metrics("payment-consumer-replay")
+@traced_handler("payment-consumer-replay")
+@buffered_events
 def replay_handler(event, context):
     return replay_dlq_events(event, context, process_func=_process_payment_event)
 
 
 # Internal processing function for both normal and replay
+@idempotent(IDEMPOTENCY_SCOPE, key_func=lambda detail: detail.get("orderId"))
 def _process_payment_event(detail):
     logger = get_logger("payment-consumer")
     order_id = detail.get("orderId")
     if not order_id:
         logger.error("Missing orderId in event detail", extra={"event": detail})
         return
-    if is_idempotent(order_id):
-        logger.info("Duplicate event ignored (idempotent)", extra={"orderId": order_id})
-        return
     logger.info(
         "Processing OrderPlaced event for payment",
         extra={"orderId": order_id},
@@ -24,36 +34,17 @@ def _process_payment_event(detail):
     process_payment(
         {
             "orderId": order_id,
-            "amount": detail.get("amount", 0),
+            "amount": detail.get("totalAmount", detail.get("amount", 0)),
+            "currency": detail.get("currency"),
             "paymentMethod": detail.get("paymentMethod", "default"),
         }
     )
-    mark_idempotent(order_id)
 
 
-import json
-from common.logger import get_logger
-from common.exception_handler import exception_handler
-from services.payment_service import process_payment
-
-
-@exception_handler
+# SQS batch entrypoint: only failed records are redelivered
+@buffered_logs
+@emits_metrics("payment-consumer")
+@traced_handler("payment-consumer")
+@buffered_events
 def lambda_handler(event, context):
-    logger = get_logger("payment-consumer")
-    for record in event.get("Records", []):
-        detail = (
-            json.loads(record["body"]) if "body" in record else record.get("detail", {})
-        )
-        logger.info(
-            "Processing OrderPlaced event for payment",
-            extra={"orderId": detail.get("orderId")},
-        )
-        # Example: process payment for the order
-        process_payment(
-            {
-                "orderId": detail.get("orderId"),
-                "amount": detail.get("amount", 0),
-                "paymentMethod": detail.get("paymentMethod", "default"),
-            }
-        )
-    return {"statusCode": 200}
+    return process_batch(event, _process_payment_event, logger_name="payment-consumer")
@@ -0,0 +1,52 @@
+from common.logger import get_logger, buffered_logs
+from common.metrics import emits_metrics, metrics
+from common.tracing import traced_handler
+from common.dlq_replay import replay_dlq_events
+from common.batch_processor import process_batch_by_key
+from services.order_status import EVENT_MILESTONES, advance_order
+from events.producer.producer import buffered_events, publish_order_updated
+
+
+def _order_key(detail_type, detail):
+    # Stock changes from PUT /inventory carry no orderId and are ignored
+    if detail_type not in EVENT_MILESTONES:
+        return None
+    # Failed payments and stock reservations reach no milestone
+    if detail.get("status", "completed") != "completed":
+        return None
+    return detail.get("orderId")
+
+
+# Applies every event of one order in the batch with a single status change,
+# so an order's PaymentProcessed and InventoryUpdated events arriving together
+# take it straight to FULFILLED
+def _apply_order_events(order_id, events):
+    logger = get_logger("status-consumer")
+    milestones = {EVENT_MILESTONES[detail_type] for detail_type, _ in events}
+    result = advance_order(order_id, milestones)
+    if not result["changed"]:
+        metrics.increment("SkippedStatusChanges")
+        return
+    metrics.increment("StatusChanges", Status=result["status"])
+    if not publish_order_updated(order_id, result["status"], {"events": sorted({t for t, _ in events})}):
+        logger.error("Failed to publish OrderUpdated event", extra={"orderId": order_id})
+
+
+# DLQ replay Lambda entrypoint
+@buffered_logs
+@emits_metrics("status-consumer-replay")
+@traced_handler("status-consumer-replay")
+@buffered_events
+def replay_handler(event, context):
+    return replay_dlq_events(event, context, process_func=_apply_order_events, key_func=_order_key)
+
+
+# SQS batch entrypoint: only the records of failed orders are redelivered
+@buffered_logs
+@emits_metrics("status-consumer")
+@traced_handler("status-consumer")
+@buffered_events
+def lambda_handler(event, context):
+    return process_batch_by_key(
+        event, _order_key, _apply_order_events, logger_name="status-consumer"
+    )
@@ -1,43 +1,227 @@
 # Event producer for order events
 import json
-import boto3
+import logging
 import os
+import random
+import time
+import functools
 from datetime import datetime
-from typing import Dict, Any, Optional
-from common.logger import get_logger
+from typing import Dict, Any, List, Optional, Set, Tuple
+from common.logger import get_logger, buffered_logs
 from common.exception_handler import exception_handler
+from common.exceptions import InternalServerError
+from common.batch_processor import current_records
+from common.idempotency import current_key, defer_completions, finish_deferred_completions
+from common.aws_clients import get_client
+from common.metrics import metrics, emits_metrics, OUTCOME_ERROR
+from common.tracing import inject_trace, span, traced_handler
 
 logger = get_logger("event-producer")
 
+# EventBridge PutEvents limits
+MAX_ENTRIES_PER_REQUEST = 10
+MAX_REQUEST_SIZE_BYTES = 256 * 1024
+# Room kept in an entry for the fields added when it is published
+# (timestamp, status, trace context)
+PUBLISH_OVERHEAD_BYTES = 1024
+
+# Retry settings for entries reported as failed by PutEvents
+MAX_PUBLISH_ATTEMPTS = int(os.environ.get("EVENT_PUBLISH_MAX_ATTEMPTS", "3"))
+PUBLISH_BACKOFF_SECONDS = float(os.environ.get("EVENT_PUBLISH_BACKOFF_SECONDS", "0.05"))
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    """Size of a PutEvents entry as calculated by EventBridge"""
+    size = 0
+    for key in ("Source", "DetailType", "Detail"):
+        if entry.get(key):
+            size += len(entry[key].encode("utf-8"))
+    for resource in entry.get("Resources", []):
+        size += len(resource.encode("utf-8"))
+    if entry.get("Time"):
+        size += 14
+    return size
+
+
+def _chunk_entries(entries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Split entries into PutEvents requests of at most 10 entries / 256 KB"""
+    chunks = []
+    current = []
+    current_size = 0
+    for entry in entries:
+        size = _entry_size(entry)
+        if current and (
+            len(current) >= MAX_ENTRIES_PER_REQUEST
+            or current_size + size > MAX_REQUEST_SIZE_BYTES
+        ):
+            chunks.append(current)
+            current = []
+            current_size = 0
+        current.append(entry)
+        current_size += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _field(data, attribute: str, key: str):
+    """A field of a record (by attribute) or of a plain dict (by key)"""
+    if isinstance(data, dict):
+        return data.get(key)
+    return getattr(data, attribute, None)
+
+
 class OrderEventProducer:
     """
     Event producer for publishing order-related events to EventBridge
+
+    By default every event is sent immediately. While buffering is active
+    (see ``buffered_events``) events are collected in memory and sent in
+    batched PutEvents calls when ``flush`` is called. Each buffered event
+    remembers the batch records and the idempotency key it was published
+    for, so a failed flush can be traced back to them
+    (``unpublished_records``, ``unpublished_by_key``).
     """
     
     def __init__(self):
-        self.eventbridge_client = boto3.client('events')
+        self._eventbridge_client = None
         self.event_bus_name = os.environ.get('EVENT_BUS_NAME')
         self.source = "order.service"
+        # (messageIds of the publishing records, idempotency key, PutEvents entry)
+        self._buffer: List[Tuple[Tuple[str, ...], Optional[str], Dict[str, Any]]] = []
+        self._buffer_depth = 0
+        # Buffered events that failed to publish in the current buffering scope
+        self._unpublished: List[Tuple[Tuple[str, ...], Optional[str], Dict[str, Any]]] = []
+
+    @property
+    def eventbridge_client(self):
+        """EventBridge client, created on first use to keep cold starts short"""
+        if self._eventbridge_client is None:
+            self._eventbridge_client = get_client('events')
+        return self._eventbridge_client
+
+    def start_buffering(self) -> None:
+        """Collect events in memory until the matching ``stop_buffering``"""
+        if self._buffer_depth == 0:
+            self._unpublished = []
+        self._buffer_depth += 1
+
+    def stop_buffering(self) -> bool:
+        """
+        Leave buffered mode, flushing pending events when the outermost
+        buffering scope ends
+
+        Returns:
+            bool: True if all pending events were published, False otherwise
+        """
+        self._buffer_depth = max(self._buffer_depth - 1, 0)
+        if self._buffer_depth == 0:
+            return self.flush()
+        return True
+
+    @property
+    def is_buffering(self) -> bool:
+        return self._buffer_depth > 0
+
+    def unpublished_records(self) -> Optional[Set[str]]:
+        """
+        messageIds of the records whose events failed to publish since the
+        outermost buffering scope started
+
+        Returns:
+            set: The records to retry, or None if a failed event was not
+            published on behalf of a record (so no record can be ruled out)
+        """
+        records = set()
+        for message_ids, _, _ in self._unpublished:
+            if not message_ids:
+                return None
+            records.update(message_ids)
+        return records
+
+    def unpublished_by_key(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        PutEvents entries that failed to publish since the outermost
+        buffering scope started, by the idempotency key they were published for
+        """
+        by_key = {}
+        for _, key, entry in self._unpublished:
+            if key is not None:
+                by_key.setdefault(key, []).append(entry)
+        return by_key
+
+    def republish(self, entries: List[Dict[str, Any]]) -> bool:
+        """
+        Publish PutEvents entries built earlier (e.g. kept after a failed
+        flush); they are buffered like new events while buffering is active
+
+        Returns:
+            bool: True if the entries were published (or buffered), False otherwise
+        """
+        if self.is_buffering:
+            records, key = current_records(), current_key()
+            self._buffer.extend((records, key, entry) for entry in entries)
+            return True
+        return not self._send_entries(entries)
+
+    def flush(self) -> bool:
+        """
+        Publish all buffered events
+
+        Returns:
+            bool: True if every buffered event was published, False otherwise
+        """
+        if not self._buffer:
+            return True
+        buffered, self._buffer = self._buffer, []
+        with span("flush_events"):
+            failed = self._send_entries([entry for _, _, entry in buffered])
+        if failed:
+            # _send_entries hands back the failed entry objects themselves
+            failed_ids = {id(entry) for entry in failed}
+            self._unpublished.extend(item for item in buffered if id(item[2]) in failed_ids)
+            logger.error("Failed to publish buffered events",
+                         extra={"failedCount": len(failed), "total": len(buffered)})
+            return False
+        logger.info("Published buffered events", extra={"count": len(buffered)})
+        return True
         
+    def fits_in_entry(self, detail_type: str, detail: Dict[str, Any]) -> bool:
+        """
+        Whether an event with this payload stays within the PutEvents size
+        limit once published; checked before saving data whose event could
+        otherwise never be sent
+        """
+        size = _entry_size({
+            'Source': self.source,
+            'DetailType': detail_type,
+            'Detail': json.dumps(detail),
+        })
+        return size + PUBLISH_OVERHEAD_BYTES <= MAX_REQUEST_SIZE_BYTES
+
     def publish_order_placed_event(self, order_data: Dict[str, Any]) -> bool:
         """
         Publish OrderPlaced event when a new order is created
         
         Args:
-            order_data: Dictionary containing order information
+            order_data: OrderRecord, or a dictionary containing order information
             
         Returns:
             bool: True if event published successfully, False otherwise
         """
         try:
-            event_detail = {
-                "orderId": order_data.get("orderId"),
-                "customerId": order_data.get("customerId"),
-                "items": order_data.get("items", []),
-                "totalAmount": order_data.get("totalAmount"),
-                "timestamp": datetime.utcnow().isoformat(),
-                "status": "placed"
-            }
+            if hasattr(order_data, "to_event_detail"):
+                event_detail = order_data.to_event_detail()
+            else:
+                event_detail = {
+                    "orderId": order_data.get("orderId"),
+                    "customerId": order_data.get("customerId"),
+                    "items": order_data.get("items", []),
+                    "currency": order_data.get("currency"),
+                    "totalAmount": order_data.get("totalAmount"),
+                }
+            event_detail["timestamp"] = datetime.utcnow().isoformat()
+            event_detail["status"] = "placed"
             
             return self._publish_event(
                 detail_type="OrderPlaced",
@@ -46,7 +230,7 @@ class OrderEventProducer:
             
         except Exception as e:
             logger.error(f"Failed to publish OrderPlaced event: {str(e)}", 
-                        extra={"orderId": order_data.get("orderId")})
+                        extra={"orderId": _field(order_data, "order_id", "orderId")})
             return False
     
     def publish_order_updated_event(self, order_id: str, status: str, details: Optional[Dict] = None) -> bool:
@@ -84,19 +268,23 @@ class OrderEventProducer:
         Publish PaymentProcessed event when payment is completed
         
         Args:
-            payment_data: Dictionary containing payment information
+            payment_data: PaymentRecord, or a dictionary containing payment information
             
         Returns:
             bool: True if event published successfully, False otherwise
         """
         try:
-            event_detail = {
-                "paymentId": payment_data.get("paymentId"),
-                "orderId": payment_data.get("orderId"),
-                "amount": payment_data.get("amount"),
-                "status": payment_data.get("status"),
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            if hasattr(payment_data, "to_event_detail"):
+                event_detail = payment_data.to_event_detail()
+            else:
+                event_detail = {
+                    "paymentId": payment_data.get("paymentId"),
+                    "orderId": payment_data.get("orderId"),
+                    "amount": payment_data.get("amount"),
+                    "currency": payment_data.get("currency"),
+                    "status": payment_data.get("status"),
+                }
+            event_detail["timestamp"] = datetime.utcnow().isoformat()
             
             return self._publish_event(
                 detail_type="PaymentProcessed",
@@ -105,7 +293,7 @@ class OrderEventProducer:
             
         except Exception as e:
             logger.error(f"Failed to publish PaymentProcessed event: {str(e)}", 
-                        extra={"paymentId": payment_data.get("paymentId")})
+                        extra={"paymentId": _field(payment_data, "payment_id", "paymentId")})
             return False
     
     def publish_inventory_updated_event(self, inventory_data: Dict[str, Any]) -> bool:
@@ -113,19 +301,23 @@ class OrderEventProducer:
         Publish InventoryUpdated event when inventory is modified
         
         Args:
-            inventory_data: Dictionary containing inventory information
+            inventory_data: InventoryChange, or a dictionary containing inventory information
             
         Returns:
             bool: True if event published successfully, False otherwise
         """
         try:
-            event_detail = {
-                "vendorId": inventory_data.get("vendorId"),
-                "productId": inventory_data.get("productId"),
-                "quantityChange": inventory_data.get("quantityChange"),
-                "newQuantity": inventory_data.get("newQuantity"),
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            if hasattr(inventory_data, "to_event_detail"):
+                event_detail = inventory_data.to_event_detail()
+            else:
+                event_detail = {
+                    "orderId": inventory_data.get("orderId"),
+                    "vendorId": inventory_data.get("vendorId"),
+                    "productId": inventory_data.get("productId"),
+                    "quantityChange": inventory_data.get("quantityChange"),
+                    "newQuantity": inventory_data.get("newQuantity"),
+                }
+            event_detail["timestamp"] = datetime.utcnow().isoformat()
             
             return self._publish_event(
                 detail_type="InventoryUpdated",
@@ -134,44 +326,96 @@ class OrderEventProducer:
             
         except Exception as e:
             logger.error(f"Failed to publish InventoryUpdated event: {str(e)}", 
-                        extra={"productId": inventory_data.get("productId")})
+                        extra={"productId": _field(inventory_data, "product_id", "productId")})
+            return False
+
+    def publish_inventory_reservation_failed_event(self, order_id: str, error: Dict[str, Any]) -> bool:
+        """
+        Publish an InventoryUpdated event with status "failed" when an
+        order's stock could not be reserved
+
+        Args:
+            order_id: The order identifier
+            error: ErrorDetail.to_dict() of the failure (e.g. OUT_OF_STOCK with the short items)
+
+        Returns:
+            bool: True if event published successfully, False otherwise
+        """
+        try:
+            event_detail = {
+                "orderId": order_id,
+                "status": "failed",
+                "errorCode": error.get("errorCode"),
+                "items": error.get("recommendedData", {}).get("items", []),
+                "timestamp": datetime.utcnow().isoformat(),
+            }
+            return self._publish_event(
+                detail_type="InventoryUpdated",
+                detail=event_detail
+            )
+
+        except Exception as e:
+            logger.error(f"Failed to publish InventoryUpdated event: {str(e)}",
+                        extra={"orderId": order_id})
             return False
     
     def _publish_event(self, detail_type: str, detail: Dict[str, Any]) -> bool:
         """
-        Internal method to publish events to EventBridge
+        Internal method to publish events to EventBridge, timed per detail-type
         
         Args:
             detail_type: The type of event being published
             detail: The event payload
             
         Returns:
-            bool: True if event published successfully, False otherwise
+            bool: True if event published (or buffered) successfully, False otherwise
+        """
+        with metrics.timer("publish_event", DetailType=detail_type) as timing:
+            # Carry the trace id across the EventBridge hop
+            published = self._send_event(detail_type, inject_trace(detail))
+            if not published:
+                timing.outcome = OUTCOME_ERROR
+        return published
+
+    def _send_event(self, detail_type: str, detail: Dict[str, Any]) -> bool:
+        """
+        Send (or buffer) a single event
+        
+        Args:
+            detail_type: The type of event being published
+            detail: The event payload
+            
+        Returns:
+            bool: True if event published (or buffered) successfully, False otherwise
         """
         try:
             if not self.event_bus_name:
                 logger.error("EVENT_BUS_NAME environment variable not set")
                 return False
-                
-            response = self.eventbridge_client.put_events(
-                Entries=[
-                    {
-                        'Source': self.source,
-                        'DetailType': detail_type,
-                        'Detail': json.dumps(detail),
-                        'EventBusName': self.event_bus_name
-                    }
-                ]
-            )
-            
+
+            entry = {
+                'Source': self.source,
+                'DetailType': detail_type,
+                'Detail': json.dumps(detail),
+                'EventBusName': self.event_bus_name
+            }
+
+            if self.is_buffering:
+                self._buffer.append((current_records(), current_key(), entry))
+                return True
+
             # Check if the event was published successfully
-            if response['FailedEntryCount'] == 0:
-                logger.info(f"Successfully published {detail_type} event", 
-                           extra={"detail": detail})
+            if not self._send_entries([entry]):
+                # The full payload is only logged at DEBUG level
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Published %s event", detail_type, extra={"detail": detail})
+                else:
+                    logger.info("Published %s event", detail_type,
+                                extra={"orderId": detail.get("orderId")})
                 return True
             else:
                 logger.error(f"Failed to publish {detail_type} event", 
-                           extra={"response": response})
+                           extra={"detail_type": detail_type})
                 return False
                 
         except Exception as e:
@@ -179,6 +423,60 @@ class OrderEventProducer:
                         extra={"detail_type": detail_type, "detail": detail})
             return False
 
+    def _send_entries(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Send entries in as few PutEvents calls as the service limits allow
+
+        Returns:
+            list: Entries that could not be published after all retries
+        """
+        failed = []
+        for chunk in _chunk_entries(entries):
+            failed.extend(self._put_with_retry(chunk))
+        return failed
+
+    def _put_with_retry(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Call PutEvents, retrying only the entries reported as failed
+
+        Returns:
+            list: Entries still failing after MAX_PUBLISH_ATTEMPTS
+        """
+        pending = entries
+        for attempt in range(MAX_PUBLISH_ATTEMPTS):
+            if attempt:
+                # Exponential backoff with full jitter
+                time.sleep(random.uniform(0, PUBLISH_BACKOFF_SECONDS * (2 ** attempt)))
+            try:
+                with metrics.timer("put_events"):
+                    response = self.eventbridge_client.put_events(Entries=pending)
+            except Exception as e:
+                logger.warning(f"PutEvents call failed: {str(e)}",
+                               extra={"attempt": attempt + 1, "count": len(pending)})
+                continue
+
+            if response.get('FailedEntryCount', 0) == 0:
+                return []
+
+            # Result entries are returned in the same order as the request
+            results = response.get('Entries', [])
+            retry = [
+                entry for entry, result in zip(pending, results)
+                if result.get('ErrorCode')
+            ]
+            logger.warning("PutEvents reported failed entries",
+                           extra={
+                               "attempt": attempt + 1,
+                               "failedCount": len(retry),
+                               "errorCodes": sorted({r.get('ErrorCode') for r in results if r.get('ErrorCode')}),
+                           })
+            pending = retry
+            if not pending:
+                return []
+        for entry in pending:
+            metrics.increment("FailedEvents", DetailType=entry['DetailType'])
+        return pending
+
 # Global instance for easy import and use
 event_producer = OrderEventProducer()
 
@@ -187,6 +485,10 @@ def publish_order_placed(order_data: Dict[str, Any]) -> bool:
     """Convenience function to publish OrderPlaced event"""
     return event_producer.publish_order_placed_event(order_data)
 
+def order_placed_fits(order_record) -> bool:
+    """Whether the OrderPlaced event of an OrderRecord fits in one PutEvents entry"""
+    return event_producer.fits_in_entry("OrderPlaced", order_record.to_event_detail())
+
 def publish_order_updated(order_id: str, status: str, details: Optional[Dict] = None) -> bool:
     """Convenience function to publish OrderUpdated event"""
     return event_producer.publish_order_updated_event(order_id, status, details)
@@ -199,6 +501,67 @@ def publish_inventory_updated(inventory_data: Dict[str, Any]) -> bool:
     """Convenience function to publish InventoryUpdated event"""
     return event_producer.publish_inventory_updated_event(inventory_data)
 
+def publish_inventory_reservation_failed(order_id: str, error: Dict[str, Any]) -> bool:
+    """Convenience function to publish a failed InventoryUpdated event"""
+    return event_producer.publish_inventory_reservation_failed_event(order_id, error)
+
+def flush_events() -> bool:
+    """Convenience function to publish any buffered events"""
+    return event_producer.flush()
+
+def buffered_events(func):
+    """
+    Decorator for Lambda handlers: buffer every event published during the
+    invocation and send them in batched PutEvents calls when it returns.
+    Idempotency keys claimed during the invocation are completed only once
+    their events are published; keys with unpublished events keep them for
+    the retry (see common.idempotency.finish_deferred_completions).
+    """
+    @functools.wraps(func)
+    def wrapper(event, context):
+        outermost = not event_producer.is_buffering
+        if outermost:
+            defer_completions(event_producer.republish)
+        event_producer.start_buffering()
+        try:
+            result = func(event, context)
+        finally:
+            published = event_producer.stop_buffering()
+            if outermost:
+                finish_deferred_completions(event_producer.unpublished_by_key())
+        if published:
+            return result
+        return _unpublished_result(event, result, event_producer.unpublished_records())
+
+    return wrapper
+
+
+def _unpublished_result(event, result, failed_records):
+    """
+    Handler result when some of the invocation's events could not be
+    published: SQS batches add the records that published those events to
+    their batchItemFailures (every record if the events cannot be traced to
+    records), API requests get a 500, and any other invocation raises so
+    Lambda retries it
+    """
+    if isinstance(event, dict) and "Records" in event:
+        failures = list(result.get("batchItemFailures", [])) if isinstance(result, dict) else []
+        reported = {failure["itemIdentifier"] for failure in failures}
+        for record in event["Records"]:
+            message_id = record.get("messageId")
+            if message_id not in reported and (failed_records is None or message_id in failed_records):
+                failures.append({"itemIdentifier": message_id})
+                reported.add(message_id)
+        return {"batchItemFailures": failures}
+    if isinstance(result, dict) and "statusCode" in result:
+        error = InternalServerError(recommended_data={"details": "Events could not be published"})
+        return {"statusCode": 500, "body": json.dumps(error.to_dict())}
+    raise RuntimeError("Buffered events could not be published")
+
+
+@buffered_logs
+@emits_metrics("event-producer")
+@traced_handler("event-producer")
 @exception_handler
 def lambda_handler(event, context):
     """
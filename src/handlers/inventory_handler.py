@@ -1,17 +1,22 @@
 import json
-from common.logger import get_logger
+from common.logger import get_logger, buffered_logs
+from common.metrics import emits_metrics
+from common.tracing import traced_handler
 from common.exception_handler import exception_handler
-from common.validation import validate_request
+from common.validation import INVENTORY_REQUEST, parse_json_body
 from services.inventory_service import update_inventory
+from events.producer.producer import buffered_events
 
 
+@buffered_logs
+@emits_metrics("inventory-handler")
+@traced_handler("inventory-handler")
 @exception_handler
+@buffered_events
 def lambda_handler(event, context):
     logger = get_logger("inventory-handler")
-    body = event.get("body")
-    if isinstance(body, str):
-        body = json.loads(body)
-    validate_request(body, required_fields=["vendorId", "productId", "quantity"])
+    body = parse_json_body(event)
+    INVENTORY_REQUEST.validate(body)
     update_inventory(body)
     logger.info(
         "Inventory updated",
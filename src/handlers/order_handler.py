@@ -1,37 +1,104 @@
 # Handler for order-related Lambda events
 import json
 
-from common.logger import get_logger
-from common.exceptions import BadRequestException
-from services.order_service import place_order
+from common.logger import get_logger, buffered_logs
+from common.metrics import emits_metrics
+from common.tracing import traced_handler
+from services.order_service import place_order, place_orders
 from common.exception_handler import exception_handler
-from common.validation import validate_request
-from events.producer.producer import publish_order_placed
+from common.exceptions import BadRequestException
+from common.validation import ORDER_BATCH_REQUEST, ORDER_REQUEST, parse_json_body
+from events.producer.producer import buffered_events
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+
+
+def _get_idempotency_header(event):
+    headers = event.get("headers") or {}
+    for name, value in headers.items():
+        if name.lower() == IDEMPOTENCY_HEADER:
+            return value
+    return None
 
 
+def _get_idempotency_key(event, body):
+    """Client-supplied idempotency key from the Idempotency-Key header or body"""
+    return _get_idempotency_header(event) or body.get("idempotencyKey")
+
+
+@buffered_logs
+@emits_metrics("order-handler")
+@traced_handler("order-handler")
 @exception_handler
+@buffered_events
 def lambda_handler(event, context):
     logger = get_logger("order-handler")
-    body = event.get("body")
-    if isinstance(body, str):
-        body = json.loads(body)
-    # Centralized validation for required fields
-    validate_request(body, required_fields=["customerId", "items"])
+    body = parse_json_body(event)
+    # Reject malformed orders before anything is read or written
+    ORDER_REQUEST.validate(body)
     # Place order
-    order_result = place_order(body)
+    order_result = place_order(body, idempotency_key=_get_idempotency_key(event, body))
+    if order_result.get("duplicate"):
+        # Replayed request: report the original order without placing a new one
+        return {
+            "statusCode": 200,
+            "body": json.dumps(
+                {"success": True, "orderId": order_result.get("orderId"), "duplicate": True}
+            ),
+        }
     logger.info(
         "Order placed successfully", extra={"orderId": order_result.get("orderId")}
     )
-    # After saving order to DynamoDB
-    publish_order_placed(
-        {
-            "orderId": order_result.get("orderId"),
-            "customerId": body.get("customerId"),
-            "items": body.get("items"),
-            "totalAmount": order_result.get("totalAmount"),
-        }
-    )
+    # OrderPlaced has been published (and sent) by place_order
     return {
         "statusCode": 201,
-        "body": json.dumps({"success": True, "orderId": order_result.get("orderId")}),
+        "body": json.dumps(
+            {
+                "success": True,
+                "orderId": order_result.get("orderId"),
+                "totalAmount": order_result.get("totalAmount"),
+                "currency": order_result.get("currency"),
+            }
+        ),
+    }
+
+
+@buffered_logs
+@emits_metrics("order-batch-handler")
+@traced_handler("order-batch-handler")
+@exception_handler
+@buffered_events
+def batch_lambda_handler(event, context):
+    """
+    POST /orders/batch: place many orders in one invocation
+
+    Retries are only safe for orders that carry their own idempotencyKey;
+    a batch-wide Idempotency-Key header cannot be honoured and is rejected.
+    """
+    logger = get_logger("order-handler")
+    if _get_idempotency_header(event):
+        raise BadRequestException(
+            recommended_data={
+                "details": "Idempotency-Key is not supported for batches; "
+                           "set idempotencyKey on each order instead"
+            }
+        )
+    body = parse_json_body(event)
+    ORDER_BATCH_REQUEST.validate(body)
+    results = place_orders(body["orders"])
+    succeeded = sum(1 for result in results if result["success"])
+    logger.info(
+        "Order batch placed",
+        extra={"succeeded": succeeded, "failed": len(results) - succeeded},
+    )
+    return {
+        "statusCode": 200,
+        "body": json.dumps(
+            {
+                "success": succeeded == len(results),
+                "succeeded": succeeded,
+                "failed": len(results) - succeeded,
+                "results": results,
+            }
+        ),
     }
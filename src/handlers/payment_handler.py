@@ -1,17 +1,22 @@
 import json
-from common.logger import get_logger
+from common.logger import get_logger, buffered_logs
+from common.metrics import emits_metrics
+from common.tracing import traced_handler
 from common.exception_handler import exception_handler
-from common.validation import validate_request
+from common.validation import PAYMENT_REQUEST, parse_json_body
 from services.payment_service import process_payment
+from events.producer.producer import buffered_events
 
 
+@buffered_logs
+@emits_metrics("payment-handler")
+@traced_handler("payment-handler")
 @exception_handler
+@buffered_events
 def lambda_handler(event, context):
     logger = get_logger("payment-handler")
-    body = event.get("body")
-    if isinstance(body, str):
-        body = json.loads(body)
-    validate_request(body, required_fields=["orderId", "amount", "paymentMethod"])
+    body = parse_json_body(event)
+    PAYMENT_REQUEST.validate(body)
     process_payment(body)
     logger.info("Payment processed", extra={"orderId": body["orderId"]})
     return {
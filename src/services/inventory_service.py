@@ -1,59 +1,121 @@
 # Business logic for inventory management
 import uuid
+from common.exceptions import OutOfStockException
 from common.logger import get_logger
-from dao.inventory_dao import update_inventory_record
-from events.producer.producer import publish_inventory_updated
-from datetime import datetime, timezone
+from common.metrics import metrics
+from common.tracing import span, traced
+from dao.inventory_dao import (
+    update_inventory_record,
+    get_inventory_quantity,
+    apply_inventory_changes,
+)
+from dao.records import InventoryChange
+from events.producer.producer import (
+    publish_inventory_updated,
+    publish_inventory_reservation_failed,
+)
 
 
+@traced("update_inventory")
 def update_inventory(data):
     logger = get_logger("inventory-service")
+    change = InventoryChange.from_request(data)
     
-    # Get current quantity before update (in real implementation, you'd fetch from DB)
-    current_quantity = data.get("currentQuantity", 0)  # This should come from DB lookup
-    quantity_change = data["quantity"]
-    new_quantity = current_quantity + quantity_change
-    
-    inventory_record = {
-        "vendorId": data["vendorId"],
-        "productId": data["productId"],
-        "quantity": quantity_change,
-        "updatedAt": datetime.now(timezone.utc).isoformat(),
-    }
-    
-    # Update inventory in DynamoDB
-    update_inventory_record(inventory_record)
-    logger.info(
-        "Inventory record updated",
-        extra={
-            "vendorId": data["vendorId"], 
-            "productId": data["productId"],
-            "quantityChange": quantity_change,
-            "newQuantity": new_quantity
-        },
-    )
+    # Atomically update the stock counter; raises OutOfStockException
+    with span("update_inventory_record"):
+        change.new_quantity = update_inventory_record(change)
+    logger.info("Inventory record updated", extra=change.to_dict())
     
     # Publish InventoryUpdated event
-    event_published = publish_inventory_updated({
-        "vendorId": data["vendorId"],
-        "productId": data["productId"],
-        "quantityChange": quantity_change,
-        "newQuantity": new_quantity
-    })
+    with span("publish_inventory_updated"):
+        event_published = publish_inventory_updated(change)
     
     if event_published:
         logger.info("InventoryUpdated event published successfully", 
-                   extra={"vendorId": data["vendorId"], "productId": data["productId"]})
+                   extra={"vendorId": change.vendor_id, "productId": change.product_id})
     else:
         logger.error("Failed to publish InventoryUpdated event", 
-                    extra={"vendorId": data["vendorId"], "productId": data["productId"]})
+                    extra={"vendorId": change.vendor_id, "productId": change.product_id})
     
+    result = change.to_dict()
+    result["eventPublished"] = event_published
+    return result
+
+
+def merge_inventory_lines(items, sign=-1, order_id=None):
+    """
+    Coalesce order lines into one InventoryChange per (vendorId, productId).
+
+    Quantities are multiplied by sign (decrement by default); products whose
+    lines cancel out are dropped.
+    """
+    merged = {}
+    for item in items:
+        key = (item.get("vendorId"), item.get("productId"))
+        merged[key] = merged.get(key, 0) + sign * int(item.get("quantity", 1))
+    return [
+        InventoryChange(vendor_id, product_id, quantity, order_id=order_id)
+        for (vendor_id, product_id), quantity in merged.items()
+        if quantity
+    ]
+
+
+@traced("apply_order_inventory")
+def apply_order_inventory(order_id: str, items: list):
+    """
+    Reserve stock for every line of an order in one all-or-nothing write
+
+    A shortage is final for the order, so instead of raising (and having the
+    event retried until it reaches the DLQ) it is reported with a failed
+    InventoryUpdated event and nothing is reserved.
+
+    Args:
+        order_id: The order identifier
+        items: Order lines with vendorId, productId and quantity
+
+    Returns:
+        dict: Whether the stock was reserved, the applied InventoryChanges and
+        whether all InventoryUpdated events were published
+    """
+    logger = get_logger("inventory-service")
+
+    changes = merge_inventory_lines(items, order_id=order_id)
+    # Raises OutOfStockException without touching any counter
+    try:
+        with span("apply_inventory_changes"):
+            apply_inventory_changes(changes)
+    except OutOfStockException as e:
+        error = e.to_dict()
+        logger.warning("Order inventory not reserved", extra={"orderId": order_id, "error": error})
+        metrics.increment("OutOfStockOrders")
+        event_published = publish_inventory_reservation_failed(order_id, error)
+        if not event_published:
+            logger.error("Failed to publish InventoryUpdated event", extra={"orderId": order_id})
+        return {
+            "orderId": order_id,
+            "reserved": False,
+            "changes": [],
+            "eventPublished": event_published,
+        }
+    logger.info(
+        "Order inventory reserved",
+        extra={"orderId": order_id, "lines": len(items), "products": len(changes)},
+    )
+
+    # One event per product; buffered handlers send them in batched PutEvents calls
+    event_published = True
+    with span("publish_inventory_updated"):
+        for change in changes:
+            event_published &= publish_inventory_updated(change)
+
+    if not event_published:
+        logger.error("Failed to publish InventoryUpdated events", extra={"orderId": order_id})
+
     return {
-        "vendorId": data["vendorId"], 
-        "productId": data["productId"],
-        "quantityChange": quantity_change,
-        "newQuantity": new_quantity,
-        "eventPublished": event_published
+        "orderId": order_id,
+        "reserved": True,
+        "changes": changes,
+        "eventPublished": event_published,
     }
 
 
@@ -72,13 +134,11 @@ def check_inventory_availability(vendor_id: str, product_id: str, required_quant
     logger = get_logger("inventory-service")
     
     try:
-        # In real implementation, fetch current quantity from DynamoDB
-        # current_quantity = get_inventory_quantity(vendor_id, product_id)
-        current_quantity = 100  # Mock value for now
+        current_quantity = get_inventory_quantity(vendor_id, product_id)
         
         is_available = current_quantity >= required_quantity
         
-        logger.info(f"Inventory check: {required_quantity} needed, {current_quantity} available",
+        logger.info("Inventory check: %s needed, %s available", required_quantity, current_quantity,
                    extra={
                        "vendorId": vendor_id,
                        "productId": product_id,
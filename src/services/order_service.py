@@ -1,71 +1,344 @@
 # Business logic for order processing
+import os
+from common.cache import TTLCache
 from common.logger import get_logger
-from dao.order_dao import save_order
-from events.producer.producer import publish_order_placed, publish_order_updated
-import uuid
-from datetime import datetime, timezone
-from decimal import Decimal
+from common.exceptions import BadRequestException, ErrorDetail, InternalServerError
+from common.metrics import metrics
+from common.money import Money, to_minor_units
+from common.validation import ORDER_REQUEST
+from common.tracing import span, traced
+from dao.catalog_dao import get_catalog_items
+from dao.order_dao import (
+    complete_order_markers, get_order, order_idempotency_key, save_order, save_orders,
+)
+from dao.records import OrderRecord
+from services.order_status import transition_order
+from events.producer.producer import (
+    flush_events, order_placed_fits, publish_order_placed, publish_order_updated,
+)
 
 
-def place_order(order_data):
+# Upper bound on orders accepted by POST /orders/batch
+MAX_BATCH_ORDERS = 500
+
+# Unit prices come from the catalog table, cached per warm container;
+# prices sent by the client are ignored
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "10000"))
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300"))
+# Unknown products are remembered for a shorter time so new products appear quickly
+CATALOG_NEGATIVE_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_NEGATIVE_CACHE_TTL_SECONDS", "30"))
+
+# Marker stored for products that are not in the catalog
+_UNKNOWN_PRODUCT = object()
+
+_catalog_cache = TTLCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL_SECONDS)
+
+
+def _product_keys(orders):
+    """Distinct (vendorId, productId) pairs of the orders' lines"""
+    keys = set()
+    for order in orders:
+        items = order.get("items") if isinstance(order, dict) else None
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            if isinstance(item, dict):
+                vendor_id = item.get("vendorId")
+                product_id = item.get("productId")
+                if vendor_id.__class__ is str and product_id.__class__ is str:
+                    keys.add((vendor_id, product_id))
+    return keys
+
+
+def resolve_catalog_prices(orders):
+    """
+    Catalog price of every product in the given order bodies.
+
+    Prices (and unknown products) are served from the container cache; the
+    remaining products are read together with BatchGetItem, so a request
+    costs at most one catalog call per 100 uncached products rather than one
+    per line.
+
+    Returns:
+        dict: (vendorId, productId) -> Money for the products in the catalog
+    """
+    logger = get_logger("order-service")
+    keys = _product_keys(orders)
+    prices = {}
+    missing = []
+    for key in keys:
+        price = _catalog_cache.get(key)
+        if price is None:
+            missing.append(key)
+        elif price is not _UNKNOWN_PRODUCT:
+            prices[key] = price
+
+    if missing:
+        with span("get_catalog_items"):
+            entries = get_catalog_items(missing)
+        for key in missing:
+            entry = entries.get(key)
+            if entry is None:
+                _catalog_cache.put(key, _UNKNOWN_PRODUCT, ttl_seconds=CATALOG_NEGATIVE_CACHE_TTL_SECONDS)
+                continue
+            try:
+                currency = entry.get("currency")
+                price = Money(to_minor_units(entry.get("price"), currency, "price"), currency)
+            except ErrorDetail:
+                # A corrupt row is our fault, not the client's; it is not
+                # cached, so a fix is picked up at once
+                logger.error("Invalid catalog price", extra={"vendorId": key[0], "productId": key[1]})
+                raise InternalServerError(
+                    recommended_data={"details": f"Catalog entry for {key[0]}/{key[1]} is invalid"}
+                ) from None
+            _catalog_cache.put(key, price)
+            prices[key] = price
+
+    metrics.increment("CatalogCacheHits", len(keys) - len(missing))
+    metrics.increment("CatalogCacheMisses", len(missing))
+    return prices
+
+
+def catalog_cache_stats():
+    """Hit/miss counters of this container's catalog cache"""
+    return _catalog_cache.stats()
+
+
+def clear_catalog_cache():
+    _catalog_cache.clear()
+
+
+def _check_event_size(order_record):
+    """
+    Reject an order whose OrderPlaced event would exceed the PutEvents size
+    limit (many lines with long ids) before it is saved
+    """
+    if not order_placed_fits(order_record):
+        raise BadRequestException(
+            recommended_data={"details": "Order is too large to publish; "
+                                         "use fewer items or shorter ids"}
+        )
+
+
+def _publish_placed_order(order_record, idempotency_key=None):
+    """
+    Publish OrderPlaced for a saved order and send it at once; a client
+    key's marker is completed only after that. Raises InternalServerError if
+    the event did not go out, so the client retries with the same key.
+    """
+    logger = get_logger("order-service")
+    order_id = order_record.order_id
+    with span("publish_order_placed"):
+        event_published = publish_order_placed(order_record)
+    with span("flush_events"):
+        event_published = flush_events() and event_published
+
+    if not event_published:
+        logger.error("Failed to publish OrderPlaced event", extra={"orderId": order_id})
+        raise InternalServerError(
+            recommended_data={
+                "orderId": order_id,
+                "details": "Order saved but OrderPlaced could not be published; "
+                           "retry with the same Idempotency-Key",
+            }
+        )
+    logger.info("OrderPlaced event published successfully", extra={"orderId": order_id})
+    if idempotency_key:
+        with span("complete_order_markers"):
+            complete_order_markers({
+                order_idempotency_key(order_id, idempotency_key, order_record.customer_id): order_id
+            })
+
+
+@traced("place_order")
+def place_order(order_data, idempotency_key=None):
     logger = get_logger("order-service")
     # Validation is handled at the handler layer
-    order_id = str(uuid.uuid4())
+    with span("resolve_catalog_prices"):
+        catalog = resolve_catalog_prices([order_data])
+    with span("build_order"):
+        order_record = OrderRecord.from_request(order_data, catalog=catalog)
+        _check_event_size(order_record)
+    order_id = order_record.order_id
     
-    # Calculate total amount - use default price if not provided
-    total_amount = Decimal('0')
-    processed_items = []
-    
-    for item in order_data.get("items", []):
-        # Use default price of 10.00 if not provided in request
-        price = Decimal(str(item.get("price", "10.00")))
-        quantity = Decimal(str(item.get("quantity", 1)))
-        total_amount += price * quantity
-        
-        # Create processed item with Decimal types for DynamoDB
-        processed_item = {
-            "vendorId": item.get("vendorId"),
-            "productId": item.get("productId"),
-            "quantity": quantity,
-            "price": price
+    # Save order and its idempotency marker to DynamoDB in one transaction
+    with span("save_order"):
+        save_result = save_order(order_record, idempotency_key=idempotency_key)
+    if save_result.duplicate:
+        logger.info("Duplicate order request ignored",
+                    extra={"orderId": save_result.order_id, "idempotencyKey": idempotency_key})
+        if not save_result.published:
+            # The first attempt saved the order but its OrderPlaced never went out
+            with span("get_order"):
+                original = get_order(save_result.order_id)
+            if original is not None:
+                _publish_placed_order(original, idempotency_key)
+        return {
+            "orderId": save_result.order_id,
+            "duplicate": True,
         }
-        processed_items.append(processed_item)
-    
-    order_record = {
-        "orderId": order_id,
-        "customerId": order_data["customerId"],
-        "items": processed_items,  # Use processed items with Decimal types
-        "totalAmount": total_amount,  # Keep as Decimal for DynamoDB
-        "status": "PLACED",
-        "createdAt": datetime.now(timezone.utc).isoformat(),
-    }
-    
-    # Save order to DynamoDB
-    save_order(order_record)
     logger.info("Order saved", extra={"orderId": order_id})
 
-    # Publish OrderPlaced event using the producer
-    event_published = publish_order_placed({
-        "orderId": order_id,
-        "customerId": order_data["customerId"],
-        "items": order_data["items"],  # Use original items for event (JSON serializable)
-        "totalAmount": float(total_amount)  # Convert to float for JSON serialization in events
-    })
-    
-    if event_published:
-        logger.info("OrderPlaced event published successfully", extra={"orderId": order_id})
-    else:
-        logger.error("Failed to publish OrderPlaced event", extra={"orderId": order_id})
-    
+    _publish_placed_order(order_record, idempotency_key)
     return {
         "orderId": order_id,
-        "totalAmount": float(total_amount),  # Convert to float for JSON response
+        "totalAmount": order_record.total_amount,
+        "currency": order_record.currency,
+        "duplicate": False,
     }
 
 
+@traced("place_orders")
+def place_orders(orders_data):
+    """
+    Place many orders with bulk writes
+
+    Every order is validated before anything is written; invalid orders are
+    reported and skipped. Orders with an idempotencyKey are saved one by one
+    with their idempotency marker (save_order), so a retried batch reports
+    them as duplicates; the others are stored with BatchWriteItem, which
+    writes no markers, and would be placed again by a retry. OrderPlaced
+    events are published through the (buffered) producer and flushed before
+    returning, so eventPublished reflects the PutEvents outcome. Markers are
+    completed only once that flush succeeds; a retried batch republishes
+    OrderPlaced for keyed orders whose event never went out.
+
+    Args:
+        orders_data: List of order request bodies
+
+    Returns:
+        list: One result per input order, in request order
+    """
+    logger = get_logger("order-service")
+    if not isinstance(orders_data, list) or not orders_data:
+        raise BadRequestException(
+            recommended_data={"details": "orders must be a non-empty list"}
+        )
+    if len(orders_data) > MAX_BATCH_ORDERS:
+        raise BadRequestException(
+            recommended_data={"details": f"At most {MAX_BATCH_ORDERS} orders per batch"}
+        )
+
+    results = [None] * len(orders_data)
+    valid = {}
+    for index, order_data in enumerate(orders_data):
+        try:
+            valid[index] = ORDER_REQUEST.validate(order_data)
+        except ErrorDetail as e:
+            results[index] = {"index": index, "success": False, "error": e.to_dict()}
+
+    records = {}
+    # One catalog lookup covers the products of every valid order in the batch
+    with span("resolve_catalog_prices"):
+        catalog = resolve_catalog_prices(valid.values())
+    for index, order_data in valid.items():
+        try:
+            order_record = OrderRecord.from_request(order_data, catalog=catalog)
+            _check_event_size(order_record)
+            records[index] = order_record
+        except ErrorDetail as e:
+            results[index] = {"index": index, "success": False, "error": e.to_dict()}
+        except (TypeError, ValueError, ArithmeticError) as e:
+            results[index] = {
+                "index": index,
+                "success": False,
+                "error": BadRequestException(recommended_data={"details": str(e)}).to_dict(),
+            }
+
+    keyed = {index: record for index, record in records.items() if valid[index].get("idempotencyKey")}
+    duplicates = {}
+    failed_ids = set()
+    with span("save_orders"):
+        for index, order_record in keyed.items():
+            try:
+                save_result = save_order(order_record, idempotency_key=valid[index]["idempotencyKey"])
+            except ErrorDetail as e:
+                logger.error("Order could not be saved",
+                             extra={"orderId": order_record.order_id, "error": e.to_dict()})
+                failed_ids.add(order_record.order_id)
+                continue
+            if save_result.duplicate:
+                duplicates[index] = save_result
+        failed_ids.update(save_orders(
+            [record for index, record in records.items() if index not in keyed]
+        ))
+
+    published = {}
+    republished = {}
+    for index, order_record in records.items():
+        order_id = order_record.order_id
+        if order_id in failed_ids:
+            results[index] = {
+                "index": index,
+                "success": False,
+                "orderId": order_id,
+                "error": {"errorCode": "INTERNAL_SERVER_ERROR",
+                          "errorMessage": "Order could not be saved"},
+            }
+        elif index in duplicates:
+            save_result = duplicates[index]
+            results[index] = {
+                "index": index,
+                "success": True,
+                "orderId": save_result.order_id,
+                "duplicate": True,
+            }
+            if not save_result.published:
+                # An earlier attempt saved the order but its OrderPlaced never went out
+                original = get_order(save_result.order_id)
+                if original is not None:
+                    records[index] = original
+                    republished[index] = publish_order_placed(original)
+        else:
+            published[index] = publish_order_placed(order_record)
+
+    # Send the buffered OrderPlaced events now so the results can report them
+    with span("flush_events"):
+        flushed = flush_events()
+    for index, event_published in published.items():
+        order_record = records[index]
+        results[index] = {
+            "index": index,
+            "success": True,
+            "orderId": order_record.order_id,
+            "totalAmount": order_record.total_amount,
+            "currency": order_record.currency,
+            "eventPublished": event_published and flushed,
+        }
+    for index, event_published in republished.items():
+        results[index]["eventPublished"] = event_published and flushed
+
+    if flushed:
+        markers = {
+            order_idempotency_key(
+                records[index].order_id, valid[index]["idempotencyKey"], records[index].customer_id
+            ): records[index].order_id
+            for index in (*published, *republished)
+            if index in keyed
+        }
+        if markers:
+            with span("complete_order_markers"):
+                complete_order_markers(markers)
+
+    logger.info(
+        "Order batch processed",
+        extra={
+            "total": len(orders_data),
+            "saved": len(published),
+            "duplicates": len(duplicates),
+            "republished": len(republished),
+            "failed": len(orders_data) - len(published) - len(duplicates),
+        },
+    )
+    return results
+
+
 def update_order_status(order_id: str, new_status: str, details: dict = None):
     """
-    Update order status and publish OrderUpdated event
+    Persist a status change and publish OrderUpdated
+    
+    The change is applied with the order_status state machine (conditional
+    write on the order's version); transitions it does not allow fail.
     
     Args:
         order_id: The order identifier
@@ -75,19 +348,32 @@ def update_order_status(order_id: str, new_status: str, details: dict = None):
     logger = get_logger("order-service")
     
     try:
-        # Here you would typically update the order in DynamoDB
-        # For now, we'll just publish the event
+        result = transition_order(order_id, new_status)
+        if result["status"] is None:
+            return {"success": False, "orderId": order_id, "error": "Order not found"}
+        if not result["changed"]:
+            if result["status"] == new_status:
+                return {"success": True, "orderId": order_id, "status": new_status}
+            logger.warning("Order status change not allowed",
+                           extra={"orderId": order_id, "status": result["status"], "newStatus": new_status})
+            return {
+                "success": False,
+                "orderId": order_id,
+                "status": result["status"],
+                "error": f"Cannot change status from {result['status']} to {new_status}",
+            }
         
         event_published = publish_order_updated(order_id, new_status, details)
         
         if event_published:
-            logger.info(f"Order status updated to {new_status}", 
+            logger.info("Order status updated to %s", new_status,
                        extra={"orderId": order_id, "status": new_status})
         else:
             logger.error("Failed to publish OrderUpdated event", 
                         extra={"orderId": order_id})
         
-        return {"success": event_published, "orderId": order_id, "status": new_status}
+        return {"success": True, "orderId": order_id, "status": new_status,
+                "eventPublished": event_published}
         
     except Exception as e:
         logger.error(f"Error updating order status: {str(e)}", 
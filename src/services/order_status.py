@@ -0,0 +1,139 @@
+# Order status state machine, persisted with optimistic concurrency
+#
+#   PLACED --PaymentProcessed--> PAID --InventoryUpdated--> FULFILLED
+#   PLACED --InventoryUpdated--> RESERVED --PaymentProcessed--> FULFILLED
+#   PLACED / PAID / RESERVED --> CANCELLED
+#
+# Payment and stock reservation run in parallel consumers, so events arrive
+# in either order. The status is derived from the milestones an order has
+# reached, which makes applying an event idempotent: a duplicate or stale
+# event reaches no new milestone and is skipped.
+#
+# Every change is a compare-and-set on the order's version attribute. New
+# orders are PLACED at version 1, so the first write assumes exactly that
+# and needs no read; if the order has moved on, the failed write returns
+# the stored status and version and the transition is recomputed from them.
+from common.exceptions import ConflictException
+from common.logger import get_logger
+from dao.order_dao import get_order_status, update_order_status_record
+
+STATUS_PLACED = "PLACED"
+STATUS_PAID = "PAID"
+STATUS_RESERVED = "RESERVED"
+STATUS_FULFILLED = "FULFILLED"
+STATUS_CANCELLED = "CANCELLED"
+
+MILESTONE_PAID = "paid"
+MILESTONE_RESERVED = "reserved"
+
+# Milestones reached by the events the status consumer receives
+EVENT_MILESTONES = {
+    "PaymentProcessed": MILESTONE_PAID,
+    "InventoryUpdated": MILESTONE_RESERVED,
+}
+
+ALLOWED_TRANSITIONS = {
+    STATUS_PLACED: frozenset({STATUS_PAID, STATUS_RESERVED, STATUS_FULFILLED, STATUS_CANCELLED}),
+    STATUS_PAID: frozenset({STATUS_FULFILLED, STATUS_CANCELLED}),
+    STATUS_RESERVED: frozenset({STATUS_FULFILLED, STATUS_CANCELLED}),
+    STATUS_FULFILLED: frozenset(),
+    STATUS_CANCELLED: frozenset(),
+}
+
+_STATUS_MILESTONES = {
+    STATUS_PLACED: frozenset(),
+    STATUS_PAID: frozenset({MILESTONE_PAID}),
+    STATUS_RESERVED: frozenset({MILESTONE_RESERVED}),
+    STATUS_FULFILLED: frozenset({MILESTONE_PAID, MILESTONE_RESERVED}),
+}
+_MILESTONE_STATUS = {milestones: status for status, milestones in _STATUS_MILESTONES.items()}
+
+# Initial state of every new order (dao.records.OrderRecord)
+INITIAL_VERSION = 1
+
+# Compare-and-set attempts before a contended order is left for a retry
+MAX_STATUS_ATTEMPTS = 4
+
+
+def can_transition(current, new):
+    return new in ALLOWED_TRANSITIONS.get(current, ())
+
+
+def next_status(current, milestones):
+    """Status after reaching milestones from current, or None if nothing changes"""
+    reached = _STATUS_MILESTONES.get(current)
+    if reached is None:
+        # Cancelled (or unknown) orders do not move on
+        return None
+    target = _MILESTONE_STATUS[reached | frozenset(milestones)]
+    return target if target != current else None
+
+
+def _apply_transition(order_id, target_for):
+    """
+    Compare-and-set loop; target_for(status) is the new status or None to
+    leave the order as it is. Returns (changed, status, version).
+
+    When not even a new order would change, the stored status is read
+    rather than assumed, so the caller never sees a guessed status.
+    """
+    status, version = STATUS_PLACED, INITIAL_VERSION
+    known = False
+    for _ in range(MAX_STATUS_ATTEMPTS):
+        target = target_for(status)
+        if target is None:
+            if known:
+                return False, status, version
+            result = get_order_status(order_id)
+        else:
+            result = update_order_status_record(order_id, status, target, version)
+            if result.updated:
+                return True, result.status, result.version
+        if not result.found:
+            return False, None, None
+        status, version, known = result.status, result.version, True
+    raise ConflictException(
+        recommended_data={"details": f"Order {order_id} changed concurrently, retry"}
+    )
+
+
+def advance_order(order_id, milestones):
+    """
+    Move an order forward for the milestones it reached (see EVENT_MILESTONES)
+
+    Returns:
+        dict: orderId, status after the call (None for unknown orders) and
+        whether it changed
+    """
+    logger = get_logger("order-status")
+    changed, status, version = _apply_transition(
+        order_id, lambda current: next_status(current, milestones)
+    )
+    if status is None:
+        logger.warning("Status change for unknown order ignored", extra={"orderId": order_id})
+    elif changed:
+        logger.info("Order status changed", extra={"orderId": order_id, "status": status, "version": version})
+    else:
+        logger.info("Stale or duplicate status change skipped", extra={"orderId": order_id, "status": status})
+    return {"orderId": order_id, "status": status, "changed": changed}
+
+
+def transition_order(order_id, new_status):
+    """
+    Move an order to new_status if ALLOWED_TRANSITIONS permits it from its
+    current status; an order already in new_status is left unchanged.
+
+    Returns:
+        dict: orderId, status after the call (None for unknown orders) and
+        whether it changed
+    """
+    if new_status not in ALLOWED_TRANSITIONS:
+        raise ValueError(f"Unknown order status: {new_status}")
+
+    def target_for(current):
+        if current == new_status or not can_transition(current, new_status):
+            return None
+        return new_status
+
+    changed, status, _ = _apply_transition(order_id, target_for)
+    return {"orderId": order_id, "status": status, "changed": changed}
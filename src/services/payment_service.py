@@ -1,62 +1,50 @@
 # Business logic for payment processing
 import uuid
 from common.logger import get_logger
+from common.money import Money
+from common.tracing import span, traced
 from dao.payment_dao import save_payment
+from dao.records import PaymentRecord
 from datetime import datetime, timezone
 from events.producer.producer import publish_payment_processed
 
 
+@traced("process_payment")
 def process_payment(data):
     logger = get_logger("payment-service")
-    payment_id = str(uuid.uuid4())  # Generate a unique payment ID
-    order_id = data["orderId"]
-    amount = data["amount"]
+    payment = PaymentRecord.from_request(data)
 
-    payment_record = {
-        "paymentId": payment_id,
-        "orderId": order_id,
-        "amount": amount,
-        "paymentMethod": data.get("paymentMethod", "card"),
-        "status": "PROCESSED",
-        "processedAt": datetime.now(timezone.utc).isoformat(),
-    }
-    
     # Save payment to DynamoDB
-    save_payment(payment_record)
-    logger.info("Payment record saved", extra={"orderId": order_id, "paymentId": payment_id})
+    with span("save_payment"):
+        save_payment(payment)
+    logger.info("Payment record saved",
+                extra={"orderId": payment.order_id, "paymentId": payment.payment_id})
 
     # Publish PaymentProcessed event using the producer
-    event_published = publish_payment_processed({
-        "paymentId": payment_id,
-        "orderId": order_id,
-        "amount": amount,
-        "status": "completed",
-    })
+    with span("publish_payment_processed"):
+        event_published = publish_payment_processed(payment)
     
     if event_published:
         logger.info("PaymentProcessed event published successfully", 
-                   extra={"orderId": order_id, "paymentId": payment_id})
+                   extra={"orderId": payment.order_id, "paymentId": payment.payment_id})
     else:
         logger.error("Failed to publish PaymentProcessed event", 
-                    extra={"orderId": order_id, "paymentId": payment_id})
+                    extra={"orderId": payment.order_id, "paymentId": payment.payment_id})
     
-    return {
-        "paymentId": payment_id,
-        "orderId": order_id,
-        "amount": amount,
-        "status": "PROCESSED",
-        "eventPublished": event_published
-    }
+    result = payment.to_dict()
+    result["eventPublished"] = event_published
+    return result
 
 
-def refund_payment(payment_id: str, refund_amount: float, reason: str = None):
+def refund_payment(payment_id: str, refund_amount, reason: str = None, currency: str = None):
     """
     Process a payment refund and publish events
     
     Args:
         payment_id: The payment identifier to refund
-        refund_amount: Amount to refund
+        refund_amount: Amount to refund (decimal string, number or Money)
         reason: Reason for the refund
+        currency: Currency of refund_amount (DEFAULT_CURRENCY when None)
         
     Returns:
         dict: Refund result
@@ -65,11 +53,13 @@ def refund_payment(payment_id: str, refund_amount: float, reason: str = None):
     
     try:
         refund_id = str(uuid.uuid4())
+        refund_amount = Money.parse(refund_amount, currency)
         
         refund_record = {
             "refundId": refund_id,
             "paymentId": payment_id,
-            "amount": refund_amount,
+            "amount": refund_amount.to_decimal(),
+            "currency": refund_amount.currency,
             "reason": reason or "Customer requested refund",
             "status": "PROCESSED",
             "processedAt": datetime.now(timezone.utc).isoformat(),
@@ -79,21 +69,24 @@ def refund_payment(payment_id: str, refund_amount: float, reason: str = None):
         # save_refund(refund_record)
         
         logger.info("Refund processed", 
-                   extra={"paymentId": payment_id, "refundId": refund_id, "amount": refund_amount})
+                   extra={"paymentId": payment_id, "refundId": refund_id,
+                          "amount": refund_amount.to_json()})
         
         # Publish refund event (could extend producer for this)
         # For now, we can use payment_processed with refund status
         event_published = publish_payment_processed({
             "paymentId": refund_id,
             "orderId": payment_id,  # Using payment_id as reference
-            "amount": -refund_amount,  # Negative amount indicates refund
+            "amount": (-refund_amount).to_json(),  # Negative amount indicates refund
+            "currency": refund_amount.currency,
             "status": "refunded",
         })
         
         return {
             "refundId": refund_id,
             "paymentId": payment_id,
-            "amount": refund_amount,
+            "amount": refund_amount.to_json(),
+            "currency": refund_amount.currency,
             "status": "PROCESSED",
             "eventPublished": event_published
         }
@@ -0,0 +1,71 @@
+"""
+Shared fixtures for the behavioural tests
+
+Every test runs against a fresh in-memory DynamoDB with the tables of the
+SAM template (benchmarks/fake_dynamodb.py), behind the offline AWS
+transport, and an in-process EventBridge that records what is published.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "benchmarks")]
+
+# Environment the handlers read at import time
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("EVENT_BUS_NAME", "test-bus")
+os.environ.setdefault("EVENT_PUBLISH_BACKOFF_SECONDS", "0")
+os.environ.pop("XRAY_AUTO_PATCH", None)
+
+from fake_dynamodb import FakeDynamoDB  # noqa: E402
+from offline_aws import OfflineAWS  # noqa: E402
+
+
+class EventBus:
+    """
+    PutEvents answered in-process. Entries whose Detail contains one of the
+    strings in fail_on are reported as failed; the others are kept in sent.
+    """
+
+    def __init__(self):
+        self.fail_on = set()
+        self.sent = []
+
+    def put_events(self, body):
+        results = []
+        for entry in body["Entries"]:
+            if any(marker in entry["Detail"] for marker in self.fail_on):
+                results.append({"ErrorCode": "InternalFailure", "ErrorMessage": "injected"})
+            else:
+                self.sent.append(entry)
+                results.append({"EventId": str(uuid.uuid4())})
+        failed = sum(1 for result in results if "ErrorCode" in result)
+        return {"FailedEntryCount": failed, "Entries": results}
+
+    def detail_types(self):
+        return [entry["DetailType"] for entry in self.sent]
+
+
+@pytest.fixture
+def event_bus():
+    return EventBus()
+
+
+@pytest.fixture
+def dynamodb():
+    return FakeDynamoDB.from_template(seed=1)
+
+
+@pytest.fixture
+def aws(dynamodb, event_bus):
+    """The offline AWS transport serving dynamodb and event_bus; calls counts operations"""
+    from common import idempotency
+
+    transport = dynamodb.install(OfflineAWS({"AWSEvents.PutEvents": event_bus.put_events}))
+    # Completed keys are cached per container; each test starts cold
+    idempotency._completed_keys.clear()
+    yield transport
+    assert not transport.rejected
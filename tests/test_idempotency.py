@@ -0,0 +1,174 @@
+import json
+import uuid
+
+import pytest
+
+from common import idempotency
+from common.exceptions import ConflictException
+from common.idempotency import (
+    ALREADY_COMPLETED, ALREADY_IN_PROGRESS, CLAIMED, COMPLETED_UNPUBLISHED,
+    IDEMPOTENCY_TABLE, STATUS_COMPLETED, STATUS_UNPUBLISHED,
+    claim, complete, idempotent, release,
+)
+from dao.inventory_dao import apply_inventory_changes, get_inventory_quantity
+from dao.payment_dao import PAYMENTS_TABLE
+from dao.records import InventoryChange
+from events.consumers import inventory_consumer, payment_consumer
+
+VENDOR_ID = "vendor-1"
+PRODUCT_ID = "product-1"
+
+
+def _record(dynamodb, key):
+    return dynamodb.tables[IDEMPOTENCY_TABLE].items.get((("S", key),))
+
+
+def _order_placed(quantity=1):
+    return {
+        "orderId": str(uuid.uuid4()),
+        "customerId": "customer-1",
+        "items": [{"vendorId": VENDOR_ID, "productId": PRODUCT_ID, "quantity": quantity, "price": "9.99"}],
+        "currency": "USD",
+        "totalAmount": "9.99",
+    }
+
+
+def _sqs_event(*details):
+    """SQS batch of OrderPlaced events as the consumers' queues receive them"""
+    return {
+        "Records": [
+            {
+                "messageId": str(uuid.uuid4()),
+                "body": json.dumps({"detail-type": "OrderPlaced", "source": "order.service", "detail": detail}),
+            }
+            for detail in details
+        ]
+    }
+
+
+def _failures(event, *indexes):
+    return {"batchItemFailures": [{"itemIdentifier": event["Records"][i]["messageId"]} for i in indexes]}
+
+
+@pytest.fixture
+def stock(aws):
+    """Set the test product's stock; returns a reader of the current level"""
+    def read():
+        return get_inventory_quantity(VENDOR_ID, PRODUCT_ID)
+
+    apply_inventory_changes([InventoryChange(VENDOR_ID, PRODUCT_ID, 10 - read())])
+    return read
+
+
+def test_claim_complete_release(aws, dynamodb):
+    assert claim("test#1") == CLAIMED
+    assert claim("test#1") == ALREADY_IN_PROGRESS
+
+    release("test#1")
+    assert _record(dynamodb, "test#1") is None
+    assert claim("test#1") == CLAIMED
+
+    complete("test#1")
+    assert _record(dynamodb, "test#1")["status"] == {"S": STATUS_COMPLETED}
+    assert claim("test#1") == ALREADY_COMPLETED
+    # Not just the container cache: the table suppresses the repeat too
+    idempotency._completed_keys.clear()
+    assert claim("test#1") == ALREADY_COMPLETED
+
+    # Completed keys are never released
+    release("test#1")
+    assert claim("test#1") == ALREADY_COMPLETED
+
+
+def test_expired_claims_can_be_taken_over(aws, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS", -1)
+    assert claim("test#1") == CLAIMED
+    assert claim("test#1") == CLAIMED
+
+
+def test_idempotent_runs_once_and_releases_failures(aws):
+    calls = []
+
+    @idempotent("test", key_func=lambda detail: detail.get("id"))
+    def process(detail):
+        calls.append(detail["id"])
+        if detail.get("fail"):
+            raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        process({"id": "a", "fail": True})
+    process({"id": "a"})
+    process({"id": "a"})
+    process({"id": None})
+
+    assert calls == ["a", "a", None]
+
+
+def test_unpublished_keys_keep_their_events_instead_of_redoing_the_work(aws, dynamodb):
+    @idempotent("test", key_func=lambda detail: detail.get("id"))
+    def process(detail):
+        raise AssertionError("work must not run again")
+
+    entries = [{"Source": "order.service", "DetailType": "InventoryUpdated",
+                "Detail": json.dumps({"orderId": "a"}), "EventBusName": "test-bus"}]
+    assert claim("test#a") == CLAIMED
+    idempotency.save_unpublished("test#a", entries)
+    assert _record(dynamodb, "test#a")["status"] == {"S": STATUS_UNPUBLISHED}
+    assert claim("test#a") == COMPLETED_UNPUBLISHED
+    item = idempotency.get_idempotency_table().get_item(Key={"id": "test#a"})["Item"]
+    assert idempotency.unpublished_events(item) == entries
+
+    # Outside buffered_events there is nothing to republish into
+    with pytest.raises(ConflictException):
+        process({"id": "a"})
+
+
+def test_failed_publish_retries_only_its_record(aws, event_bus, stock):
+    first, second = _order_placed(), _order_placed()
+    event = _sqs_event(first, second)
+    event_bus.fail_on = {first["orderId"]}
+
+    assert inventory_consumer.lambda_handler(event, None) == _failures(event, 0)
+    assert [json.loads(entry["Detail"])["orderId"] for entry in event_bus.sent] == [second["orderId"]]
+
+
+def test_inventory_redelivery_republishes_without_decrementing_again(aws, dynamodb, event_bus, stock):
+    order = _order_placed(quantity=3)
+    event = _sqs_event(order)
+    event_bus.fail_on = {order["orderId"]}
+
+    assert inventory_consumer.lambda_handler(event, None) == _failures(event, 0)
+    assert stock() == 7
+    key = f"{inventory_consumer.IDEMPOTENCY_SCOPE}#{order['orderId']}"
+    assert _record(dynamodb, key)["status"] == {"S": STATUS_UNPUBLISHED}
+
+    event_bus.fail_on = set()
+    assert inventory_consumer.lambda_handler(event, None) == _failures(event)
+    assert stock() == 7
+    assert event_bus.detail_types() == ["InventoryUpdated"]
+    assert _record(dynamodb, key)["status"] == {"S": STATUS_COMPLETED}
+
+    assert inventory_consumer.lambda_handler(event, None) == _failures(event)
+    assert stock() == 7
+    assert len(event_bus.sent) == 1
+
+
+def test_payment_redelivery_republishes_without_charging_again(aws, dynamodb, event_bus):
+    order = _order_placed()
+    event = _sqs_event(order)
+    event_bus.fail_on = {order["orderId"]}
+
+    # A failed republish keeps the events for the next delivery
+    assert payment_consumer.lambda_handler(event, None) == _failures(event, 0)
+    assert payment_consumer.lambda_handler(event, None) == _failures(event, 0)
+
+    event_bus.fail_on = set()
+    assert payment_consumer.lambda_handler(event, None) == _failures(event)
+    assert payment_consumer.lambda_handler(event, None) == _failures(event)
+
+    assert event_bus.detail_types() == ["PaymentProcessed"]
+    payments = [
+        item for item in dynamodb.tables[PAYMENTS_TABLE].items.values()
+        if item["orderId"] == {"S": order["orderId"]}
+    ]
+    assert len(payments) == 1
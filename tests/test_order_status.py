@@ -0,0 +1,195 @@
+import json
+import uuid
+
+import pytest
+
+from common.aws_clients import get_client
+from common.exceptions import ConflictException
+from dao.order_dao import ORDERS_TABLE
+from events.consumers import status_consumer
+from services import order_status
+from services.order_status import (
+    MAX_STATUS_ATTEMPTS, MILESTONE_PAID, MILESTONE_RESERVED, STATUS_CANCELLED,
+    STATUS_FULFILLED, STATUS_PAID, STATUS_PLACED, STATUS_RESERVED,
+    advance_order, transition_order,
+)
+
+
+def _put_order(status=STATUS_PLACED, version=1):
+    """Store an order; version=None writes it as items looked before versioning"""
+    order_id = str(uuid.uuid4())
+    item = {"orderId": {"S": order_id}, "status": {"S": status}}
+    if version is not None:
+        item["version"] = {"N": str(version)}
+    get_client("dynamodb").put_item(TableName=ORDERS_TABLE, Item=item)
+    return order_id
+
+
+def _stored(dynamodb, order_id):
+    return dynamodb.tables[ORDERS_TABLE].items[(("S", order_id),)]
+
+
+def _status(dynamodb, order_id):
+    item = _stored(dynamodb, order_id)
+    return item["status"]["S"], int(item["version"]["N"])
+
+
+def _status_events(*events):
+    """SQS batch of (detail type, orderId) events as the status queue receives them"""
+    return {
+        "Records": [
+            {
+                "messageId": str(uuid.uuid4()),
+                "body": json.dumps({
+                    "detail-type": detail_type,
+                    "source": "order.service",
+                    "detail": {"orderId": order_id, "status": "completed"},
+                }),
+            }
+            for detail_type, order_id in events
+        ]
+    }
+
+
+@pytest.mark.parametrize("first, second, between", [
+    ("PaymentProcessed", "InventoryUpdated", STATUS_PAID),
+    ("InventoryUpdated", "PaymentProcessed", STATUS_RESERVED),
+])
+def test_events_in_either_order_fulfill_the_order(aws, dynamodb, event_bus, first, second, between):
+    order_id = _put_order()
+
+    assert status_consumer.lambda_handler(_status_events((first, order_id)), None) == {"batchItemFailures": []}
+    assert _status(dynamodb, order_id) == (between, 2)
+
+    assert status_consumer.lambda_handler(_status_events((second, order_id)), None) == {"batchItemFailures": []}
+    assert _status(dynamodb, order_id) == (STATUS_FULFILLED, 3)
+    assert [json.loads(entry["Detail"])["status"] for entry in event_bus.sent] == [between, STATUS_FULFILLED]
+
+
+def test_both_events_in_one_batch_fulfill_with_one_write(aws, dynamodb, event_bus):
+    order_id = _put_order()
+    aws.reset_counts()
+
+    event = _status_events(("InventoryUpdated", order_id), ("PaymentProcessed", order_id))
+    assert status_consumer.lambda_handler(event, None) == {"batchItemFailures": []}
+
+    assert _status(dynamodb, order_id) == (STATUS_FULFILLED, 2)
+    assert aws.calls["UpdateItem"] == 1
+    assert event_bus.detail_types() == ["OrderUpdated"]
+
+
+@pytest.mark.parametrize("status, version, milestone", [
+    # Duplicate: the order already reached the milestone
+    (STATUS_PAID, 2, MILESTONE_PAID),
+    # Stale: a late event for an order that has moved past it
+    (STATUS_FULFILLED, 3, MILESTONE_RESERVED),
+])
+def test_duplicate_and_stale_events_are_skipped_without_a_write(aws, dynamodb, status, version, milestone):
+    order_id = _put_order(status, version)
+    before = dict(_stored(dynamodb, order_id))
+    aws.reset_counts()
+
+    result = advance_order(order_id, {milestone})
+
+    assert result == {"orderId": order_id, "status": status, "changed": False}
+    assert _stored(dynamodb, order_id) == before
+    # The one conditional write failed and returned the stored status: no read
+    assert aws.calls["UpdateItem"] == 1
+    assert aws.calls["GetItem"] == 0
+
+
+def test_skipped_events_publish_nothing(aws, dynamodb, event_bus):
+    order_id = _put_order(STATUS_PAID, 2)
+
+    event = _status_events(("PaymentProcessed", order_id))
+    assert status_consumer.lambda_handler(event, None) == {"batchItemFailures": []}
+
+    assert _status(dynamodb, order_id) == (STATUS_PAID, 2)
+    assert event_bus.sent == []
+
+
+def test_cancelled_is_terminal(aws, dynamodb):
+    order_id = _put_order()
+    assert transition_order(order_id, STATUS_CANCELLED)["changed"]
+    assert _status(dynamodb, order_id) == (STATUS_CANCELLED, 2)
+
+    assert advance_order(order_id, {MILESTONE_PAID, MILESTONE_RESERVED})["changed"] is False
+    for status in (STATUS_PLACED, STATUS_PAID, STATUS_FULFILLED):
+        assert transition_order(order_id, status) == {
+            "orderId": order_id, "status": STATUS_CANCELLED, "changed": False,
+        }
+    assert _status(dynamodb, order_id) == (STATUS_CANCELLED, 2)
+
+
+def test_fulfilled_orders_cannot_be_cancelled(aws, dynamodb):
+    order_id = _put_order(STATUS_FULFILLED, 3)
+
+    assert transition_order(order_id, STATUS_CANCELLED)["changed"] is False
+    assert _status(dynamodb, order_id) == (STATUS_FULFILLED, 3)
+
+
+def test_legacy_orders_without_version_count_as_version_1(aws, dynamodb):
+    order_id = _put_order(version=None)
+
+    assert advance_order(order_id, {MILESTONE_PAID})["changed"]
+    assert _status(dynamodb, order_id) == (STATUS_PAID, 2)
+
+    assert advance_order(order_id, {MILESTONE_RESERVED})["changed"]
+    assert _status(dynamodb, order_id) == (STATUS_FULFILLED, 3)
+
+
+def test_legacy_orders_past_placed_are_advanced(aws, dynamodb):
+    order_id = _put_order(STATUS_RESERVED, version=None)
+
+    assert advance_order(order_id, {MILESTONE_PAID}) == {
+        "orderId": order_id, "status": STATUS_FULFILLED, "changed": True,
+    }
+    assert _status(dynamodb, order_id) == (STATUS_FULFILLED, 2)
+
+
+def test_unknown_orders_are_ignored(aws, dynamodb):
+    order_id = str(uuid.uuid4())
+
+    assert advance_order(order_id, {MILESTONE_PAID}) == {"orderId": order_id, "status": None, "changed": False}
+    assert (("S", order_id),) not in dynamodb.tables[ORDERS_TABLE].items
+
+
+@pytest.fixture
+def concurrent_writer(monkeypatch):
+    """Bump the version of the order before every compare-and-set, as another writer would"""
+    update = order_status.update_order_status_record
+    attempts = []
+
+    def contended(order_id, current_status, new_status, expected_version):
+        attempts.append(expected_version)
+        get_client("dynamodb").update_item(
+            TableName=ORDERS_TABLE,
+            Key={"orderId": {"S": order_id}},
+            UpdateExpression="SET #version = #version + :one",
+            ExpressionAttributeNames={"#version": "version"},
+            ExpressionAttributeValues={":one": {"N": "1"}},
+        )
+        return update(order_id, current_status, new_status, expected_version)
+
+    monkeypatch.setattr(order_status, "update_order_status_record", contended)
+    return attempts
+
+
+def test_conflict_after_max_status_attempts(aws, dynamodb, concurrent_writer):
+    order_id = _put_order()
+
+    with pytest.raises(ConflictException):
+        advance_order(order_id, {MILESTONE_PAID})
+
+    assert concurrent_writer == list(range(1, MAX_STATUS_ATTEMPTS + 1))
+    assert _status(dynamodb, order_id) == (STATUS_PLACED, 1 + MAX_STATUS_ATTEMPTS)
+
+
+def test_contended_orders_are_retried_by_the_queue(aws, dynamodb, event_bus, concurrent_writer):
+    order_id = _put_order()
+    event = _status_events(("PaymentProcessed", order_id))
+
+    result = status_consumer.lambda_handler(event, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": event["Records"][0]["messageId"]}]}
+    assert event_bus.sent == []